@@ -1,11 +1,13 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 
-from pycountry_convert import country_alpha2_to_continent_code, country_name_to_country_alpha2
 import datetime as dt
 import os
 
+from FPG_History import history_fields
+import FPG_Database
+import FPG_Auction
+
 continent_names = {
                     "AF": "Africa",
                     "AS": "Asia",
@@ -28,6 +30,27 @@ exchange_currency = {
     'BSE':      'INR'
 }
 
+metadata_columns = {"name":                     "name",
+                    "country":                  "country",
+                    "region":                   "region",
+                    "industry":                 "industry",
+                    "sector":                   "sector",
+                    "price":                    "price",
+                    "trading_volume":           "trading_volume",
+                    "shares_outstanding":       "shares_outstanding",
+                    "market_cap":               "market_cap",
+                    "revenue":                  "revenue",
+                    "earnings":                 "earnings",
+                    "profits":                  "profits",
+                    "expenses":                 "expenses",
+                    "EPS":                      "EPS",
+                    "PE_ratio":                 "PE_ratio",
+                    "volatility_window_size":   "volatility_window_size",
+                    "volatility_index":         "volatility_index",
+                    "starting_day":             "days since start date"
+                    }
+''' Company attribute -> column of the company's database .csv file '''
+
 def one_day_forward(date: str) -> str:
     year, month, day = str.split(date,'-')
     this_day = dt.date(int(year),int(month),int(day))
@@ -35,12 +58,40 @@ def one_day_forward(date: str) -> str:
 
     return str(next_day)
 
+def _history_field(name):
+    ''' Company metric that lives in the history store's current state once the company is bound to it '''
+    def getter(self):
+        if(self._store is None):
+            try:
+                return self.__dict__[name]
+            except KeyError:
+                raise AttributeError(name)
+        return self._store.get(name, self._store_idx)
+
+    def setter(self, value):
+        if(self._store is None):
+            self.__dict__[name] = value
+        else:
+            self._store.set(name, self._store_idx, value)
+
+    return property(getter, setter)
+
+class FPG_OfflineError(RuntimeError):
+    ''' Data that has to be fetched from the network while network fetches are disabled (FPG_Input.offline) '''
+    pass
+
 class Company:
-    def __init__(self, symbol: str, start_date: str) -> None:
+    _store      = None
+    ''' FPG_HistoryStore the company is bound to, see Allocate_History '''
+
+    _store_idx  = -1
+
+    def __init__(self, symbol: str, start_date: str, offline: bool = False) -> None:
         """
             symbol:        ticker symbol of the company
             start_date:    issuing the starting date of the simulation, all of the company's
                            attributes will be derived from yfinance data of that date
+            offline:       raise FPG_OfflineError instead of fetching from yfinance
         """
         self.ticker = symbol
 
@@ -48,234 +99,100 @@ class Company:
             save_data_start_date = self.load_from_csv(symbol)
 
             if(save_data_start_date != start_date):
-                print(f"{symbol}'s saved data's start date doesn't match the requierd start date, extracting from yfinance")
-                self.load_from_yfinance(symbol, start_date)
+                from FPG_Fetcher import rederive_metadata
+
+                if(not rederive_metadata([symbol], start_date)):
+                    self.load_from_csv(symbol)
+                elif(offline):
+                    raise FPG_OfflineError(f"{symbol}'s saved data's start date doesn't match the required start date {start_date}")
+                else:
+                    print(f"{symbol}'s saved data's start date doesn't match the requierd start date, extracting from yfinance")
+                    self.load_from_yfinance(symbol, start_date)
         else:
+            if(offline):
+                raise FPG_OfflineError(f"{symbol} is missing database file")
             print(f"{symbol} is missing database file, extracting from yfinance")
             self.load_from_yfinance(symbol, start_date)
 
-        self.popularity         = 0 # Default, will be adjusted later
-        self.growth_potential   = 0
-
-        self._active             = self.starting_day == np.int64(0)
-
-        self.startingDay        = self.starting_day
-
+        self._init_state()
 
     def load_from_csv(self, symbol) -> pd.Timestamp:
         data = pd.read_csv('Database/' + symbol + '.csv')
 
-        self.name                   = data["name"][0]
-        self.country                = data["country"][0]
-        self.region                 = data["region"][0]
-        self.industry               = data["industry"][0]
-        self.sector                 = data["sector"][0]
-        self.price                  = data["price"][0]
-        self.trading_volume         = data["trading_volume"][0]
-        self.shares_outstanding     = data["shares_outstanding"][0]
-        self.market_cap             = data["market_cap"][0]
-        self.revenue                = data["revenue"][0]
-        self.earnings               = data["earnings"][0]
-        self.profits                = data["profits"][0]
-        self.expenses               = data["expenses"][0]
-        self.EPS                    = data["EPS"][0]
-        self.PE_ratio               = data["PE_ratio"][0]
-        self.volatility_window_size = data["volatility_window_size"][0]
-        self.volatility_index       = data["volatility_index"][0]
-        self.starting_day           = data["days since start date"][0]
+        for attribute, column in metadata_columns.items():
+            setattr(self, attribute, data[column][0])
 
         return data["start date"][0]
 
-    def load_from_yfinance(self,symbol,start_date):
-        # Fetch data from yfinance
-        stock = yf.Ticker(symbol)
-
-        self.name       = stock.info['shortName']
+    def _init_state(self):
+        self.popularity         = 0 # Default, will be adjusted later
+        self.growth_potential   = 0
 
-        self.industry   = stock.info['industry']
-        self.sector     = stock.info['sector']
-        self.country    = stock.info['country']
+        self._active             = self.starting_day == np.int64(0)
 
-        country_alpha2 = country_name_to_country_alpha2(self.country)
-        self.region = continent_names[country_alpha2_to_continent_code(country_alpha2)]
+        self.startingDay        = self.starting_day
 
-        dt_start_date = pd.to_datetime(start_date)
+    def metadata(self) -> dict:
+        ''' The company's database attributes, see from_metadata '''
+        return {attribute: getattr(self, attribute) for attribute in metadata_columns}
 
-        # historical_data = yf.download(symbol,start=start_date,progress=False)
-        # historical_data = stock.history(period="max")
-        historical_data = yf.download(stock.ticker,period="max")
+    @classmethod
+    def from_metadata(cls, symbol: str, metadata: dict):
+        ''' Builds a company from already loaded database attributes, without touching the database '''
+        company = cls.__new__(cls)
+        company.ticker = symbol
+        for attribute in metadata_columns:
+            setattr(company, attribute, metadata[attribute])
 
-        first_trading_day = historical_data.index.min()
+        company._init_state()
+        return company
 
-        if(pd.to_datetime(first_trading_day).tz_localize(None) < dt_start_date):
-            idx_start = historical_data.index.get_indexer([dt_start_date.tz_localize(first_trading_day.tz)], method='nearest')[0]
-        else:
-            idx_start = 0
-
-        try:
-            if(stock.info['currency'] != 'USD'):
-                currency_exchange = yf.download(stock.info['currency'] + "USD=X",period='1d', interval="1d")['Adj Close']
-                currency_exchange = currency_exchange.iloc[-1][stock.info['currency'] + "USD=X"]
-
-                historical_data["Close"]        *= currency_exchange
-                historical_data["Adj. Close"]   *= currency_exchange
-        except KeyError:
-            print("could not calculate currency exchange!")
-
-        self.price = historical_data["Close"].values[idx_start][0]  # Initial price
-        self.trading_volume = historical_data["Volume"].values[idx_start][0]
-
-        # Use `info` for company details
-        # Try to get the sharesOutstanding (if available)
-        self.shares_outstanding = stock.info.get('sharesOutstanding', None)
-        
-        # If sharesOutstanding is not available, fall back to using floatShares (if available)
-        if self.shares_outstanding is None:
-            self.shares_outstanding = stock.info.get('floatShares', None)
-            if self.shares_outstanding is None:
-                print(f"Warning: Both sharesOutstanding and floatShares are missing for {stock.ticker}.")
-                exit(1)
-
-        self.market_cap = self.shares_outstanding * self.price
-
-        price_change_factor = self.price/historical_data["Close"].values[-1][0]
-
-        self.revenue = stock.info.get('totalRevenue', 0) * price_change_factor
-        self.earnings = self.price * self.shares_outstanding * price_change_factor
-        try:
-            rawExpenses = stock.financials.loc["Total Expenses"].values[0]
-            rawExpenses_idx = 0
-            while(np.isnan(rawExpenses)):
-                rawExpenses_idx += 1
-                rawExpenses = stock.financials.loc["Total Expenses"].values[rawExpenses_idx]
-            
-            if(np.isnan(rawExpenses)):
-                    raise RuntimeError("Failed to get total expenses directly!")
-        except KeyError:
-            try:
-                netIncome = stock.financials.loc["Net Income"].values[0]
-                totalRevenue = stock.financials.loc["Total Revenue"].values[0]
-                rawExpenses = totalRevenue - netIncome 
-                rawExpenses_idx = 0
-                while(np.isnan(rawExpenses)):
-                    rawExpenses_idx += 1
-                    netIncome = stock.financials.loc["Net Income"].values[rawExpenses_idx]
-                    totalRevenue = stock.financials.loc["Total Revenue"].values[rawExpenses_idx]
-                    rawExpenses = totalRevenue - netIncome 
-                
-                if(np.isnan(rawExpenses)):
-                    raise RuntimeError("Failed to get total expenses from net income & total revenue!")
-            except KeyError:
-                raise RuntimeError("Failed to get total expenses!")
-            
-        self.expenses = rawExpenses * price_change_factor
-        self.profits = self.revenue - self.expenses
-        
-        self.EPS = self.earnings/self.shares_outstanding # earnings per share
-        self.PE_ratio = self.price/self.EPS # price to earnigns (EPS) ratio 
-
-        self.volatility_window_size = 20
-
-        if(idx_start > self.volatility_window_size - 1):
-            self.volatility_index = np.std(historical_data["Close"].values[idx_start - self.volatility_window_size + 1:idx_start + 1])*np.sqrt(self.volatility_window_size)
-        else:
-            # if past data is not available, use the NEXT 'self.volatility_window_size' days
-            self.volatility_index = np.std(historical_data["Close"].values[0:self.volatility_window_size])*np.sqrt(self.volatility_window_size)
-
-        # Number of days till company's inception
-        days_since_start_date = (first_trading_day.tz_localize(None) - dt_start_date).days
-        if(days_since_start_date < 0):
-            days_since_start_date = 0
-
-        # save ticker data to .csv file in datbase
-        derived_data = pd.DataFrame([{
-                                        "name": self.name,
-                                        "country": self.country,
-                                        "region": self.region,
-                                        "industry": self.industry,
-                                        "sector": self.sector,
-                                        "price": self.price.astype('float32'),
-                                        "trading_volume": self.trading_volume,
-                                        "shares_outstanding": self.shares_outstanding,
-                                        "market_cap": self.market_cap.astype('float32'),
-                                        "revenue": self.revenue.astype('float32'),
-                                        "earnings": self.earnings.astype('float32'),
-                                        "profits": self.profits.astype('float32'),
-                                        "expenses": self.expenses.astype('float32'),
-                                        "EPS": self.EPS.astype('float32'),
-                                        "PE_ratio": self.PE_ratio.astype('float32'),
-                                        "volatility_window_size": self.volatility_window_size,
-                                        "volatility_index": self.volatility_index.astype('float32'),
-                                        "start date": start_date,
-                                        "days since start date": days_since_start_date
-                                        }])
-    
-        derived_data.to_csv('Database/' + symbol + '.csv',index=False)
-        historical_data_df = pd.DataFrame(index=historical_data.index, columns=['Close', 'Adj Close'])
-        historical_data_df['Close']     = historical_data['Close']
-        historical_data_df['Adj Close'] = historical_data['Adj Close']
-
-        del historical_data
+    def load_from_yfinance(self,symbol,start_date):
+        # Imported here so that simulations running on the database never load the network stack
+        from FPG_Fetcher import FPG_Fetcher, FPG_YFinanceSource
 
-        historical_data_df.astype('float32').to_csv('Database/' + symbol + '_price_history.csv')
+        FPG_Fetcher(FPG_YFinanceSource(), start_date, max_workers=1).fetch_ticker(symbol)
         print(f"{symbol} data saved to database folder.")
 
+        self.load_from_csv(symbol)
+
     @property
     def Active(self):
-        return self._active
+        if(self._store is None):
+            return self._active
+        return self._store.active[self._store_idx]
     
     @Active.setter
     def Active(self, value: bool):
-        self._active = value
+        if(self._store is None):
+            self._active = value
+        else:
+            self._store.active[self._store_idx] = value
 
     def Allocate_History(self, Data):
-        numTotalDays = Data.Manager.numTotalDays
-
-        self.History = {"price":                    np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "trading_volume":           np.zeros(numTotalDays,dtype='int32'),
-                        "shares_outstanding":       np.zeros(numTotalDays,dtype='int32'),
-                        "market_cap":               np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "revenue":                  np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "earnings":                 np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "profits":                  np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "expenses":                 np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "EPS":                      np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "PE_ratio":                 np.nan*np.ones(numTotalDays,dtype='float32'),
-                        "volatility_index":         np.nan*np.ones(numTotalDays,dtype='float32')
-                        }
-        
-        if(self.Active):
-            self.History["price"][0]                = self.price
-            self.History["trading_volume"][0]       = self.trading_volume
-            self.History["shares_outstanding"][0]   = self.shares_outstanding
-            self.History["market_cap"][0]           = self.market_cap
-            self.History["revenue"][0]              = self.revenue
-            self.History["earnings"][0]             = self.earnings
-            self.History["profits"][0]              = self.profits
-            self.History["expenses"][0]             = self.expenses
-            self.History["EPS"][0]                  = self.EPS
-            self.History["PE_ratio"][0]             = self.PE_ratio
-            self.History["volatility_index"][0]     = self.volatility_index
+        ''' Binds the company to the simulation's history store, day 0 is recorded if the company is active '''
+        Data.History.bind(self)
+
+        self.History = Data.History.company_history(self._store_idx)
 
     def record_to_history(self, day):
         if(self.Active):
-            self.History["price"][day]                = self.price
-            self.History["trading_volume"][day]       = self.trading_volume
-            self.History["shares_outstanding"][day]   = self.shares_outstanding
-            self.History["market_cap"][day]           = self.market_cap
-            self.History["revenue"][day]              = self.revenue
-            self.History["earnings"][day]             = self.earnings
-            self.History["profits"][day]              = self.profits
-            self.History["expenses"][day]             = self.expenses
-            self.History["EPS"][day]                  = self.EPS
-            self.History["PE_ratio"][day]             = self.PE_ratio
-            self.History["volatility_index"][day]     = self.volatility_index
-
-    def update_price(self, demand, supply):
+            self._store.record_ticker(day, self._store_idx)
+
+    def update_price(self, demand, supply, clearing_price=np.nan):
         """
         Update the stock price based on demand, supply, and other influencing factors.
+        demand & supply are the bid & ask quantities at the auction's clearing price (see FPG_Auction),
+        the traded volume is the smaller of the two.
         """
-        pass
+        volume = min(demand, supply)
+        if(volume <= 0 or np.isnan(clearing_price)):
+            return
+        if(self._store is None):
+            raise RuntimeError(f"{self.ticker} isn't bound to a history store (see Allocate_History)")
+
+        # Same write as the daily auction's, see FPG_Auction.apply_clearing_prices
+        FPG_Auction.set_prices(self._store, np.array([self._store_idx]), clearing_price, volume)
     
     def update_metrics(self):
         """
@@ -283,6 +200,49 @@ class Company:
         """
         pass
 
+def load_companies(tickers, start_date: str, offline: bool = False) -> dict:
+    '''
+        Builds the companies of a ticker universe in bulk from the database's metadata table (see FPG_Database.load_metadata_table).
+        Tickers that aren't complete in the database have their metadata derived from their stored profile & prices,
+        the ones stored without are fetched from yfinance first, concurrently (see FPG_Fetcher).
+        offline raises FPG_OfflineError listing all of those before anything is built
+
+        :return: Company objects by ticker.
+    '''
+    table   = FPG_Database.load_metadata_table(tickers)
+    missing = FPG_Database.incomplete_tickers(tickers, start_date, table)
+
+    if(missing):
+        from FPG_Fetcher import FPG_Fetcher, FPG_FetchError, FPG_YFinanceSource, rederive_metadata
+
+        # Tickers stored with a profile only need their metadata derived for the start date
+        missing = rederive_metadata(missing, start_date, calendar=tickers)
+        if(missing and offline):
+            raise FPG_OfflineError(f"offline mode, {missing.__len__()} tickers would have to be fetched (missing from the database "
+                                   f"or stored without a profile): {', '.join(missing)}")
+
+        if(missing):
+            # yfinance is only imported here, simulations running on the database never load the network stack
+            report = FPG_Fetcher(FPG_YFinanceSource(), start_date, calendar=tickers).fetch(missing)
+            if(report.failed):
+                raise FPG_FetchError(f"{report.failed.__len__()} tickers could not be fetched: " +
+                                     "; ".join(f"{ticker}: {error}" for ticker, error in report.failed.items()))
+        table = FPG_Database.load_metadata_table(tickers)
+
+    rows  = {ticker: row for row, ticker in enumerate(table["ticker"].tolist())}
+    text  = {column for column, dtype in FPG_Database.metadata_types.items() if dtype == 'str'}
+
+    Companies = {}
+    for ticker in tickers:
+        record = table[rows[ticker]]
+        Companies[ticker] = Company.from_metadata(ticker, {attribute: str(record[column]) if column in text else record[column]
+                                                           for attribute, column in metadata_columns.items()})
+    return Companies
+
+for _name in history_fields:
+    setattr(Company, _name, _history_field(_name))
+del _name
+
 
 if __name__ == "__main__":
     CMPNY = Company('O',"1995-01-01")
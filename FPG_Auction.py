@@ -0,0 +1,238 @@
+import numpy as np
+
+from dataclasses import dataclass
+
+BID =  1
+ASK = -1
+
+class FPG_OrderBook:
+    def __init__(self, capacity: int = 1024) -> None:
+        '''
+            Flat arrays of the day's orders, one row per (trader, ticker, side) order
+            capacity:   initial number of orders, grows geometrically
+        '''
+        self.size       = 0
+        self.trader     = np.empty(capacity, dtype='int64')
+        self.ticker     = np.empty(capacity, dtype='int64')
+        self.side       = np.empty(capacity, dtype='int8')
+        ''' BID (buy) or ASK (sell) '''
+        self.price      = np.empty(capacity, dtype='float64')
+        ''' Limit price '''
+        self.quantity   = np.empty(capacity, dtype='int64')
+
+    def __len__(self):
+        return self.size
+
+    def add(self, trader, ticker, side, price, quantity):
+        ''' Appends a batch of orders, every argument is a scalar or an array of the batch length '''
+        count = np.broadcast(trader, ticker, side, price, quantity).size
+        if(self.size + count > self.trader.__len__()):
+            capacity = max(2*self.trader.__len__(), self.size + count)
+            for name in ('trader', 'ticker', 'side', 'price', 'quantity'):
+                column = getattr(self, name)
+                grown  = np.empty(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                setattr(self, name, grown)
+
+        rows = slice(self.size, self.size + count)
+        self.trader[rows]   = trader
+        self.ticker[rows]   = ticker
+        self.side[rows]     = side
+        self.price[rows]    = price
+        self.quantity[rows] = quantity
+        self.size += count
+
+    def orders(self):
+        ''' (trader, ticker, side, price, quantity) views of the stored orders '''
+        return self.trader[:self.size], self.ticker[:self.size], self.side[:self.size], self.price[:self.size], self.quantity[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+@dataclass
+class FPG_AuctionResult:
+    clearing_price: np.ndarray
+    ''' Clearing price of each ticker, NaN where bids & asks didn't cross '''
+
+    volume:         np.ndarray
+    ''' Executed quantity of each ticker '''
+
+    demand:         np.ndarray
+    ''' Bid quantity at or above the clearing price of each ticker '''
+
+    supply:         np.ndarray
+    ''' Ask quantity at or below the clearing price of each ticker '''
+
+    fills:          np.ndarray
+    ''' Executed quantity of each order, in order book order '''
+
+def _segment_starts(keys):
+    ''' Index of the first element of the run each element of a sorted key array belongs to '''
+    new_run = np.empty(keys.__len__(), dtype=bool)
+    new_run[:1] = True
+    new_run[1:] = keys[1:] != keys[:-1]
+    return np.maximum.accumulate(np.where(new_run, np.arange(keys.__len__()), 0))
+
+def _allocate(order, ticker, quantity, volume):
+    ''' Fills orders in priority order until each ticker's volume is used up '''
+    fills = np.zeros(quantity.__len__(), dtype='int64')
+    if(order.__len__() == 0):
+        return fills
+
+    sorted_ticker   = ticker[order]
+    cumulative      = np.cumsum(quantity[order])
+    starts          = _segment_starts(sorted_ticker)
+    before          = cumulative[starts] - quantity[order][starts]
+    ahead           = cumulative - before - quantity[order]     # queue ahead of each order within its ticker
+
+    fills[order] = np.clip(volume[sorted_ticker] - ahead, 0, quantity[order])
+    return fills
+
+def call_auction(ticker, side, price, quantity, numTickers: int) -> FPG_AuctionResult:
+    '''
+        Clears every ticker's orders at the single price that maximizes the executed volume (ties are broken by
+        the smallest demand/supply imbalance, then by the middle of the remaining price range).
+        Orders execute by price then time (order book) priority
+    '''
+    empty = FPG_AuctionResult(clearing_price=np.full(numTickers, np.nan), volume=np.zeros(numTickers, dtype='int64'),
+                              demand=np.zeros(numTickers, dtype='int64'), supply=np.zeros(numTickers, dtype='int64'),
+                              fills=np.zeros(quantity.__len__(), dtype='int64'))
+    if(quantity.__len__() == 0):
+        return empty
+
+    # Price levels of every ticker, sorted by (ticker, price)
+    order       = np.lexsort((price, ticker))
+    level_start = np.flatnonzero(np.append(True, (ticker[order][1:] != ticker[order][:-1]) | (price[order][1:] != price[order][:-1])))
+    is_start    = np.zeros(order.__len__(), dtype=bool)
+    is_start[level_start] = True
+    level_id    = np.cumsum(is_start) - 1
+
+    level_ticker    = ticker[order][level_start]
+    level_price     = price[order][level_start]
+    level_bids      = np.bincount(level_id, weights=np.where(side[order] == BID, quantity[order], 0)).astype('int64')
+    level_asks      = np.bincount(level_id, weights=np.where(side[order] == ASK, quantity[order], 0)).astype('int64')
+
+    # supply(p) = asks priced <= p, demand(p) = bids priced >= p, both within the level's ticker
+    starts      = _segment_starts(level_ticker)
+    cum_asks    = np.cumsum(level_asks)
+    cum_bids    = np.cumsum(level_bids)
+    supply      = cum_asks - (cum_asks[starts] - level_asks[starts])
+    bids_below  = cum_bids - level_bids - (cum_bids[starts] - level_bids[starts])
+    ticker_bids = np.bincount(level_ticker, weights=level_bids, minlength=numTickers).astype('int64')
+    demand      = ticker_bids[level_ticker] - bids_below
+
+    executable  = np.minimum(demand, supply)
+    imbalance   = np.abs(demand - supply)
+
+    best_volume = np.zeros(numTickers, dtype='int64')
+    np.maximum.at(best_volume, level_ticker, executable)
+    best_imbalance = np.full(numTickers, np.iinfo('int64').max)
+    candidates = executable == best_volume[level_ticker]
+    np.minimum.at(best_imbalance, level_ticker[candidates], imbalance[candidates])
+    candidates &= (imbalance == best_imbalance[level_ticker]) & (executable > 0)
+
+    low     = np.full(numTickers, np.inf)
+    high    = np.full(numTickers, -np.inf)
+    np.minimum.at(low, level_ticker[candidates], level_price[candidates])
+    np.maximum.at(high, level_ticker[candidates], level_price[candidates])
+
+    crossed = best_volume > 0
+    result  = empty
+    result.clearing_price[crossed] = (low[crossed] + high[crossed])/2
+    result.volume[crossed] = best_volume[crossed]
+
+    # Demand & supply at the clearing price itself
+    cp = result.clearing_price[ticker]
+    eligible_bids = (side == BID) & (price >= cp)
+    eligible_asks = (side == ASK) & (price <= cp)
+    result.demand = np.bincount(ticker[eligible_bids], weights=quantity[eligible_bids], minlength=numTickers).astype('int64')
+    result.supply = np.bincount(ticker[eligible_asks], weights=quantity[eligible_asks], minlength=numTickers).astype('int64')
+
+    # Price then time priority
+    arrival     = np.arange(quantity.__len__())
+    bid_order   = np.flatnonzero(eligible_bids)
+    bid_order   = bid_order[np.lexsort((arrival[bid_order], -price[bid_order], ticker[bid_order]))]
+    ask_order   = np.flatnonzero(eligible_asks)
+    ask_order   = ask_order[np.lexsort((arrival[ask_order], price[ask_order], ticker[ask_order]))]
+
+    result.fills = _allocate(bid_order, ticker, quantity, result.volume) + _allocate(ask_order, ticker, quantity, result.volume)
+    return result
+
+def collect_portfolio_orders(Traders, book: FPG_OrderBook):
+    '''
+        Gathers the bid/ask entries of every trader portfolio into the order book. Orders are day orders,
+        the entries' quantities are reset once collected. Ask quantities are capped by the trader's holdings
+    '''
+    Traders.Portfolios.collect(book)
+
+def apply_fills(Traders, book: FPG_OrderBook, result: FPG_AuctionResult):
+    '''
+        Settles the executed orders: cash moves in bulk on the pool's balance column,
+        holdings in bulk on the portfolio store
+    '''
+    trader, ticker, side, _, _ = book.orders()
+    filled = np.flatnonzero(result.fills)
+
+    cash = -side[filled]*result.fills[filled]*result.clearing_price[ticker[filled]]
+    np.add.at(Traders.balance, trader[filled], cash)
+
+    Traders.Portfolios.add_holdings(trader[filled], ticker[filled], side[filled].astype('int64')*result.fills[filled])
+
+def set_prices(History, tickers, prices, volumes):
+    ''' Moves tickers to new prices in one vectorized write to the history store's state, with the dependent fields '''
+    History.state('price')[tickers]           = prices
+    History.state('trading_volume')[tickers]  = volumes
+    History.state('market_cap')[tickers]      = prices*History.state('shares_outstanding')[tickers]
+    History.state('PE_ratio')[tickers]        = prices/History.state('EPS')[tickers]
+
+def apply_clearing_prices(History, result: FPG_AuctionResult):
+    '''
+        Moves every traded ticker to its clearing price
+
+        :return: ticker positions whose price changed.
+    '''
+    traded = np.flatnonzero(result.volume > 0)
+    set_prices(History, traded, result.clearing_price[traded], result.volume[traded])
+    return traded
+
+def clear_market(Data):
+    '''
+        Daily call auction over all of the traders' orders
+
+        :return: (FPG_AuctionResult, ticker positions whose price changed).
+    '''
+    book = Data.OrderBook
+    collect_portfolio_orders(Data.Traders, book)
+
+    trader, ticker, side, price, quantity = book.orders()
+    result = call_auction(ticker, side, price, quantity, Data.Market.tickers.__len__())
+
+    apply_fills(Data.Traders, book, result)
+    if(Data.Social is not None):
+        Data.Social.record_trades(trader, ticker, side, result.fills)
+
+    # The day records the shares it executed, tickers that didn't trade record 0
+    Data.History.state('trading_volume')[:] = 0
+    changed = apply_clearing_prices(Data.History, result)
+
+    book.clear()
+    return result, changed
+
+if __name__ == "__main__":
+    import time
+
+    # Throughput benchmark: 100k traders, 500 tickers, one bid or ask per trader per ticker traded
+    rng = np.random.default_rng(0)
+    numTraders, numTickers, numOrders = 100_000, 500, 2_000_000
+
+    book = FPG_OrderBook(numOrders)
+    book.add(rng.integers(numTraders, size=numOrders), rng.integers(numTickers, size=numOrders),
+             rng.choice([BID, ASK], size=numOrders), np.round(100*rng.lognormal(0, 0.05, numOrders), 2),
+             rng.integers(1, 100, size=numOrders))
+
+    start = time.perf_counter()
+    result = call_auction(*book.orders()[1:], numTickers)
+    elapsed = time.perf_counter() - start
+
+    print(f"{numOrders} orders cleared in {elapsed:.3f} s ({numOrders/elapsed:,.0f} orders/s), "
+          f"{result.volume.sum()} shares executed")
@@ -0,0 +1,157 @@
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+
+from FPG_Synthetic import generate_database
+
+benchmark_workspace = 'Benchmark/'
+''' Synthetic databases are generated under this folder, one sub folder per (tickers, days) universe '''
+
+heavy_modules = ('yfinance', 'pycountry_convert', 'requests', 'curl_cffi')
+''' Data fetching stack, the simulation entry point must not import it (see Company.load_from_yfinance) '''
+
+class FPG_BenchmarkRegression(RuntimeError):
+    pass
+
+def case_name(numTickers, traderPoolSize, numDays) -> str:
+    return f"{numTickers} tickers, {traderPoolSize} traders, {numDays} days"
+
+def prepare_universe(numTickers, numDays, workspace=benchmark_workspace, seed=0) -> str:
+    ''' Generates (once) the synthetic database of a universe, returns the folder to run its simulations from '''
+    folder = os.path.abspath(os.path.join(workspace, f"{numTickers}x{numDays}"))
+    if(not os.path.isfile(os.path.join(folder, 'universe.json'))):
+        tickers = generate_database(numTickers, numDays, seed=seed, folder=os.path.join(folder, 'Database'))
+        with open(os.path.join(folder, 'universe.json'), 'w') as file:
+            json.dump({"tickers": tickers, "days": numDays, "seed": seed}, file)
+    return folder
+
+def _run_case(folder, traderPoolSize, randomSeed):
+    ''' Runs one profiled simulation from a universe folder, in a fresh process so that its peak RSS is its own '''
+    os.chdir(folder)
+
+    import FPG_Sim_Main
+    from FPG_Inp import FPG_Input
+
+    with open('universe.json') as file:
+        universe = json.load(file)
+
+    Inp = FPG_Input()
+    Inp.tickers             = universe["tickers"]
+    Inp.traderPoolSize      = traderPoolSize
+    Inp.randomSeed          = randomSeed
+    Inp.use_reference_cache = False
+    Inp.profile             = True
+
+    return FPG_Sim_Main.FPG_Sim(Inp).Profiler.report()
+
+def run_benchmarks(tickers, traders, days, repeats=1, workspace=benchmark_workspace):
+    '''
+        Sweeps every (tickers, traderPoolSize, days) combination, each run in a spawned process.
+        The fastest of the repeats is kept
+
+        :return: {case name: profiler report}.
+    '''
+    context = mp.get_context('spawn')
+    results = {}
+    for numTickers, traderPoolSize, numDays in itertools.product(tickers, traders, days):
+        folder = prepare_universe(numTickers, numDays, workspace)
+
+        reports = []
+        for _ in range(repeats):
+            with context.Pool(1) as pool:
+                reports.append(pool.apply(_run_case, (folder, traderPoolSize, 0)))
+
+        name = case_name(numTickers, traderPoolSize, numDays)
+        results[name] = min(reports, key=lambda report: report["wall_s"])
+        print(f"{name}: {results[name]['wall_s']:.3f} s, peak RSS {results[name]['peak_rss_bytes']/2**20:.1f} MiB")
+
+    return results
+
+def import_time(module='FPG_Sim_Main', repeats=5) -> dict:
+    '''
+        Import time of a module in a fresh interpreter, the cost every simulation & ensemble worker pays before starting.
+        The fastest of the repeats is kept
+
+        :return: {"wall_s": seconds, "peak_rss_bytes": 0, "phases": {}, "heavy_modules": heavy_modules it imported}, comparable like a case's report.
+    '''
+    code = (f"import sys, time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start); "
+            f"print(','.join(name for name in {heavy_modules!r} if name in sys.modules))")
+    timings = []
+    for _ in range(repeats):
+        lines = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, check=True).stdout.splitlines()
+        timings.append(float(lines[0]))
+
+    return {"wall_s": min(timings), "peak_rss_bytes": 0, "phases": {}, "heavy_modules": [name for name in lines[1].split(',') if name]}
+
+def compare_to_baseline(results, baseline, tolerance=0.25, min_seconds=0.05):
+    '''
+        Lists the regressions of results against a baseline: wall time, peak RSS & phase times more than tolerance
+        above the baseline. Phases faster than min_seconds in the baseline are too noisy to be compared
+
+        :return: list of regression descriptions, empty when nothing regressed.
+    '''
+    regressions = []
+    for name, report in results.items():
+        if(name not in baseline):
+            continue
+        reference = baseline[name]
+
+        def check(label, value, base, floor=0):
+            if(base > floor and value > base*(1 + tolerance)):
+                regressions.append(f"{name} / {label}: {value:.4g} vs {base:.4g} baseline (+{100*(value/base - 1):.0f}%)")
+
+        check("wall_s", report["wall_s"], reference["wall_s"], min_seconds)
+        check("peak_rss_bytes", report["peak_rss_bytes"], reference["peak_rss_bytes"])
+        for phase, stats in report["phases"].items():
+            if(phase in reference["phases"]):
+                check(phase + " total_s", stats["total_s"], reference["phases"][phase]["total_s"], min_seconds)
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FPG simulation benchmarks over synthetic universes")
+    parser.add_argument('--tickers', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--traders', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--days', type=int, nargs='+', default=[500, 2500])
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help="baseline results to compare against")
+    parser.add_argument('--update-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown ratio before failing")
+    parser.add_argument('--output', default=None, help="also write the results to this file")
+    parser.add_argument('--import-budget', type=float, default=1.0, help="seconds allowed to import the simulation entry point")
+    args = parser.parse_args()
+
+    imports = import_time()
+    print(f"import FPG_Sim_Main: {imports['wall_s']:.3f} s")
+    if(imports["heavy_modules"]):
+        raise FPG_BenchmarkRegression("FPG_Sim_Main imports the data fetching stack: " + ", ".join(imports["heavy_modules"]))
+    if(imports["wall_s"] > args.import_budget):
+        raise FPG_BenchmarkRegression(f"FPG_Sim_Main takes {imports['wall_s']:.3f} s to import, over the {args.import_budget} s budget")
+
+    results = {"import FPG_Sim_Main": imports}
+    results.update(run_benchmarks(args.tickers, args.traders, args.days, args.repeats))
+
+    if(args.output is not None):
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=4)
+
+    if(args.update_baseline or not os.path.isfile(args.baseline)):
+        baseline = {}
+        if(os.path.isfile(args.baseline)):
+            with open(args.baseline) as file:
+                baseline = json.load(file)
+        baseline.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump(baseline, file, indent=4)
+        print(f"baseline saved to {args.baseline}")
+    else:
+        with open(args.baseline) as file:
+            regressions = compare_to_baseline(results, json.load(file), args.tolerance)
+        if(regressions):
+            raise FPG_BenchmarkRegression("performance regressions against " + args.baseline + ":\n" + "\n".join(regressions))
+        print(f"no regression against {args.baseline}")
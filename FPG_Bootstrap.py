@@ -0,0 +1,121 @@
+import numpy as np
+
+from FPG_Inp import FPG_Input
+from Company import Company
+from FPG_Database import FPG_PriceHistory
+from FPG_DataStrc import FPG_Reference, build_reference
+from FPG_Random import FPG_RandomStreams
+
+max_chunk_bytes = 256 << 20
+''' Default memory budget of one chunk of generated paths '''
+
+path_cell_bytes = 3*8 + 4
+''' Peak bytes per (path, day, ticker) cell of paths(): the float64 returns, exp & scaled path temporaries & the float32 result '''
+
+class FPG_BlockBootstrap:
+    def __init__(self, price_history: FPG_PriceHistory, mean_block_length: float = 20, seed: int = 0) -> None:
+        '''
+            Stationary block bootstrap of a multi-ticker price history: each synthetic path is a resampled
+            sequence of the historical trading days, cut into blocks of geometrically distributed length
+            (circular wrap around the history). All of the tickers share the resampled days, so
+            the cross-ticker correlation of the daily returns is kept
+            price_history:      FPG_PriceHistory the paths are resampled from
+            mean_block_length:  mean block length in days, longer blocks keep more of the returns' autocorrelation
+            seed:               paths are keyed by (seed, path number) so they don't depend on the chunking
+        '''
+        self.price_history      = price_history
+        self.mean_block_length  = mean_block_length
+        self.RNG                = FPG_RandomStreams(seed)
+
+        adj_close   = price_history.adj_close.astype('float64')
+        valid       = ~np.isnan(adj_close)
+
+        # Log returns of the forward filled prices, days without a return (before listing) don't move the path
+        last_valid  = np.maximum.accumulate(np.where(valid, np.arange(price_history.numDays)[:, np.newaxis], 0), axis=0)
+        filled      = adj_close[last_valid, np.arange(adj_close.shape[1])]
+        log_returns = np.nan_to_num(np.diff(np.log(filled), axis=0))
+
+        # Blocks are drawn from the days on which every listed ticker has data, a ticker listed later
+        # would otherwise get flat returns (no correlation) from the days before its listing
+        listed = price_history.first_valid[price_history.first_valid < price_history.numDays]
+        common_start = int(listed.max()) if listed.__len__() > 0 else 0
+        if(log_returns.shape[0] - common_start >= mean_block_length):
+            log_returns = log_returns[common_start:]
+
+        self.log_returns = log_returns
+        ''' [historical day, ticker] returns the blocks are drawn from '''
+
+        self.valid  = valid
+        ''' Original validity mask, kept by every path (listing dates & gaps) '''
+
+        first_valid = np.minimum(price_history.first_valid, price_history.numDays - 1)
+        self.anchor = adj_close[first_valid, np.arange(adj_close.shape[1])]
+        ''' Price of each ticker on its first valid day, the start of every path '''
+
+        # Close/Adj Close ratio of the history, so that generated closes keep the dividend & split adjustments
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.close_ratio = np.nan_to_num(price_history.close.astype('float64')/adj_close, nan=1.0)
+
+    @property
+    def numDays(self) -> int:
+        return self.price_history.numDays
+
+    def source_days(self, path) -> np.ndarray:
+        ''' Row of log_returns drawn for every day of a path, day 0 has no return '''
+        numReturns  = self.log_returns.shape[0]
+        rng         = self.RNG.generator('bootstrap', path)
+
+        new_block       = rng.random(self.numDays) < 1/self.mean_block_length
+        new_block[0]    = True
+        block_starts    = rng.integers(numReturns, size=self.numDays) if numReturns > 0 else np.zeros(self.numDays, dtype='int64')
+
+        # Position in the block of every day, blocks run over consecutive historical days
+        block_first = np.maximum.accumulate(np.where(new_block, np.arange(self.numDays), 0))
+        return (block_starts[block_first] + np.arange(self.numDays) - block_first) % max(numReturns, 1)
+
+    def paths(self, start, stop) -> np.ndarray:
+        ''' float32 [path, day, ticker] Adj Close of paths [start, stop), NaN where the history has no data '''
+        source  = np.stack([self.source_days(path) for path in range(start, stop)])
+        returns = self.log_returns[source] if self.log_returns.shape[0] > 0 else np.zeros(source.shape + self.anchor.shape)
+
+        # Every ticker starts from its historical price on its first valid day
+        returns[:, np.arange(self.numDays)[:, np.newaxis] <= self.price_history.first_valid] = 0
+        paths = self.anchor*np.exp(np.cumsum(returns, axis=1))
+
+        paths[:, ~self.valid] = np.nan
+        return paths.astype('float32')
+
+    def chunks(self, numPaths, chunk_size=None):
+        '''
+            Streams numPaths paths in chunks, yields (first path number, [path, day, ticker] Adj Close)
+            chunk_size: paths per chunk, defaults to what fits in max_chunk_bytes
+        '''
+        if(chunk_size is None):
+            chunk_size = max(1, max_chunk_bytes // max(1, path_cell_bytes*self.numDays*self.anchor.__len__()))
+
+        for start in range(0, numPaths, chunk_size):
+            yield start, self.paths(start, min(start + chunk_size, numPaths))
+
+    def price_history_of(self, adj_close) -> FPG_PriceHistory:
+        ''' FPG_PriceHistory of one generated [day, ticker] path, on the historical date & ticker axes '''
+        prices = np.stack([adj_close*self.close_ratio, adj_close], axis=2).astype('float32')
+        return FPG_PriceHistory(dates=self.price_history.dates, tickers=self.price_history.tickers, prices=prices,
+                                first_valid=self.price_history.first_valid, valid_bits=self.price_history.valid_bits)
+
+def bootstrap_references(Inp: FPG_Input, Reference: FPG_Reference, price_history: FPG_PriceHistory, numPaths,
+                         mean_block_length: float = 20, chunk_size=None):
+    '''
+        Streams the FPG_Reference of numPaths bootstrapped market histories, any of which can replace the
+        historical reference of FPG_Data (FPG_Data(Inp, Reference=...)) or of an ensemble
+        Inp:            Input data of the FPG simulation, defines the groupings & the bootstrap seed (randomSeed)
+        Reference:      historical reference, provides the companies' attributes
+        price_history:  FPG_PriceHistory of Inp.tickers the paths are resampled from
+
+        :return: generator of (path number, FPG_Reference).
+    '''
+    Companies = {ticker: Company.from_metadata(ticker, Reference.company_metadata[ticker]) for ticker in price_history.tickers}
+    bootstrap = FPG_BlockBootstrap(price_history, mean_block_length, Inp.randomSeed)
+
+    for start, paths in bootstrap.chunks(numPaths, chunk_size):
+        for offset, adj_close in enumerate(paths):
+            yield start + offset, build_reference(Inp, Companies, bootstrap.price_history_of(adj_close))
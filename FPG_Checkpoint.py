@@ -0,0 +1,231 @@
+import numpy as np
+import json
+import os
+import shutil
+
+from FPG_DataStrc import FPG_Data, FPG_Manager, FPG_RefData, FPG_Market
+from FPG_Reference_Utils import FPG_IndexSet, FPG_Grouping
+from FPG_Distributions import FPG_ReturnDistribution
+from FPG_History import FPG_HistoryStore
+from FPG_IndexTracker import FPG_IndexTracker
+from FPG_Indicators import FPG_Indicators
+from FPG_Scheduler import FPG_TradeScheduler
+from FPG_Social import FPG_SocialNetwork
+from FPG_Random import FPG_RandomStreams
+from FPG_Auction import FPG_OrderBook
+from FPG_Profiler import null_profiler
+from FPG_Output import FPG_OutputWriter
+from Company import Company
+from Trader import TraderPool
+from FPG_Portfolio import FPG_PortfolioStore
+
+checkpoint_version = 8
+''' Bump whenever the layout changes, older checkpoints are refused '''
+
+def _plain(value):
+    ''' JSON-able copy of an attribute value (numpy scalars & arrays become python values) '''
+    if(isinstance(value, np.generic)):
+        return value.item()
+    if(isinstance(value, np.ndarray)):
+        return value.tolist()
+    if(isinstance(value, (list, tuple))):
+        return [_plain(item) for item in value]
+    if(isinstance(value, dict)):
+        return {key: _plain(item) for key, item in value.items()}
+    return value
+
+def _object_state(obj, prefix, arrays, skip=()):
+    ''' Splits an object's attributes into arrays (saved as .npy under prefix) & JSON-able values '''
+    values = {}
+    for name, value in vars(obj).items():
+        if(name in skip):
+            continue
+        if(isinstance(value, np.ndarray)):
+            arrays[prefix + name] = value
+        else:
+            values[name] = _plain(value)
+    return values
+
+def _restore_object(obj, prefix, values, arrays):
+    for name, value in values.items():
+        setattr(obj, name, value)
+    for name in arrays:
+        if(name.startswith(prefix) and '.' not in name[prefix.__len__():]):
+            setattr(obj, name[prefix.__len__():], arrays[name])
+    return obj
+
+def save_checkpoint(Data: FPG_Data, path, day: int = None):
+    '''
+        Saves the full simulation state: a manifest.json (scalars, company attributes, random stream states) &
+        one .npy file per array, no per-object pickling. The folder is replaced atomically, so a periodic
+        checkpoint survives a crash while it is being written
+        Data:   FPG_Data to save
+        path:   checkpoint folder
+        day:    next day to simulate on resume, defaults to the day after the last recorded one
+    '''
+    arrays = {}
+    manifest = {"version": checkpoint_version,
+                "day": Data.History.recorded_stop if day is None else int(day)}
+
+    manifest["Manager"] = _object_state(Data.Manager, "manager.", arrays)
+    manifest["Market"]  = _object_state(Data.Market, "market.", arrays, skip=('returnDistributions',))
+
+    manifest["RefData"] = {"indices": []}
+    arrays["refdata.dates"] = np.asarray(Data.RefData.dates)
+    for pos, (name, index_set) in enumerate(Data.RefData.Indices.items()):
+        manifest["RefData"]["indices"].append([name, index_set.names])
+        arrays["refdata.%d.price_index" % pos]   = index_set.price_index
+        arrays["refdata.%d.index_returns" % pos] = index_set.index_returns
+
+    manifest["returnDistributions"] = []
+    for pos, (name, distribution) in enumerate(Data.Market.returnDistributions.items()):
+        manifest["returnDistributions"].append([name, distribution.names])
+        arrays["distribution.%d.quantiles" % pos] = distribution.quantiles
+        arrays["distribution.%d.counts" % pos]    = distribution.counts
+
+    manifest["RNG"] = {"seed":      _plain(Data.RNG.seed),
+                       "streams":   {name: generator.bit_generator.state for name, generator in Data.RNG._streams.items()}}
+
+    manifest["Companies"] = {ticker: _object_state(company, "company.%d." % pos, arrays, skip=('History', '_store', '_store_idx'))
+                             for pos, (ticker, company) in enumerate(Data.Companies.items())}
+
+    manifest["History"] = _object_state(Data.History, "history.", arrays, skip=('_rows', 'listeners', 'ticker_idx'))
+
+    manifest["IndexTracker"] = _object_state(Data.IndexTracker, "tracker.", arrays, skip=('History', 'groupings'))
+    manifest["IndexTracker"]["groupings"] = []
+    for pos, grouping in enumerate(Data.IndexTracker.groupings):
+        manifest["IndexTracker"]["groupings"].append([grouping.name, grouping.distribution, grouping.groups])
+        arrays["grouping.%d.tickers" % pos] = grouping.tickers
+        arrays["grouping.%d.members" % pos] = grouping.members
+
+    manifest["Indicators"] = _object_state(Data.Indicators, "indicators.", arrays, skip=('History',))
+
+    Traders = Data.Traders
+    manifest["Traders"] = _object_state(Traders, "traders.", arrays, skip=('Portfolios', '_Data'))
+    manifest["Portfolios"] = _object_state(Traders.Portfolios, "portfolios.", arrays, skip=('active', '_touched'))
+    arrays["portfolios.pending.keys"] = Traders.Portfolios.pending_keys()
+
+    Scheduler = Data.Scheduler
+    manifest["Scheduler"] = _object_state(Scheduler, "scheduler.", arrays, skip=('Traders', 'RNG', '_buckets', '_income_groups'))
+    arrays["scheduler.bucket_sizes"]    = np.array([sum(group.__len__() for group in bucket) for bucket in Scheduler._buckets], dtype='int64')
+    arrays["scheduler.bucket_traders"]  = np.concatenate([group for bucket in Scheduler._buckets for group in bucket] + [np.empty(0, dtype='int64')])
+
+    manifest["Social"] = _object_state(Data.Social, "social.", arrays, skip=('Traders',)) if Data.Social is not None else None
+
+    # A streamed output is resumed with the checkpoint: the segments written so far & the current chunk's trader stats
+    manifest["Output"] = None
+    if(Data.Output is not None):
+        Data.Output.sync()
+        manifest["Output"] = {"folder": os.path.abspath(Data.Output.folder), "snapshot_interval": Data.Output.snapshot_interval}
+        arrays["output.stats"] = Data.Output.stats
+
+    manifest["arrays"] = sorted(arrays.keys())
+
+    # Written next to the target & swapped in once complete
+    path = os.path.normpath(path)
+    tmp_path, old_path = path + '.tmp', path + '.old'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), np.ascontiguousarray(array))
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file)
+
+    if(os.path.isdir(path)):
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+def _load_array(path):
+    ''' Memory-mapped copy-on-write array: pages are read on first access & writes never reach the file '''
+    try:
+        return np.load(path, mmap_mode='c')
+    except ValueError: # empty arrays can't be mapped
+        return np.load(path)
+
+def load_checkpoint(path):
+    '''
+        Restores a simulation saved by save_checkpoint, trader & history arrays are memory-mapped.
+        A streamed output is reopened & continues from the checkpoint's day. The profiler isn't part of the state,
+        attach a new one to keep profiling
+
+        :return: (FPG_Data, next day to simulate), see FPG_Sim_Main.FPG_Run to resume it.
+    '''
+    with open(os.path.join(path, 'manifest.json')) as file:
+        manifest = json.load(file)
+    if(manifest["version"] != checkpoint_version):
+        raise ValueError(f"checkpoint version {manifest['version']} isn't supported (expected {checkpoint_version})")
+
+    arrays = {name: _load_array(os.path.join(path, name + '.npy')) for name in manifest["arrays"]}
+
+    Data = FPG_Data.__new__(FPG_Data)
+    Data.Manager    = _restore_object(FPG_Manager(), "manager.", manifest["Manager"], arrays)
+    Data.Market     = _restore_object(FPG_Market(), "market.", manifest["Market"], arrays)
+
+    Data.RefData = FPG_RefData()
+    Data.RefData.dates = arrays["refdata.dates"]
+    for pos, (name, names) in enumerate(manifest["RefData"]["indices"]):
+        Data.RefData.Indices[name] = FPG_IndexSet(names, arrays["refdata.%d.price_index" % pos], arrays["refdata.%d.index_returns" % pos])
+
+    Data.Market.returnDistributions = {name: FPG_ReturnDistribution(names, arrays["distribution.%d.quantiles" % pos], arrays["distribution.%d.counts" % pos])
+                                       for pos, (name, names) in enumerate(manifest["returnDistributions"])}
+
+    Data.RNG = FPG_RandomStreams(manifest["RNG"]["seed"])
+    for name, state in manifest["RNG"]["streams"].items():
+        Data.RNG.stream(name).bit_generator.state = state
+
+    History = _restore_object(FPG_HistoryStore.__new__(FPG_HistoryStore), "history.", manifest["History"], arrays)
+    History.ticker_idx  = {ticker: idx for idx, ticker in enumerate(History.tickers)}
+    History.listeners   = []
+    History._index_rows()
+    Data.History = History
+
+    Data.Companies = {}
+    for pos, (ticker, values) in enumerate(manifest["Companies"].items()):
+        company = _restore_object(Company.__new__(Company), "company.%d." % pos, values, arrays)
+        company._store      = History
+        company._store_idx  = History.ticker_idx[ticker]
+        company.History     = History.company_history(company._store_idx)
+        Data.Companies[ticker] = company
+
+    tracker = manifest["IndexTracker"]
+    groupings = [FPG_Grouping(name, distribution, groups, arrays["grouping.%d.tickers" % pos], arrays["grouping.%d.members" % pos])
+                 for pos, (name, distribution, groups) in enumerate(tracker.pop("groupings"))]
+    Data.IndexTracker = _restore_object(FPG_IndexTracker.__new__(FPG_IndexTracker), "tracker.", tracker, arrays)
+    Data.IndexTracker.History   = History
+    Data.IndexTracker.groupings = groupings
+
+    Data.Indicators = _restore_object(FPG_Indicators.__new__(FPG_Indicators), "indicators.", manifest["Indicators"], arrays)
+    Data.Indicators.History = History
+    History.listeners.append(Data.Indicators)
+
+    Traders = _restore_object(TraderPool.__new__(TraderPool), "traders.", manifest["Traders"], arrays)
+    Traders._Data = Data
+    Traders.Portfolios = _restore_object(FPG_PortfolioStore.__new__(FPG_PortfolioStore), "portfolios.", manifest["Portfolios"], arrays)
+    Traders.Portfolios.active   = History.active
+    Traders.Portfolios._touched = [] if Traders.Portfolios.sparse else [arrays["portfolios.pending.keys"]]
+    Data.Traders = Traders
+
+    Scheduler = _restore_object(FPG_TradeScheduler.__new__(FPG_TradeScheduler), "scheduler.", manifest["Scheduler"], arrays)
+    Scheduler.Traders   = Traders
+    Scheduler.RNG       = Data.RNG
+    bounds = np.cumsum(arrays["scheduler.bucket_sizes"])[:-1]
+    Scheduler._buckets  = [[np.array(bucket)] if bucket.__len__() > 0 else [] for bucket in np.split(arrays["scheduler.bucket_traders"], bounds)]
+    Scheduler._group_income()
+    Data.Scheduler = Scheduler
+
+    Data.Social = None
+    if(manifest["Social"] is not None):
+        Data.Social = _restore_object(FPG_SocialNetwork.__new__(FPG_SocialNetwork), "social.", manifest["Social"], arrays)
+        Data.Social.Traders = Traders
+
+    Data.OrderBook  = FPG_OrderBook()
+    Data.Profiler   = null_profiler
+
+    Data.Output = None
+    if(manifest["Output"] is not None):
+        Data.Output = FPG_OutputWriter(manifest["Output"]["folder"], Data, manifest["Output"]["snapshot_interval"], resume_day=manifest["day"])
+        Data.Output.stats[:] = arrays["output.stats"]
+
+    return Data, manifest["day"]
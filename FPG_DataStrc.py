@@ -1,22 +1,59 @@
 import numpy as np
-import random as rnd
 import pandas as pd
 import gc
 
 from dataclasses import dataclass
 
 from FPG_Inp import FPG_Input
-from Company import Company
-from Trader import Trader
+from Company import Company, load_companies
+from Trader import TraderPool
+from FPG_History import FPG_HistoryStore
+from FPG_IndexTracker import FPG_IndexTracker
+from FPG_Indicators import FPG_Indicators
+from FPG_Auction import FPG_OrderBook
+from FPG_Scheduler import FPG_TradeScheduler
+from FPG_Social import FPG_SocialNetwork
+from FPG_Random import FPG_RandomStreams
+from FPG_Output import FPG_OutputWriter
+from FPG_Profiler import create_profiler, null_profiler
 
 import FPG_Reference_Utils as FPG_RefUtils
+import FPG_Database
 import FPG_Utils
 
+def _reference_index(name):
+    ''' Date indexed DataFrame of a reference index, built on first access '''
+    def getter(self):
+        return self.frame(name)
+
+    def setter(self, frame):
+        self.Indices[name] = FPG_RefUtils.FPG_IndexSet.from_frame(frame)
+        self._frames[name] = frame
+        self.dates = frame.index.to_numpy(dtype='datetime64[ns]').view('int64')
+
+    return property(getter, setter)
+
 @dataclass
 class FPG_RefData:
-    World_idx      = pd.DataFrame()
-    Sector_idx     = pd.DataFrame()
-    Geographic_idx = pd.DataFrame()
+    dates          = np.empty(0, dtype='int64')
+    ''' Trading date axis of the reference indices, int64 nanoseconds since the epoch '''
+
+    Indices        = {}
+    ''' FPG_IndexSet of every reference index, by name '''
+
+    World_idx      = _reference_index('World_idx')
+    Sector_idx     = _reference_index('Sector_idx')
+    Geographic_idx = _reference_index('Geographic_idx')
+
+    def __post_init__(self):
+        self.Indices = {}
+        self._frames = {}
+
+    def frame(self, name) -> pd.DataFrame:
+        ''' Date indexed DataFrame of any reference index, e.g. 'Industry_idx' or 'Custom_idx' '''
+        if(name not in self._frames):
+            self._frames[name] = self.Indices[name].to_frame(self.dates)
+        return self._frames[name]
 
 @dataclass
 class FPG_Manager:
@@ -56,36 +93,102 @@ class FPG_Market:
     wealthThresholds        = [1e4, 1e5, 1e6]
     ''' Wealth benchmarks '''
 
-    returnDistributions     = {"World_idx": {}, "Sector_idx": {}, "Geographical_idx": {}}
-    ''' Daily return distributions of the various indices '''
+    returnDistributions     = {}
+    ''' FPG_ReturnDistribution (daily change quantile tables) of the various indices, by index '''
 
     day: int = 0
     ''' Market trading day '''
 
+@dataclass
+class FPG_Reference:
+    tickers:                list
+    ''' Ticker universe '''
+
+    dates:                  np.ndarray
+    ''' Trading date axis of the reference indices, int64 nanoseconds since the epoch '''
+
+    Indices:                dict
+    ''' FPG_IndexSet of every reference index, by name '''
+
+    returnDistributions:    dict
+    ''' Daily return distributions of the reference indices '''
+
+    company_metadata:       dict
+    ''' Database attributes of every company, by ticker, see Company.from_metadata '''
+
+def build_reference(Inp: FPG_Input, Companies, price_history) -> FPG_Reference:
+    '''
+        Calculates the reference indices of a price history, historical (see load_reference) or generated
+        Companies:      Company objects by ticker, provide the shares outstanding & the grouping attributes
+        price_history:  FPG_PriceHistory of Inp.tickers
+    '''
+    MarketCaps = FPG_RefUtils.calculate_market_caps(Companies, price_history)
+    Indices, returnDistributions = FPG_RefUtils.calculate_reference_indices(price_history, MarketCaps, Companies, Inp)
+
+    return FPG_Reference(tickers=list(Inp.tickers), dates=price_history.dates, Indices=Indices, returnDistributions=returnDistributions,
+                         company_metadata={ticker: Companies[ticker].metadata() for ticker in Inp.tickers})
+
+def load_reference(Inp: FPG_Input, Profiler=null_profiler) -> FPG_Reference:
+    '''
+        Loads everything a simulation reads from the database: the companies' attributes & the reference indices.
+        The result can be shared by any number of FPG_Data instances (e.g. the seeds of an ensemble)
+        Profiler:   FPG_Profiler timing the loading phases
+    '''
+    with Profiler.phase("reference.companies"):
+        Companies = load_companies(Inp.tickers, Inp.start_date, Inp.offline)
+
+    # Reference data calculation, reused from the cache when the universe & its database files didn't change
+    with Profiler.phase("reference.cache"):
+        refCacheKey = FPG_RefUtils.reference_cache_key(Inp.tickers, Inp.start_date, Inp.index_groupings, Inp.custom_groups)
+        cached      = FPG_RefUtils.load_reference_cache(refCacheKey) if Inp.use_reference_cache else None
+
+    if(cached is not None):
+        dates, Indices, returnDistributions = cached
+        return FPG_Reference(tickers=list(Inp.tickers), dates=dates, Indices=Indices, returnDistributions=returnDistributions,
+                             company_metadata={ticker: Companies[ticker].metadata() for ticker in Inp.tickers})
+
+    with Profiler.phase("reference.prices"):
+        price_history = FPG_Database.load_price_histories(Inp.tickers)
+
+    with Profiler.phase("reference.indices"):
+        Reference = build_reference(Inp, Companies, price_history)
+
+    if(Inp.use_reference_cache):
+        with Profiler.phase("reference.cache"):
+            FPG_RefUtils.save_reference_cache(refCacheKey, Reference.dates, Reference.Indices, Reference.returnDistributions)
+
+    return Reference
+
 class FPG_Data:
-    def __init__(self, Inp: FPG_Input) -> None:
+    def __init__(self, Inp: FPG_Input, Reference: FPG_Reference = None) -> None:
+        '''
+            Inp:        Input data of the FPG simulation
+            Reference:  preloaded database data (see load_reference), loaded from the database if None
+        '''
+        self.Profiler = create_profiler(Inp)
+        ''' Phase timer & event counters of the run, a no-op unless Inp.profile is set '''
+
+        if(Reference is None):
+            with self.Profiler.phase("data.reference"):
+                Reference = load_reference(Inp, self.Profiler)
+
         self.Manager = FPG_Manager()
         self.RefData = FPG_RefData()
         self.Market  = FPG_Market()
+        self.RNG     = FPG_RandomStreams(Inp.randomSeed)
 
         self.Market.tickers = Inp.tickers
 
-        self.Companies = {ticker: Company(ticker,Inp.start_date) for ticker in self.Market.tickers}
-
-        # Reference data calculation
-        historical_data = FPG_RefUtils.load_historical_data(Inp)
-        MarketCaps      = FPG_RefUtils.calculate_market_caps(self.Companies, historical_data)
+        with self.Profiler.phase("data.companies"):
+            self.Companies = {ticker: Company.from_metadata(ticker, Reference.company_metadata[ticker]) for ticker in self.Market.tickers}
 
-        Stock_Weights   = FPG_RefUtils.calculate_stock_weights(MarketCaps) # Stock weights only for world index
-        self.RefData.World_idx, self.Market.returnDistributions["World_idx"] = FPG_RefUtils.calculate_index(historical_data,Stock_Weights) # Calculate world index using all of the stocks
-        self.RefData.Sector_idx, self.Market.returnDistributions["Sector_idx"], \
-        self.RefData.Geographic_idx, self.Market.returnDistributions["Geographical_idx"] = FPG_RefUtils.calculate_sector_geographic_indices(historical_data, MarketCaps, self.Companies)
-
-        del historical_data, MarketCaps, Stock_Weights
+        self.RefData.dates      = Reference.dates
+        self.RefData.Indices    = dict(Reference.Indices)
+        self.Market.returnDistributions = Reference.returnDistributions
 
         # Initialize market
         self.Manager.start_date     = Inp.start_date
-        self.Manager.numTotalDays   = self.RefData.World_idx.__len__()
+        self.Manager.numTotalDays   = self.RefData.dates.__len__()
         self.Manager.randomSeed     = Inp.randomSeed
 
         self.Market.traderPoolSize  = Inp.traderPoolSize
@@ -93,22 +196,53 @@ class FPG_Data:
         self.Market.giniCoeff       = Inp.gini_coeff
         self.Market.alphaCoeff      = FPG_Utils.alpha_from_gini(self.Market.giniCoeff)
 
-        distribution_sum = sum(self.Companies[ticker].trading_volume/self.Companies[ticker].shares_outstanding \
-                               for ticker in self.Market.tickers if self.Companies[ticker].Active)
-        totalMarketCap = 0
-        for ticker in self.Market.tickers:
-            if(self.Companies[ticker].Active):
-                self.Companies[ticker].popularity = (self.Companies[ticker].trading_volume/self.Companies[ticker].shares_outstanding)\
-                                                    /distribution_sum
-            
-                totalMarketCap += self.Companies[ticker].market_cap
+        with self.Profiler.phase("data.history"):
+            distribution_sum = sum(self.Companies[ticker].trading_volume/self.Companies[ticker].shares_outstanding \
+                                   for ticker in self.Market.tickers if self.Companies[ticker].Active)
+            self.History = FPG_HistoryStore(self.Manager.numTotalDays, self.Market.tickers,
+                                            Inp.output_chunk_days if Inp.output_folder is not None else None)
+            ''' Columnar [field, day, ticker] history of all of the companies, only the current chunk when the outputs are streamed '''
+
+            totalMarketCap = 0
+            for ticker in self.Market.tickers:
+                if(self.Companies[ticker].Active):
+                    self.Companies[ticker].popularity = (self.Companies[ticker].trading_volume/self.Companies[ticker].shares_outstanding)\
+                                                        /distribution_sum
+                
+                    totalMarketCap += self.Companies[ticker].market_cap
+
+                self.Companies[ticker].Allocate_History(self)
+
+        with self.Profiler.phase("data.indices"):
+            self.IndexTracker = FPG_IndexTracker(self.History, FPG_RefUtils.build_groupings(self.Companies, self.Market.tickers, Inp.index_groupings, Inp.custom_groups),
+                                                 self.Manager.numTotalDays)
+            ''' Simulated world/group indices, same layout as the reference indices '''
+            self.IndexTracker.record(0)
 
-            self.Companies[ticker].Allocate_History(self)
+            self.Indicators = FPG_Indicators(self.History, self.Manager.numTotalDays, Inp.indicator_window, Inp.rsi_window)
+            ''' Technical indicators of every ticker & day, read by (day, ticker) lookups '''
 
         self.Market.totalMarketCap = totalMarketCap
         self.Market.wealthDistribution = np.cumsum(Inp.wealthDistribution)
 
         # Initialize traders
-        self.Traders = [Trader(Inp, self) for _ in range(self.Market.traderPoolSize)]
+        with self.Profiler.phase("data.traders"):
+            self.Traders = TraderPool(Inp, self)
+
+        with self.Profiler.phase("data.scheduler"):
+            self.Scheduler = FPG_TradeScheduler(self.Traders, self.Manager.numTotalDays, self.RNG)
+            ''' Next trade & income days of every trader '''
+
+        with self.Profiler.phase("data.social"):
+            popularity = [self.Companies[ticker].popularity if self.Companies[ticker].Active else 0 for ticker in self.Market.tickers]
+            self.Social = FPG_SocialNetwork(self.Traders, popularity, self.RNG, Inp.social_graph, Inp.social_degree, Inp.social_rewiring) \
+                          if Inp.social_graph is not None else None
+            ''' Trader influence network through which the day's trades spread, None when disabled '''
+
+        self.OrderBook = FPG_OrderBook()
+        ''' Day orders of all of the traders, cleared once a day by FPG_Auction.clear_market '''
+
+        self.Output = FPG_OutputWriter(Inp.output_folder, self, Inp.trader_snapshot_interval) if Inp.output_folder is not None else None
+        ''' Streaming writer of the simulation outputs, closed by FPG_Sim '''
 
         gc.collect()  # Force garbage collection to free memory
\ No newline at end of file
@@ -0,0 +1,276 @@
+import numpy as np
+import pandas as pd
+import os
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+database_folder = 'Database/'
+
+price_history_dtype = np.dtype([('Date', 'int64'), ('Close', 'float32'), ('Adj Close', 'float32')])
+''' Binary layout of a price history, dates are stored as int64 nanoseconds since the epoch '''
+
+price_fields = ('Close', 'Adj Close')
+''' Last axis of FPG_PriceHistory.prices '''
+
+cache_version = 1
+''' Bump whenever price_history_dtype or the parsing changes, invalidates every cache file '''
+
+metadata_types = {"name":                   'str',
+                  "country":                'str',
+                  "region":                 'str',
+                  "industry":               'str',
+                  "sector":                 'str',
+                  "price":                  'float64',
+                  "trading_volume":         'int64',
+                  "shares_outstanding":     'int64',
+                  "market_cap":             'float64',
+                  "revenue":                'float64',
+                  "earnings":               'float64',
+                  "profits":                'float64',
+                  "expenses":               'float64',
+                  "EPS":                    'float64',
+                  "PE_ratio":               'float64',
+                  "volatility_window_size": 'int64',
+                  "volatility_index":       'float64',
+                  "start date":             'str',
+                  "days since start date":  'int64'}
+''' Columns of the metadata .csv files & their types in the metadata table, as pandas parses them '''
+
+metadata_version = 1
+''' Bump whenever metadata_types changes, invalidates the metadata table '''
+
+def metadata_csv(ticker) -> str:
+    return database_folder + ticker + '.csv'
+
+def price_history_csv(ticker) -> str:
+    return database_folder + ticker + '_price_history.csv'
+
+def profile_csv(ticker) -> str:
+    return database_folder + ticker + '_profile.csv'
+
+def price_history_cache(ticker) -> str:
+    return database_folder + ticker + '_price_history.npy'
+
+def metadata_table_path() -> str:
+    return database_folder + 'metadata_table.npy'
+
+def file_fingerprint(path) -> str:
+    ''' Cheap identity of a file's content, changes whenever the file is rewritten '''
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns} {stat.st_size}"
+
+def read_price_history_csv(path) -> np.ndarray:
+    '''
+        Parses a price history .csv file into a price_history_dtype structured array
+    '''
+    temp = pd.read_csv(path)
+
+    dates = pd.to_datetime(temp['Date'])
+    if(dates.dt.tz is not None):
+        dates = dates.dt.tz_localize(None)
+
+    history = np.empty(temp.__len__(), dtype=price_history_dtype)
+    history['Date']         = dates.to_numpy(dtype='datetime64[ns]').view('int64')
+    history['Close']        = temp['Close'].to_numpy()
+    history['Adj Close']    = temp['Adj Close'].to_numpy()
+
+    return history
+
+def write_atomically(path, write):
+    '''
+        Calls write(file) on a uniquely named temporary file next to path & moves it over path once complete,
+        so readers never see a partial file & concurrent writers of the same path never share a temporary file
+    '''
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as file:
+            write(file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if(os.path.exists(tmp_path)):
+            os.remove(tmp_path)
+        raise
+
+def _write_price_history_cache(ticker, history, fingerprint):
+    cache_path  = price_history_cache(ticker)
+    write_atomically(cache_path, lambda file: np.save(file, history))
+
+    # The key goes last so an interrupted write is never mistaken for a valid cache
+    with open(cache_path + '.key', 'w') as file:
+        file.write(f"{cache_version} {fingerprint}")
+
+def load_price_history(ticker) -> np.ndarray:
+    '''
+        Loads a ticker's price history as a price_history_dtype structured array.
+        The binary cache next to the .csv is memory-mapped when it matches the .csv's mtime & size,
+        otherwise the .csv is parsed & the cache is rebuilt
+    '''
+    csv_path    = price_history_csv(ticker)
+    cache_path  = price_history_cache(ticker)
+    fingerprint = file_fingerprint(csv_path)
+
+    try:
+        with open(cache_path + '.key') as file:
+            if(file.read() == f"{cache_version} {fingerprint}"):
+                return np.load(cache_path, mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+
+    history = read_price_history_csv(csv_path)
+    try:
+        _write_price_history_cache(ticker, history, fingerprint)
+    except OSError:
+        print(f"could not write {ticker}'s price history cache, using the .csv file")
+
+    return history
+
+def _metadata_array(columns) -> np.ndarray:
+    ''' Structured metadata table of equal length columns, text columns are as wide as their longest entry '''
+    columns = {name: np.asarray(values, dtype=metadata_types.get(name, 'str')) for name, values in columns.items()}
+    table = np.empty(columns["ticker"].__len__(), dtype=[(name, values.dtype) for name, values in columns.items()])
+    for name, values in columns.items():
+        table[name] = values
+    return table
+
+def read_metadata_csvs(tickers) -> np.ndarray:
+    ''' Parses the metadata .csv files of the tickers into a metadata table, the slow path of load_metadata_table '''
+    tickers = list(tickers)
+    rows    = pd.concat([pd.read_csv(metadata_csv(ticker)) for ticker in tickers], ignore_index=True) if tickers else pd.DataFrame(columns=list(metadata_types))
+
+    columns = {"ticker": tickers, "fingerprint": [file_fingerprint(metadata_csv(ticker)) for ticker in tickers]}
+    for name, dtype in metadata_types.items():
+        columns[name] = rows[name].astype(str).to_numpy() if dtype == 'str' else rows[name].to_numpy(dtype=dtype)
+    return _metadata_array(columns)
+
+def load_metadata_table(tickers) -> np.ndarray:
+    '''
+        Metadata of every ticker with a database .csv file, in one structured array with a ticker, a fingerprint &
+        one field per metadata_types column, rows in the order of tickers.
+        The whole database's metadata is kept in a single table file next to the .csv files, only the rows whose
+        .csv changed since (or aren't in it yet) are parsed again & the table is then rewritten
+    '''
+    fingerprints = {}
+    for ticker in tickers:
+        try:
+            fingerprints[ticker] = file_fingerprint(metadata_csv(ticker))
+        except FileNotFoundError:
+            pass
+    tickers = list(fingerprints.keys())
+
+    table = None
+    try:
+        with open(metadata_table_path() + '.key') as file:
+            if(file.read() == str(metadata_version)):
+                table = np.load(metadata_table_path())
+    except (OSError, ValueError):
+        pass
+    if(table is None):
+        table = _metadata_array({"ticker": [], "fingerprint": [], **{name: [] for name in metadata_types}})
+
+    rows  = {ticker: row for row, ticker in enumerate(table["ticker"].tolist())}
+    stale = [ticker for ticker, fingerprint in fingerprints.items()
+             if(ticker not in rows or table["fingerprint"][rows[ticker]] != fingerprint)]
+
+    if(stale):
+        fresh   = read_metadata_csvs(stale)
+        keep    = np.ones(table.__len__(), dtype=bool)
+        keep[[rows[ticker] for ticker in stale if ticker in rows]] = False
+        table   = _metadata_array({name: np.concatenate([table[name][keep], fresh[name]]) for name in fresh.dtype.names})
+        rows    = {ticker: row for row, ticker in enumerate(table["ticker"].tolist())}
+
+        try:
+            write_atomically(metadata_table_path(), lambda file: np.save(file, table))
+            with open(metadata_table_path() + '.key', 'w') as file:
+                file.write(str(metadata_version))
+        except OSError:
+            print("could not write the metadata table, using the .csv files")
+
+    return table[[rows[ticker] for ticker in tickers]]
+
+def incomplete_tickers(tickers, start_date: str, table: np.ndarray = None) -> list:
+    '''
+        Tickers that can't be simulated from the database as is: no metadata, metadata derived for another
+        start date or no price history
+        table:  load_metadata_table of the tickers if already loaded
+    '''
+    table = load_metadata_table(tickers) if table is None else table
+    saved = dict(zip(table["ticker"].tolist(), table["start date"].tolist()))
+    return [ticker for ticker in tickers if(saved.get(ticker) != start_date or not os.path.isfile(price_history_csv(ticker)))]
+
+def price_history_frame(history) -> pd.DataFrame:
+    ''' Date indexed Close & Adj Close frame of a price_history_dtype array '''
+    index = pd.DatetimeIndex(history['Date'].view('datetime64[ns]'), name='Date')
+    return pd.DataFrame({'Close': history['Close'], 'Adj Close': history['Adj Close']}, index=index)
+
+@dataclass
+class FPG_PriceHistory:
+    dates:          np.ndarray
+    ''' Union trading date axis of all of the tickers, int64 nanoseconds since the epoch '''
+
+    tickers:        list
+    ''' Ticker axis '''
+
+    prices:         np.ndarray
+    ''' float32 [day, ticker, price field], NaN where a ticker has no data '''
+
+    first_valid:    np.ndarray
+    ''' First day with data of each ticker (days count if the ticker has no data at all) '''
+
+    valid_bits:     np.ndarray
+    ''' Validity bitmask of every [day, ticker] cell, packed along the ticker axis '''
+
+    @property
+    def numDays(self) -> int:
+        return self.dates.__len__()
+
+    @property
+    def close(self) -> np.ndarray:
+        return self.prices[:, :, 0]
+
+    @property
+    def adj_close(self) -> np.ndarray:
+        return self.prices[:, :, 1]
+
+    @property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.dates.view('datetime64[ns]'), name='Date')
+
+    def valid(self) -> np.ndarray:
+        ''' Unpacked [day, ticker] validity mask '''
+        return np.unpackbits(self.valid_bits, axis=1, count=self.tickers.__len__()).astype(bool)
+
+    def to_frame(self) -> pd.DataFrame:
+        ''' Date indexed frame with (ticker, Close/Adj Close) columns '''
+        columns = pd.MultiIndex.from_product([self.tickers, price_fields])
+        return pd.DataFrame(self.prices.reshape(self.numDays, -1), index=self.index, columns=columns)
+
+def load_price_histories(tickers, max_workers=None) -> FPG_PriceHistory:
+    '''
+        Loads the price histories of all of the tickers concurrently & merges them in one step
+        onto the union of their trading dates
+        tickers:        ticker symbols to load
+        max_workers:    loader thread count, defaults to the executor's own default
+    '''
+    tickers = list(tickers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        histories = list(executor.map(load_price_history, tickers))
+
+    lengths     = np.array([history.__len__() for history in histories], dtype='int64')
+    allHistory  = np.concatenate(histories) if histories else np.empty(0, dtype=price_history_dtype)
+    tickerIdx   = np.repeat(np.arange(tickers.__len__()), lengths)
+
+    dates = np.unique(allHistory['Date'])
+    dayIdx = np.searchsorted(dates, allHistory['Date'])
+
+    prices = np.full((dates.__len__(), tickers.__len__(), price_fields.__len__()), np.nan, dtype='float32')
+    for field_idx, field in enumerate(price_fields):
+        prices[dayIdx, tickerIdx, field_idx] = allHistory[field]
+    del allHistory, histories
+
+    valid = ~np.isnan(prices[:, :, 1])
+    first_valid = np.where(valid.any(axis=0), valid.argmax(axis=0), dates.__len__())
+
+    return FPG_PriceHistory(dates=dates, tickers=tickers, prices=prices, first_valid=first_valid,
+                            valid_bits=np.packbits(valid, axis=1))
@@ -0,0 +1,105 @@
+import numpy as np
+
+from dataclasses import dataclass
+
+quantile_knots = 1024
+''' Knots of a return distribution's quantile table, its size doesn't depend on the history length '''
+
+def quantile_table(sorted_columns, lengths, knots: int = quantile_knots) -> np.ndarray:
+    '''
+        [column, knot] quantiles of column-wise sorted samples, at the probabilities linspace(0, 1, knots).
+        Only the first lengths[column] rows of each column are samples (at least one row), columns without any sample are NaN
+    '''
+    sorted_columns  = np.asarray(sorted_columns, dtype='float64')
+    lengths         = np.asarray(lengths, dtype='int64')
+    columns         = np.arange(lengths.__len__())
+
+    position    = np.linspace(0, 1, knots)[:, np.newaxis]*np.maximum(lengths - 1, 0)
+    low         = np.floor(position).astype('int64')
+    high        = np.minimum(low + 1, np.maximum(lengths - 1, 0))
+    frac        = position - low
+
+    table = sorted_columns[low, columns]
+    table = table + frac*(sorted_columns[high, columns] - table)
+    table[:, lengths == 0] = np.nan
+    return np.ascontiguousarray(table.T)
+
+@dataclass
+class FPG_ReturnDistribution:
+    names:      list
+    ''' Group names of a grouped index set, None for a single (world) index '''
+
+    quantiles:  np.ndarray
+    ''' float64 [group, knot], daily change (%) at the probabilities linspace(0, 1, knots) '''
+
+    counts:     np.ndarray
+    ''' int64 [group], number of daily changes each table summarizes '''
+
+    @classmethod
+    def from_samples(cls, names, samples, knots: int = quantile_knots):
+        ''' Quantile tables of one daily change array per group (single array when names is None) '''
+        samples = [samples] if names is None else list(samples)
+        lengths = np.array([sample.__len__() for sample in samples], dtype='int64')
+
+        columns = np.full((max(lengths.max(initial=0), 1), lengths.__len__()), np.nan)
+        for col, sample in enumerate(samples):
+            columns[:sample.__len__(), col] = np.sort(sample)
+
+        return cls(names, quantile_table(columns, lengths, knots), lengths)
+
+    @classmethod
+    def stack(cls, distributions: dict):
+        '''
+            One table over every group of several distributions, to draw all of them in a single call
+            distributions:  {returnDistributions key: FPG_ReturnDistribution}, groups are named (key, group name)
+        '''
+        names = [(key, name) for key, distribution in distributions.items() for name in (distribution.names or [None])]
+        return cls(names, np.vstack([distribution.quantiles for distribution in distributions.values()]),
+                   np.concatenate([distribution.counts for distribution in distributions.values()]))
+
+    @property
+    def numGroups(self) -> int:
+        return self.quantiles.shape[0]
+
+    @property
+    def numKnots(self) -> int:
+        return self.quantiles.shape[1]
+
+    @property
+    def probabilities(self) -> np.ndarray:
+        return np.linspace(0, 1, self.numKnots)
+
+    def group(self, name) -> int:
+        ''' Row of a group in the quantile table '''
+        return 0 if self.names is None else self.names.index(name)
+
+    def ppf(self, u, groups=0):
+        '''
+            Inverse CDF: daily change (%) at probability u of each group, u & groups broadcast together.
+            The knots are evenly spaced in probability, so the bracketing knot is found by scaling u
+            instead of a search
+        '''
+        u, groups = np.broadcast_arrays(np.asarray(u, dtype='float64'), np.asarray(groups, dtype='int64'))
+
+        position    = np.clip(u, 0, 1)*(self.numKnots - 1)
+        low         = np.minimum(position.astype('int64'), self.numKnots - 2)
+        frac        = position - low
+
+        flat    = self.quantiles.reshape(-1)
+        base    = groups*self.numKnots + low
+        return flat[base] + frac*(flat[base + 1] - flat[base])
+
+    def sample(self, rng: np.random.Generator, size=None, groups=None):
+        '''
+            Random daily changes (%) drawn by inverse transform sampling
+            rng:    numpy Generator, e.g. FPG_RandomStreams.stream(...)
+            size:   number (or shape) of draws of each group, one draw per group if None
+            groups: group rows to draw, every group if None (the single group of a world index)
+            :return: array of shape size + groups.shape
+        '''
+        if(groups is None):
+            groups = 0 if self.names is None else np.arange(self.numGroups)
+        groups = np.asarray(groups, dtype='int64')
+
+        shape = groups.shape if size is None else tuple(np.atleast_1d(size)) + groups.shape
+        return self.ppf(rng.random(shape), groups)
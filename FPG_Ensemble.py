@@ -0,0 +1,144 @@
+import numpy as np
+import multiprocessing as mp
+import os
+
+from copy import copy
+from multiprocessing import shared_memory
+
+import FPG_Sim_Main
+from FPG_Inp import FPG_Input
+from FPG_DataStrc import FPG_Reference, load_reference
+from FPG_Reference_Utils import FPG_IndexSet
+from FPG_Distributions import FPG_ReturnDistribution
+
+def _attach(name) -> shared_memory.SharedMemory:
+    ''' Attaches to an existing segment, its lifetime stays with the process that created it '''
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # track was added in python 3.13, pool workers share their parent's resource tracker anyway
+        return shared_memory.SharedMemory(name=name)
+
+class FPG_SharedReference:
+    def __init__(self, Reference: FPG_Reference) -> None:
+        '''
+            Places the arrays of a FPG_Reference in one shared memory segment, workers rebuild
+            the reference as zero-copy views through attach(spec). Owned by the creating process, see close()
+        '''
+        arrays = {"dates": Reference.dates}
+        for name, index_set in Reference.Indices.items():
+            arrays[name + "/price index"]   = index_set.price_index
+            arrays[name + "/index returns"] = index_set.index_returns
+
+        distribution_groups = {}
+        for name, distribution in Reference.returnDistributions.items():
+            distribution_groups[name] = distribution.names
+            arrays[name + "/quantiles"] = distribution.quantiles
+            arrays[name + "/counts"]    = distribution.counts
+
+        layout = {}
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            layout[name] = (offset, array.shape, array.dtype.str)
+            offset += -(-array.nbytes//64)*64 # keep every array 64 byte aligned
+
+        self.segment = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, array in arrays.items():
+            start, shape, dtype = layout[name]
+            np.ndarray(shape, dtype=dtype, buffer=self.segment.buf, offset=start)[...] = array
+
+        self.spec = {"segment":             self.segment.name,
+                     "layout":              layout,
+                     "tickers":             Reference.tickers,
+                     "index names":         {name: index_set.names for name, index_set in Reference.Indices.items()},
+                     "distribution groups": distribution_groups,
+                     "company metadata":    Reference.company_metadata}
+        ''' Small picklable description of the segment, everything a worker needs to attach '''
+
+    def close(self):
+        self.segment.close()
+        self.segment.unlink()
+
+    @staticmethod
+    def attach(spec):
+        ''' (segment, FPG_Reference) whose arrays are read-only views into the shared segment '''
+        segment = _attach(spec["segment"])
+
+        def view(name):
+            start, shape, dtype = spec["layout"][name]
+            array = np.ndarray(shape, dtype=dtype, buffer=segment.buf, offset=start)
+            array.flags.writeable = False
+            return array
+
+        Indices = {name: FPG_IndexSet(names, view(name + "/price index"), view(name + "/index returns"))
+                   for name, names in spec["index names"].items()}
+
+        returnDistributions = {name: FPG_ReturnDistribution(groups, view(name + "/quantiles"), view(name + "/counts"))
+                               for name, groups in spec["distribution groups"].items()}
+
+        return segment, FPG_Reference(tickers=spec["tickers"], dates=view("dates"), Indices=Indices,
+                                      returnDistributions=returnDistributions, company_metadata=spec["company metadata"])
+
+def summarize(Data, seed) -> dict:
+    ''' Per-seed summary: final simulated index levels & trader wealth statistics '''
+    balance = np.sort(Data.Traders.balance)
+    n = balance.__len__()
+    gini = (2*np.sum(np.arange(1, n + 1)*balance)/(n*balance.sum())) - (n + 1)/n if n > 0 and balance.sum() > 0 else np.nan
+
+    summary = {"seed": seed, "days": Data.Manager.numTotalDays}
+    for name, index_set in Data.IndexTracker.Indices.items():
+        levels = index_set.price_index[-1]
+        summary[name] = float(levels[0]) if index_set.names is None else dict(zip(index_set.names, levels.tolist()))
+
+    summary["wealth"] = {"mean":    float(balance.mean()),
+                         "median":  float(np.median(balance)),
+                         "p99":     float(np.quantile(balance, 0.99)),
+                         "total":   float(balance.sum()),
+                         "gini":    float(gini)}
+    return summary
+
+_worker = {}
+
+def _init_worker(spec, Inp):
+    _worker["segment"], _worker["Reference"] = FPG_SharedReference.attach(spec)
+    _worker["Inp"] = Inp
+
+def seed_folder(folder, seed):
+    ''' Output or checkpoint folder of one seed of an ensemble, None stays None '''
+    return None if folder is None else os.path.join(folder, f'seed_{seed}')
+
+def _run_seed(seed):
+    Inp = copy(_worker["Inp"])
+    Inp.randomSeed = seed
+    Inp.output_folder       = seed_folder(Inp.output_folder, seed)
+    Inp.checkpoint_folder   = seed_folder(Inp.checkpoint_folder, seed)
+
+    return summarize(FPG_Sim_Main.FPG_Sim(Inp, _worker["Reference"]), seed)
+
+def run_ensemble(Inp: FPG_Input, seeds, processes=None, Reference: FPG_Reference = None):
+    '''
+        Runs one simulation per seed over a process pool, the database is read once by this process &
+        shared with the workers through shared memory. Yields each seed's summary as soon as it finishes
+        Inp:        Input data of the FPG simulation, its randomSeed is replaced by each seed & its output &
+                    checkpoint folders get a seed_<seed> sub folder per seed
+        seeds:      random seeds to run
+        processes:  pool size, defaults to the number of CPUs
+        Reference:  preloaded database data, loaded from the database if None
+    '''
+    if(Reference is None):
+        Reference = load_reference(Inp)
+
+    shared = FPG_SharedReference(Reference)
+    try:
+        with mp.Pool(processes, initializer=_init_worker, initargs=(shared.spec, Inp)) as pool:
+            for summary in pool.imap_unordered(_run_seed, seeds):
+                yield summary
+    finally:
+        shared.close()
+
+if __name__ == "__main__":
+    Inp = FPG_Input()
+    Inp.tickers = ['AAPL', 'TSLA', 'NVDA', 'INTC', 'MSFT']
+
+    for summary in run_ensemble(Inp, range(8)):
+        print(summary["seed"], summary["World_idx"], summary["wealth"]["median"])
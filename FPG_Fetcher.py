@@ -0,0 +1,572 @@
+import numpy as np
+import pandas as pd
+import argparse
+import datetime as dt
+import json
+import os
+import shutil
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+
+import FPG_Database
+
+failures_file = 'fetch_failures.json'
+''' Failed tickers of the last fetches, in the database folder '''
+
+volatility_window_size = 20
+
+profile_columns = ("name", "country", "region", "industry", "sector", "currency", "fx_rate",
+                   "shares_outstanding", "revenue", "expenses", "reference_date", "reference_close")
+''' Start date independent facts of a company, fetched once into its profile .csv. The metadata of any start date
+    is derived from them & the stored price history (see derive_metadata), revenue & expenses are the latest
+    yearly figures, reference_close is the USD close of reference_date they are scaled from '''
+
+class FPG_FetchError(RuntimeError):
+    pass
+
+class FPG_DataSource:
+    '''
+        Where the fetcher gets a company's data from, one call per method & ticker:
+        - info(symbol):         dict with shortName, industry, sector, country, currency, sharesOutstanding
+                                (or floatShares) & totalRevenue, as yfinance's Ticker.info
+        - history(symbol, start):   date indexed frame of the daily history with Close, Adj Close & Volume columns,
+                                    in full or from the start timestamp on
+        - financials(symbol):   yearly financial statements, rows such as "Total Expenses", "Net Income" &
+                                "Total Revenue", latest year first, as yfinance's Ticker.financials
+        - fx_rate(currency):    latest USD price of one unit of currency
+        - region(country):      continent of a country
+    '''
+    def info(self, symbol) -> dict:
+        raise NotImplementedError
+
+    def history(self, symbol, start: pd.Timestamp = None) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def financials(self, symbol) -> pd.DataFrame:
+        raise NotImplementedError
+
+    def fx_rate(self, currency) -> float:
+        raise NotImplementedError
+
+    def region(self, country) -> str:
+        from pycountry_convert import country_alpha2_to_continent_code, country_name_to_country_alpha2
+        from Company import continent_names
+
+        return continent_names[country_alpha2_to_continent_code(country_name_to_country_alpha2(country))]
+
+class FPG_YFinanceSource(FPG_DataSource):
+    ''' Yahoo finance through yfinance, imported when the source is created '''
+    def __init__(self) -> None:
+        import yfinance
+        self._yf = yfinance
+
+    def info(self, symbol) -> dict:
+        return self._yf.Ticker(symbol).info
+
+    def history(self, symbol, start: pd.Timestamp = None) -> pd.DataFrame:
+        if(start is None):
+            data = self._yf.download(symbol, period="max", progress=False, auto_adjust=False)
+        else:
+            data = self._yf.download(symbol, start=start.strftime('%Y-%m-%d'), progress=False, auto_adjust=False)
+        if(isinstance(data.columns, pd.MultiIndex)):
+            data = data.xs(symbol, axis=1, level=1)
+        return data
+
+    def financials(self, symbol) -> pd.DataFrame:
+        return self._yf.Ticker(symbol).financials
+
+    def fx_rate(self, currency) -> float:
+        pair  = currency + "USD=X"
+        close = self._yf.download(pair, period='5d', interval="1d", progress=False, auto_adjust=False)['Adj Close']
+        if(isinstance(close, pd.DataFrame)):
+            close = close[pair]
+        return float(close.dropna().iloc[-1])
+
+class FPG_LocalSource(FPG_DataSource):
+    def __init__(self, infos: dict, histories: dict, financials: dict = {}, fx_rates: dict = {}, latency: float = 0.0) -> None:
+        '''
+            In memory stand-in of a data source for tests & benchmarks, symbols without an info raise KeyError like a bad ticker
+            infos:      {symbol: info dict}, an info may give its "region" directly
+            histories:  {symbol: history frame}
+            financials: {symbol: financials frame}, empty frames by default
+            fx_rates:   {currency: USD rate}
+            latency:    seconds every call sleeps, emulates the network
+        '''
+        self.infos      = infos
+        self.histories  = histories
+        self.statements = financials
+        self.fx_rates   = fx_rates
+        self.latency    = latency
+        self.calls      = {}
+        ''' Calls made by method name, checked by tests '''
+
+        self._lock      = threading.Lock()
+
+    def _call(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        if(self.latency > 0):
+            time.sleep(self.latency)
+
+    def info(self, symbol) -> dict:
+        self._call("info")
+        return dict(self.infos[symbol])
+
+    def history(self, symbol, start: pd.Timestamp = None) -> pd.DataFrame:
+        self._call("history")
+        history = self.histories[symbol]
+        return (history if start is None else history[history.index >= start]).copy()
+
+    def financials(self, symbol) -> pd.DataFrame:
+        self._call("financials")
+        return self.statements.get(symbol, pd.DataFrame()).copy()
+
+    def fx_rate(self, currency) -> float:
+        self._call("fx_rate")
+        return self.fx_rates[currency]
+
+    def region(self, country) -> str:
+        for info in self.infos.values():
+            if(info.get("country") == country and "region" in info):
+                return info["region"]
+        return super().region(country)
+
+class FPG_RateLimiter:
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        '''
+            Thread safe token bucket, acquire() blocks so that calls don't exceed rate per second on average
+            rate:   calls per second, None or 0 for no limit
+            burst:  calls allowed back to back after an idle period
+        '''
+        self.rate   = rate
+        self.burst  = burst
+        self._tokens = float(burst)
+        self._stamp  = time.monotonic()
+        self._lock   = threading.Lock()
+
+    def acquire(self):
+        if(not self.rate):
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._stamp)*self.rate)
+            self._stamp  = now
+            self._tokens -= 1
+            wait = -self._tokens/self.rate
+        if(wait > 0):
+            time.sleep(wait)
+
+def _first_valid(values, what):
+    values = np.asarray(values, dtype='float64')
+    valid = values[~np.isnan(values)]
+    if(valid.__len__() == 0):
+        raise FPG_FetchError(f"Failed to get {what}!")
+    return valid[0]
+
+def _total_expenses(financials) -> float:
+    ''' Latest total expenses, or total revenue - net income when they aren't reported '''
+    if("Total Expenses" in financials.index):
+        return _first_valid(financials.loc["Total Expenses"].values, "total expenses directly")
+    if("Net Income" in financials.index and "Total Revenue" in financials.index):
+        return _first_valid(financials.loc["Total Revenue"].values - financials.loc["Net Income"].values,
+                            "total expenses from net income & total revenue")
+    raise FPG_FetchError("Failed to get total expenses!")
+
+def stored_prices(history: pd.DataFrame, fx_rate: float) -> pd.DataFrame:
+    ''' Rows of the price history .csv from a source history: Date indexed Close & Adj Close in USD (float32) & Volume '''
+    history = history[history["Close"].notna()]
+
+    index = pd.DatetimeIndex(history.index, name='Date')
+    if(index.tz is not None):
+        index = index.tz_localize(None)
+
+    return pd.DataFrame({'Close':       (history["Close"].to_numpy(dtype='float64')*fx_rate).astype('float32'),
+                         'Adj Close':   (history["Adj Close"].to_numpy(dtype='float64')*fx_rate).astype('float32'),
+                         'Volume':      history["Volume"].fillna(0).to_numpy(dtype='int64')}, index=index)
+
+def company_profile(symbol, info: dict, financials: pd.DataFrame, region: str, fx_rate: float, prices: pd.DataFrame) -> dict:
+    ''' Profile .csv row of a company, see profile_columns '''
+    if(prices.__len__() == 0):
+        raise FPG_FetchError(f"{symbol} has no price history")
+
+    shares_outstanding = info.get('sharesOutstanding') or info.get('floatShares')
+    if(shares_outstanding is None):
+        raise FPG_FetchError(f"Both sharesOutstanding and floatShares are missing for {symbol}")
+
+    return {"name":                 info['shortName'],
+            "country":              info['country'],
+            "region":               region,
+            "industry":             info['industry'],
+            "sector":               info['sector'],
+            "currency":             info.get('currency') or 'USD',
+            "fx_rate":              fx_rate,
+            "shares_outstanding":   shares_outstanding,
+            "revenue":              info.get('totalRevenue') or 0,
+            "expenses":             _total_expenses(financials),
+            "reference_date":       str(prices.index[-1].date()),
+            "reference_close":      prices["Close"].iloc[-1]}
+
+def first_session(start_date: str, tickers) -> pd.Timestamp:
+    '''
+        First trading day on or after start_date of the simulation's calendar, the union of the tickers' stored trading
+        dates (see FPG_Database.load_price_histories), so exchange holidays are skipped. start_date if none is stored
+    '''
+    start   = pd.Timestamp(start_date).value
+    session = None
+    for ticker in tickers:
+        if(not os.path.isfile(FPG_Database.price_history_csv(ticker))):
+            continue
+        dates = FPG_Database.load_price_history(ticker)['Date']
+        idx   = np.searchsorted(dates, start)
+        if(idx < dates.__len__() and (session is None or dates[idx] < session)):
+            session = dates[idx]
+    return pd.Timestamp(start if session is None else session)
+
+def derive_metadata(profile: dict, prices: pd.DataFrame, start_date: str, session: pd.Timestamp = None) -> dict:
+    '''
+        Derives a company's database attributes on the simulation's start date (see FPG_Database.metadata_types)
+        from its profile & stored price history, without any source call
+        session:    first trading day of the simulation (see first_session), the company's own first one on or after
+                    start_date by default
+    '''
+    close   = prices["Close"].to_numpy(dtype='float64')
+    volume  = prices["Volume"].to_numpy()
+
+    dt_start_date       = pd.to_datetime(start_date)
+    first_trading_day   = prices.index.min()
+    idx_start           = prices.index.get_indexer([dt_start_date], method='nearest')[0] if first_trading_day < dt_start_date else 0
+
+    price               = close[idx_start]
+    trading_volume      = volume[idx_start]
+    shares_outstanding  = profile["shares_outstanding"]
+
+    market_cap          = shares_outstanding*price
+    price_change_factor = price/profile["reference_close"]
+
+    revenue     = profile["revenue"]*price_change_factor
+    earnings    = price*shares_outstanding*price_change_factor
+    expenses    = profile["expenses"]*price_change_factor
+    profits     = revenue - expenses
+
+    EPS         = earnings/shares_outstanding   # earnings per share
+    PE_ratio    = price/EPS                     # price to earnings (EPS) ratio
+
+    if(idx_start > volatility_window_size - 1):
+        volatility_index = np.std(close[idx_start - volatility_window_size + 1:idx_start + 1])*np.sqrt(volatility_window_size)
+    else:
+        # if past data is not available, use the NEXT volatility_window_size days
+        volatility_index = np.std(close[0:volatility_window_size])*np.sqrt(volatility_window_size)
+
+    # Number of days till company's inception, counted from the first session so a company trading from it
+    # is active on day 0 even if the start date is a weekend or a holiday
+    if(session is None):
+        session = prices.index[prices.index >= dt_start_date].min() if (prices.index >= dt_start_date).any() else dt_start_date
+    days_since_start_date = max((first_trading_day - session).days, 0)
+
+    return {"name":                     profile["name"],
+            "country":                  profile["country"],
+            "region":                   profile["region"],
+            "industry":                 profile["industry"],
+            "sector":                   profile["sector"],
+            "price":                    np.float32(price),
+            "trading_volume":           trading_volume,
+            "shares_outstanding":       shares_outstanding,
+            "market_cap":               np.float32(market_cap),
+            "revenue":                  np.float32(revenue),
+            "earnings":                 np.float32(earnings),
+            "profits":                  np.float32(profits),
+            "expenses":                 np.float32(expenses),
+            "EPS":                      np.float32(EPS),
+            "PE_ratio":                 np.float32(PE_ratio),
+            "volatility_window_size":   volatility_window_size,
+            "volatility_index":         np.float32(volatility_index),
+            "start date":               start_date,
+            "days since start date":    days_since_start_date}
+
+def _write_csv(frame: pd.DataFrame, path, index):
+    tmp_path = path + '.tmp'
+    frame.to_csv(tmp_path, index=index)
+    os.replace(tmp_path, path)
+
+def _append_csv(frame: pd.DataFrame, path):
+    ''' Appends rows to a .csv through a copy of it, an interrupted append leaves the file as it was '''
+    tmp_path = path + '.tmp'
+    shutil.copyfile(path, tmp_path)
+    frame.to_csv(tmp_path, mode='a', header=False)
+    os.replace(tmp_path, path)
+
+def load_profile(symbol) -> dict:
+    ''' The company's profile, None if it was never fetched with one '''
+    try:
+        return pd.read_csv(FPG_Database.profile_csv(symbol)).iloc[0].to_dict()
+    except FileNotFoundError:
+        return None
+
+def load_stored_prices(symbol) -> pd.DataFrame:
+    ''' The company's stored price history, None if it's missing or was stored without volumes '''
+    try:
+        prices = pd.read_csv(FPG_Database.price_history_csv(symbol), index_col='Date', parse_dates=['Date'])
+    except FileNotFoundError:
+        return None
+    return prices if "Volume" in prices.columns else None
+
+def write_metadata(symbol, start_date: str, profile: dict = None, prices: pd.DataFrame = None, session: pd.Timestamp = None):
+    ''' Derives & writes the metadata .csv of start_date from the stored profile & prices (or the given ones), see derive_metadata '''
+    profile = load_profile(symbol) if profile is None else profile
+    prices  = load_stored_prices(symbol) if prices is None else prices
+    _write_csv(pd.DataFrame([derive_metadata(profile, prices, start_date, session)]), FPG_Database.metadata_csv(symbol), index=False)
+
+def rederive_metadata(tickers, start_date: str, calendar=None) -> list:
+    '''
+        Writes the metadata of start_date of every ticker stored with a profile & volumes, no source calls
+        calendar:   tickers whose stored trading dates make the simulation's calendar (see first_session), the tickers by default
+
+        :return: the tickers that have to be fetched instead.
+    '''
+    stored = [ticker for ticker in tickers if _is_stored(ticker)]
+    if(stored):
+        session = first_session(start_date, tickers if calendar is None else calendar)
+        for ticker in stored:
+            write_metadata(ticker, start_date, session=session)
+    return sorted(set(tickers) - set(stored), key=list(tickers).index)
+
+def _last_stored_date(path) -> pd.Timestamp:
+    ''' Date of the last row of a price history .csv, None if it's missing or stored without volumes '''
+    try:
+        with open(path, 'rb') as file:
+            if(b"Volume" not in file.readline()):
+                return None
+            file.seek(0, os.SEEK_END)
+            file.seek(max(file.tell() - 1024, 0))
+            lines = file.read().splitlines()
+    except FileNotFoundError:
+        return None
+    return pd.Timestamp(lines[-1].split(b',')[0].decode())
+
+def _is_stored(symbol) -> bool:
+    ''' Whether the ticker's profile & price history with volumes are stored, its metadata is derived without source calls '''
+    return os.path.isfile(FPG_Database.profile_csv(symbol)) and _last_stored_date(FPG_Database.price_history_csv(symbol)) is not None
+
+@dataclass
+class FPG_FetchReport:
+    fetched:    list = field(default_factory=list)
+    ''' Tickers fetched or refreshed from the source '''
+
+    derived:    list = field(default_factory=list)
+    ''' Tickers whose metadata was derived from the database for the start date, without source calls '''
+
+    skipped:    list = field(default_factory=list)
+    ''' Tickers already complete in the database '''
+
+    failed:     dict = field(default_factory=dict)
+    ''' {ticker: error message} '''
+
+class FPG_Fetcher:
+    def __init__(self, source: FPG_DataSource, start_date: str, max_workers: int = 8, rate: float = 4.0, burst: int = 4,
+                 retries: int = 2, backoff: float = 1.0, calendar=None) -> None:
+        '''
+            Bulk database fetcher: tickers are fetched concurrently & written to the database as they complete,
+            a failing ticker is recorded in the database's fetch_failures.json instead of stopping the others.
+            Price histories & profiles are written first & the metadata last, once the calendar's histories are all stored,
+            so an interrupted fetch resumes from the tickers that aren't complete in the database. The stored history
+            doesn't depend on the start date, see fetch & refresh_ticker
+            source:         FPG_DataSource the data comes from
+            start_date:     simulation start date the metadata is derived for (FPG_Input.start_date)
+            max_workers:    tickers fetched at the same time
+            rate:           source calls per second, shared by all of the workers, None for no limit
+            burst:          source calls allowed back to back
+            retries:        extra attempts of a failing source call
+            backoff:        seconds before the first retry, doubled at every retry
+            calendar:       tickers whose stored trading dates make the simulation's calendar (see first_session),
+                            the fetched ones by default
+        '''
+        self.source         = source
+        self.start_date     = start_date
+        self.max_workers    = max_workers
+        self.limiter        = FPG_RateLimiter(rate, burst)
+        self.retries        = retries
+        self.backoff        = backoff
+        self.calendar       = calendar
+
+        self._fx        = {}
+        ''' {currency: Future of its USD rate}, each currency is fetched once '''
+
+        self._fx_lock   = threading.Lock()
+
+    def _call(self, method, *args):
+        ''' Rate limited source call, retried with an exponential backoff '''
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire()
+            try:
+                return method(*args)
+            except Exception:
+                if(attempt == self.retries):
+                    raise
+                time.sleep(self.backoff*2**attempt)
+
+    def fx_rate(self, currency) -> float:
+        if(currency in (None, 'USD')):
+            return 1.0
+
+        with self._fx_lock:
+            future = self._fx.get(currency)
+            owner  = future is None
+            if(owner):
+                future = self._fx[currency] = Future()
+
+        if(owner):
+            try:
+                future.set_result(self._call(self.source.fx_rate, currency))
+            except Exception as error:
+                future.set_exception(error)
+        return future.result()
+
+    def _session(self, tickers) -> pd.Timestamp:
+        return first_session(self.start_date, tickers if self.calendar is None else self.calendar)
+
+    def _store_ticker(self, symbol) -> int:
+        ''' Fetches a ticker's full history & profile into the database, raises on failure, returns the stored days '''
+        info        = self._call(self.source.info, symbol)
+        history     = self._call(self.source.history, symbol)
+        financials  = self._call(self.source.financials, symbol)
+        fx_rate     = self.fx_rate(info.get('currency'))
+
+        prices  = stored_prices(history, fx_rate)
+        profile = company_profile(symbol, info, financials, self.source.region(info['country']), fx_rate, prices)
+
+        _write_csv(prices, FPG_Database.price_history_csv(symbol), index=True)
+        _write_csv(pd.DataFrame([profile]), FPG_Database.profile_csv(symbol), index=False)
+        return prices.__len__()
+
+    def _append_days(self, symbol) -> int:
+        ''' Appends the days after the last stored one to a ticker's price history, see refresh_ticker '''
+        path    = FPG_Database.price_history_csv(symbol)
+        profile = load_profile(symbol)
+        last    = _last_stored_date(path) if profile is not None else None
+        if(last is None):
+            return self._store_ticker(symbol)
+
+        prices = stored_prices(self._call(self.source.history, symbol, last + pd.Timedelta(days=1)), profile["fx_rate"])
+        prices = prices[prices.index > last]
+        if(prices.__len__() > 0):
+            _append_csv(prices, path)
+        return prices.__len__()
+
+    def fetch_ticker(self, symbol) -> int:
+        ''' Fetches a ticker's full history & profile & writes its database files, raises on failure, returns the stored days '''
+        days = self._store_ticker(symbol)
+        write_metadata(symbol, self.start_date, session=self._session([symbol]))
+        return days
+
+    def refresh_ticker(self, symbol) -> int:
+        '''
+            Appends the days after the last stored one to a ticker's price history, at the profile's FX rate.
+            Tickers stored without a profile or volumes are fetched in full
+
+            :return: days added.
+        '''
+        days = self._append_days(symbol)
+        write_metadata(symbol, self.start_date, session=self._session([symbol]))
+        return days
+
+    def fetch(self, tickers, refetch: bool = False, refresh: bool = False) -> FPG_FetchReport:
+        '''
+            Completes the database for the tickers: metadata is derived locally when the ticker's profile & prices are stored
+            (e.g. for a new start date), the others are fetched from the source
+            refetch:    fetches every ticker in full again
+            refresh:    appends the new trading days of every ticker instead (see refresh_ticker)
+
+            :return: FPG_FetchReport, failures are also saved to the database's fetch_failures.json.
+        '''
+        tickers = list(dict.fromkeys(tickers))
+        os.makedirs(FPG_Database.database_folder, exist_ok=True)
+
+        report  = FPG_FetchReport()
+        derived = []
+        if(refetch or refresh):
+            pending = tickers
+        else:
+            incomplete      = FPG_Database.incomplete_tickers(tickers, self.start_date)
+            pending         = [ticker for ticker in incomplete if not _is_stored(ticker)]
+            derived         = sorted(set(incomplete) - set(pending), key=tickers.index)
+            report.skipped  = sorted(set(tickers) - set(incomplete), key=tickers.index)
+
+        work     = self._append_days if refresh else self._store_ticker
+        failures = load_failures()
+        stored   = []
+
+        def failed(ticker, error):
+            report.failed[ticker] = f"{type(error).__name__}: {error}"
+            failures[ticker] = {"start date": self.start_date, "error": report.failed[ticker], "time": dt.datetime.now().isoformat(timespec='seconds')}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(work, ticker): ticker for ticker in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                ticker = futures[future]
+                try:
+                    days = future.result()
+                    stored.append(ticker)
+                    print(f"[{done}/{pending.__len__()}] {ticker} data saved to database folder ({days} days).")
+                except Exception as error:
+                    failed(ticker, error)
+                    print(f"[{done}/{pending.__len__()}] {ticker} failed: {report.failed[ticker]}")
+
+        # The metadata goes last, once the first session is known: it marks the tickers as complete
+        if(derived or stored):
+            session = self._session(tickers)
+            rederived = set(derived)
+            for ticker in derived + stored:
+                try:
+                    write_metadata(ticker, self.start_date, session=session)
+                except Exception as error:
+                    failed(ticker, error)
+                    continue
+                (report.derived if ticker in rederived else report.fetched).append(ticker)
+                failures.pop(ticker, None)
+
+        save_failures(failures)
+        return report
+
+def load_failures() -> dict:
+    ''' {ticker: {"start date", "error", "time"}} of the tickers whose last fetch failed '''
+    try:
+        with open(FPG_Database.database_folder + failures_file) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_failures(failures: dict):
+    path = FPG_Database.database_folder + failures_file
+    with open(path + '.tmp', 'w') as file:
+        json.dump(failures, file, indent=4)
+    os.replace(path + '.tmp', path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetches a ticker universe into the FPG database")
+    parser.add_argument('tickers', nargs='*')
+    parser.add_argument('--tickers-file', default=None, help="file with one ticker per line")
+    parser.add_argument('--start-date', default='1995-01-01')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=4.0, help="source calls per second")
+    parser.add_argument('--retries', type=int, default=2)
+    parser.add_argument('--refetch', action='store_true', help="also fetch the tickers already in the database")
+    parser.add_argument('--refresh', action='store_true', help="append the trading days since the last fetch")
+    parser.add_argument('--retry-failed', action='store_true', help="fetch the tickers of fetch_failures.json")
+    args = parser.parse_args()
+
+    tickers = list(args.tickers)
+    if(args.tickers_file is not None):
+        with open(args.tickers_file) as file:
+            tickers += [line.strip() for line in file if line.strip()]
+    if(args.retry_failed):
+        tickers += list(load_failures().keys())
+
+    fetcher = FPG_Fetcher(FPG_YFinanceSource(), args.start_date, max_workers=args.workers, rate=args.rate, retries=args.retries)
+    report  = fetcher.fetch(tickers, refetch=args.refetch, refresh=args.refresh)
+    print(f"{report.fetched.__len__()} fetched, {report.derived.__len__()} derived from the database, "
+          f"{report.skipped.__len__()} already in the database, {report.failed.__len__()} failed")
+    if(report.failed):
+        exit(1)
@@ -0,0 +1,146 @@
+import numpy as np
+
+float_fields = ("price", "market_cap", "revenue", "earnings", "profits", "expenses", "EPS", "PE_ratio", "volatility_index")
+''' History fields stored in the float32 block '''
+
+int_fields   = ("trading_volume", "shares_outstanding")
+''' History fields stored in the int64 block (int32 overflows for mega-caps) '''
+
+history_fields = ("price", "trading_volume", "shares_outstanding", "market_cap", "revenue", "earnings",
+                  "profits", "expenses", "EPS", "PE_ratio", "volatility_index")
+''' All of the recorded fields, in Company.History order '''
+
+class FPG_HistoryStore:
+    def __init__(self, numTotalDays: int, tickers, chunk_days: int = None) -> None:
+        '''
+            Columnar day x ticker x field history of all of the companies in the simulation
+            numTotalDays:  number of simulated days
+            tickers:       ticker symbols, their order defines the ticker axis
+            chunk_days:    when set, only the current chunk of chunk_days days is held in memory: the blocks
+                           become a ring that is handed to the listeners & reused once a chunk is complete
+        '''
+        self.tickers        = list(tickers)
+        self.ticker_idx     = {ticker: idx for idx, ticker in enumerate(self.tickers)}
+        self.numTotalDays   = numTotalDays
+
+        self.chunk_days     = numTotalDays if chunk_days is None else max(1, min(chunk_days, numTotalDays))
+        ''' Days held in memory, the block rows are the days [chunk_start, chunk_start + chunk_days) '''
+
+        self.chunk_start    = 0
+
+        self.recorded_stop  = 0
+        ''' One past the last recorded day '''
+
+        self.listeners      = []
+        ''' Output stages: recorded(start, stop) is called once days [start, stop) of the current chunk are recorded,
+            flush(start, stop) with the chunk's recorded days before its rows are reused '''
+
+        numTickers = self.tickers.__len__()
+
+        self.float_block    = np.full((float_fields.__len__(), self.chunk_days, numTickers), np.nan, dtype='float32')
+        ''' [field, day - chunk_start, ticker] '''
+
+        self.int_block      = np.zeros((int_fields.__len__(), self.chunk_days, numTickers), dtype='int64')
+        ''' [field, day - chunk_start, ticker] '''
+
+        self.float_state    = np.full((float_fields.__len__(), numTickers), np.nan)
+        ''' Current value of every float field, [field, ticker] '''
+
+        self.int_state      = np.zeros((int_fields.__len__(), numTickers), dtype='int64')
+        ''' Current value of every int field, [field, ticker] '''
+
+        self.active         = np.zeros(numTickers, dtype=bool)
+        ''' Company activity vector, only active companies are recorded '''
+
+        self._index_rows()
+
+    def _index_rows(self):
+        ''' Field name -> (block, state, row), rebuilt whenever the arrays are replaced (see FPG_Checkpoint) '''
+        self._rows = {name: (self.float_block, self.float_state, row) for row, name in enumerate(float_fields)}
+        self._rows.update({name: (self.int_block, self.int_state, row) for row, name in enumerate(int_fields)})
+
+    def get(self, name, idx):
+        _, state, row = self._rows[name]
+        return state[row, idx]
+
+    def set(self, name, idx, value):
+        _, state, row = self._rows[name]
+        state[row, idx] = value
+
+    def state(self, name):
+        ''' Current values of a field for all of the tickers (a writable view) '''
+        _, state, row = self._rows[name]
+        return state[row]
+
+    def field(self, name):
+        ''' [day, ticker] history of a field (a writable view), only the current chunk in chunked mode '''
+        block, _, row = self._rows[name]
+        return block[row]
+
+    def bind(self, company):
+        '''
+            Moves the company's current metrics into the store, from here on the company's tracked
+            attributes read & write the store's state. Day 0 is recorded if the company is active
+        '''
+        idx = self.ticker_idx[company.ticker]
+        for name in history_fields:
+            self.set(name, idx, company.__dict__.pop(name))
+        self.active[idx] = company.__dict__.pop('_active')
+
+        company._store      = self
+        company._store_idx  = idx
+        if(self.active[idx]):
+            self.record_ticker(0, idx)
+
+        return idx
+
+    def company_history(self, idx):
+        ''' Per-company views, keeps the Company.History[field][day] interface (day - chunk_start in chunked mode) '''
+        return {name: self.field(name)[:, idx] for name in history_fields}
+
+    def _advance(self, day):
+        ''' Flushes the current chunk once day falls past it, chunks are aligned on multiples of chunk_days '''
+        if(day < self.chunk_start + self.chunk_days):
+            return
+        self.flush()
+
+        self.chunk_start = day - day % self.chunk_days
+        self.float_block.fill(np.nan)
+        self.int_block.fill(0)
+
+    def _recorded(self, start, stop):
+        self.recorded_stop = max(self.recorded_stop, stop)
+        for listener in self.listeners:
+            listener.recorded(start, stop)
+
+    def flush(self):
+        ''' Hands the recorded days of the current chunk to the listeners, also called once the simulation ends '''
+        stop = min(self.recorded_stop, self.chunk_start + self.chunk_days)
+        if(stop > self.chunk_start):
+            for listener in self.listeners:
+                listener.flush(self.chunk_start, stop)
+
+    def record_day(self, day):
+        ''' Records the current state of all of the active companies in one vectorized write '''
+        self._advance(day)
+        row = day - self.chunk_start
+        np.copyto(self.float_block[:, row, :], self.float_state, where=self.active, casting='unsafe')
+        np.copyto(self.int_block[:, row, :], self.int_state, where=self.active)
+        self._recorded(day, day + 1)
+
+    def record_ticker(self, day, idx):
+        self._advance(day)
+        self.float_block[:, day - self.chunk_start, idx] = self.float_state[:, idx]
+        self.int_block[:, day - self.chunk_start, idx]   = self.int_state[:, idx]
+        self.recorded_stop = max(self.recorded_stop, day + 1)
+
+    def record_span(self, start, stop):
+        ''' Records the current state on every day of [start, stop), for days on which nothing changed '''
+        while start < stop:
+            self._advance(start)
+            end     = min(stop, self.chunk_start + self.chunk_days)
+            rows    = slice(start - self.chunk_start, end - self.chunk_start)
+            np.copyto(self.float_block[:, rows, :], self.float_state[:, np.newaxis, :], where=self.active, casting='unsafe')
+            np.copyto(self.int_block[:, rows, :], self.int_state[:, np.newaxis, :], where=self.active)
+            self._recorded(start, end)
+            start = end
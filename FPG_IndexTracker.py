@@ -0,0 +1,113 @@
+import numpy as np
+
+from FPG_Reference_Utils import FPG_IndexSet
+
+class FPG_IndexTracker:
+    def __init__(self, History, groupings, numTotalDays: int, resync_interval: int = 250) -> None:
+        '''
+            Simulated cap weighted indices of every group, kept as running sums that are updated
+            only for the tickers whose price, market cap or activity changed
+            History:          FPG_HistoryStore whose current state drives the indices
+            groupings:        FPG_Grouping list, same groupings as the reference indices
+            numTotalDays:     number of simulated days
+            resync_interval:  days between full recomputations of the running sums, bounds the
+                              floating point drift of the incremental updates (0 disables it)
+        '''
+        self.History            = History
+        self.groupings          = groupings
+        self.resync_interval    = resync_interval
+
+        numTickers  = History.tickers.__len__()
+        offsets     = np.cumsum([0] + [grouping.numGroups for grouping in groupings])
+        self.numColumns = int(offsets[-1])
+
+        # ticker -> group columns memberships, CSR layout
+        tickers = np.concatenate([grouping.tickers for grouping in groupings]).astype('int64')
+        columns = np.concatenate([grouping.members + offset for grouping, offset in zip(groupings, offsets)]).astype('int64')
+        order   = np.argsort(tickers, kind='stable')
+
+        self._indptr    = np.append(0, np.cumsum(np.bincount(tickers, minlength=numTickers)))
+        self._columns   = columns[order]
+        self._offsets   = offsets
+
+        self.price_index    = np.full((numTotalDays, self.numColumns), np.nan, dtype='float32')
+        ''' [day, group column] '''
+
+        self.index_returns  = np.full((numTotalDays, self.numColumns), np.nan, dtype='float32')
+        ''' [day, group column], percent change from each group's first value '''
+
+        self.first_value    = np.full(self.numColumns, np.nan)
+
+        self._cap       = np.zeros(numTickers)
+        self._cap_price = np.zeros(numTickers)
+        self.resync()
+
+    def _contributions(self, tickers=slice(None)):
+        ''' Market cap & cap x price each ticker adds to its groups' running sums '''
+        cap     = np.where(self.History.active[tickers], np.nan_to_num(self.History.state('market_cap')[tickers]), 0.0)
+        price   = np.nan_to_num(self.History.state('price')[tickers])
+        return cap, cap*price
+
+    def _memberships(self, tickers):
+        ''' (position in tickers, group column) of every membership of the given tickers '''
+        starts  = self._indptr[tickers]
+        counts  = self._indptr[tickers + 1] - starts
+        rows    = np.repeat(np.arange(tickers.__len__()), counts)
+        within  = np.arange(rows.__len__()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, self._columns[starts[rows] + within]
+
+    def resync(self):
+        ''' Recomputes the running sums from scratch '''
+        self._cap, self._cap_price = self._contributions()
+
+        rows, columns = self._memberships(np.arange(self._cap.__len__()))
+        self._sum_cap       = np.bincount(columns, weights=self._cap[rows], minlength=self.numColumns)
+        self._sum_cap_price = np.bincount(columns, weights=self._cap_price[rows], minlength=self.numColumns)
+
+    def update(self, day, changed=None):
+        '''
+            Applies the changes of the current state to the running sums & records the indices of day
+            changed:    ticker positions whose price/market cap/activity may have changed, when None they are
+                        found by comparing the whole state against the last update
+        '''
+        if(changed is None):
+            cap, cap_price = self._contributions()
+            changed = np.flatnonzero((cap != self._cap) | (cap_price != self._cap_price))
+            cap, cap_price = cap[changed], cap_price[changed]
+        else:
+            changed = np.asarray(changed, dtype='int64')
+            cap, cap_price = self._contributions(changed)
+
+        if(changed.__len__() > 0):
+            rows, columns = self._memberships(changed)
+            self._sum_cap       += np.bincount(columns, weights=(cap - self._cap[changed])[rows], minlength=self.numColumns)
+            self._sum_cap_price += np.bincount(columns, weights=(cap_price - self._cap_price[changed])[rows], minlength=self.numColumns)
+
+            self._cap[changed]       = cap
+            self._cap_price[changed] = cap_price
+
+        if(self.resync_interval and day % self.resync_interval == 0):
+            self.resync()
+
+        self.record(day)
+
+    def record(self, day):
+        ''' Writes the current index levels into day's row '''
+        self.record_span(day, day + 1)
+
+    def record_span(self, start, stop):
+        ''' Writes the current index levels into the rows of [start, stop) '''
+        total = np.where(self._sum_cap == 0, 1, self._sum_cap)
+        value = self._sum_cap_price/total
+
+        newGroups = np.isnan(self.first_value) & (value > 0)
+        self.first_value[newGroups] = value[newGroups]
+
+        self.price_index[start:stop]   = value
+        self.index_returns[start:stop] = ((value/self.first_value) - 1)*100
+
+    @property
+    def Indices(self):
+        ''' FPG_IndexSet of every grouping, same layout as FPG_RefData.Indices '''
+        return {grouping.name: FPG_IndexSet(grouping.groups, self.price_index[:, start:stop], self.index_returns[:, start:stop])
+                for grouping, start, stop in zip(self.groupings, self._offsets[:-1], self._offsets[1:])}
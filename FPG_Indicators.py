@@ -0,0 +1,273 @@
+import numpy as np
+
+indicator_names = ("volatility", "sma", "ema", "momentum", "rsi", "drawdown")
+''' First axis of FPG_Indicators.values & compute_indicators '''
+
+def _ema_step(state, price, alpha):
+    ''' One EMA step over all of the tickers, starts at the first price & holds through missing ones '''
+    return np.where(np.isnan(price), state, np.where(np.isnan(state), price, state + alpha*(price - state)))
+
+def _rsi_step(gain, loss, changes, change, window):
+    ''' One step of Wilder's average gain & loss, seeded with the first change, skips missing changes '''
+    valid   = ~np.isnan(change)
+    changes = changes + valid
+    up      = np.where(valid, np.maximum(change, 0), 0)
+    down    = np.where(valid, np.maximum(-change, 0), 0)
+    weight  = np.where(valid, 1/np.minimum(np.maximum(changes, 1), window), 0)
+    return gain + weight*(up - gain), loss + weight*(down - loss), changes
+
+def _rsi(gain, loss, changes, window):
+    total = gain + loss
+    rsi = np.where(total > 0, 100*gain/np.where(total > 0, total, 1), 50)
+    return np.where(changes >= window, rsi, np.nan)
+
+def _rolling_sums(values, window):
+    ''' Sums & counts of the valid values of the last window days, [day, ticker] '''
+    valid   = ~np.isnan(values)
+    sums    = np.cumsum(np.where(valid, values, 0), axis=0)
+    counts  = np.cumsum(valid, axis=0)
+    sums[window:]   = sums[window:] - sums[:-window].copy()
+    counts[window:] = counts[window:] - counts[:-window].copy()
+    return sums, counts
+
+def _first_valid(prices):
+    ''' First valid price of every ticker, the rolling moments are taken around it to limit cancellation '''
+    valid = ~np.isnan(prices)
+    first = prices[valid.argmax(axis=0), np.arange(prices.shape[1])]
+    return np.where(valid.any(axis=0), first, 0)
+
+def rolling_volatility(prices, window: int) -> np.ndarray:
+    ''' Standard deviation of the last window prices x sqrt(window), as the companies' volatility_index, [day, ticker] '''
+    centered = prices - _first_valid(prices)
+    sums, counts    = _rolling_sums(centered, window)
+    squares, _      = _rolling_sums(centered*centered, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = np.maximum(squares/counts - (sums/counts)**2, 0)
+    return np.where(counts == window, np.sqrt(variance*window), np.nan)
+
+def sma(prices, window: int) -> np.ndarray:
+    ''' Mean of the last window prices, [day, ticker] '''
+    sums, counts = _rolling_sums(prices, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts == window, sums/counts, np.nan)
+
+def ema(prices, span: int) -> np.ndarray:
+    ''' Exponential moving average with alpha = 2/(span + 1), [day, ticker] '''
+    alpha   = 2/(span + 1)
+    result  = np.empty(prices.shape)
+    state   = np.full(prices.shape[1], np.nan)
+    for day in range(prices.shape[0]):
+        state = result[day] = _ema_step(state, prices[day], alpha)
+    return result
+
+def momentum(prices, window: int) -> np.ndarray:
+    ''' Relative price change over the last window days, [day, ticker] '''
+    result = np.full(prices.shape, np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(prices, window + 1, axis=0)
+    result[window:] = windows[..., -1]/windows[..., 0] - 1
+    return result
+
+def rsi(prices, window: int) -> np.ndarray:
+    ''' Relative strength index with Wilder's smoothing, NaN until window changes are known, [day, ticker] '''
+    changes = np.vstack([np.full((1, prices.shape[1]), np.nan), np.diff(prices, axis=0)])
+    result  = np.empty(prices.shape)
+    gain, loss, count = np.zeros(prices.shape[1]), np.zeros(prices.shape[1]), np.zeros(prices.shape[1], dtype='int64')
+    for day in range(prices.shape[0]):
+        gain, loss, count = _rsi_step(gain, loss, count, changes[day], window)
+        result[day] = _rsi(gain, loss, count, window)
+    return result
+
+def drawdown(prices) -> np.ndarray:
+    ''' Relative distance below the running peak price (<= 0), [day, ticker] '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return prices/np.fmax.accumulate(prices, axis=0) - 1
+
+def compute_indicators(prices, window: int = 20, rsi_window: int = 14) -> np.ndarray:
+    '''
+        Every indicator of a [day, ticker] price array (NaN where a ticker isn't traded), batch counterpart of FPG_Indicators
+        window:     window of the volatility, SMA & momentum & span of the EMA
+        rsi_window: RSI smoothing window
+
+        :return: float32 [indicator, day, ticker], see indicator_names.
+    '''
+    prices = np.asarray(prices, dtype='float64')
+    return np.stack([rolling_volatility(prices, window), sma(prices, window), ema(prices, window),
+                     momentum(prices, window), rsi(prices, rsi_window), drawdown(prices)]).astype('float32')
+
+class FPG_Indicators:
+    def __init__(self, History, numTotalDays: int, window: int = 20, rsi_window: int = 14, resync_interval: int = 250) -> None:
+        '''
+            Technical indicators of every ticker & day of the simulation, updated once a day in O(tickers)
+            from running state, so readers get them by (day, ticker) lookups (see get & row).
+            The values match compute_indicators over the simulated prices of the active companies.
+            Listens to the history store: the days it records are the days updated, & only the history's current
+            chunk of values is held when it is chunked (FPG_OutputWriter streams them with the history)
+            History:            FPG_HistoryStore whose current prices drive the indicators
+            numTotalDays:       number of simulated days
+            window:             window of the volatility, SMA & momentum & span of the EMA
+            rsi_window:         RSI smoothing window
+            resync_interval:    days between full recomputations of the rolling sums from the price ring,
+                                bounds the floating point drift of the incremental updates (0 disables it)
+        '''
+        self.History            = History
+        self.window             = window
+        self.rsi_window         = rsi_window
+        self.resync_interval    = resync_interval
+
+        numTickers = History.tickers.__len__()
+
+        self.chunk_days = min(History.chunk_days, numTotalDays)
+        ''' Days of values held, day d is in row d % chunk_days (all of the days unless the history is chunked) '''
+
+        self.values = np.full((indicator_names.__len__(), self.chunk_days, numTickers), np.nan, dtype='float32')
+        ''' [indicator, day % chunk_days, ticker], see indicator_names '''
+
+        self._ring      = np.full((window + 1, numTickers), np.nan)
+        ''' Prices of the last window + 1 days, day d is in row d % (window + 1) '''
+
+        self._origin    = np.full(numTickers, np.nan)
+        ''' First price of every ticker, the rolling moments are taken around it '''
+
+        self._sum       = np.zeros(numTickers)
+        self._sum_sq    = np.zeros(numTickers)
+        self._count     = np.zeros(numTickers, dtype='int64')
+        self._ema       = np.full(numTickers, np.nan)
+        self._gain      = np.zeros(numTickers)
+        self._loss      = np.zeros(numTickers)
+        self._changes   = np.zeros(numTickers, dtype='int64')
+        self._last      = np.full(numTickers, np.nan)
+        self._peak      = np.full(numTickers, np.nan)
+        self._day       = -1
+
+        History.listeners.append(self)
+
+    def prices(self):
+        ''' Current prices of the active companies, NaN for the others '''
+        return np.where(self.History.active, self.History.state('price'), np.nan)
+
+    def _resync(self):
+        ''' Recomputes the rolling sums of the last window days from the ring '''
+        centered = self._ring - np.nan_to_num(self._origin)
+        window   = np.delete(centered, (self._day + 1) % (self.window + 1), axis=0)
+        valid    = ~np.isnan(window)
+        self._sum       = np.where(valid, window, 0).sum(axis=0)
+        self._sum_sq    = np.where(valid, window*window, 0).sum(axis=0)
+        self._count     = valid.sum(axis=0)
+
+    def update(self, day):
+        ''' Advances the running state with the current prices & records the indicators of day, days come in order '''
+        self._day = day
+        price = self.prices()
+
+        newTickers = np.isnan(self._origin) & ~np.isnan(price)
+        self._origin[newTickers] = price[newTickers]
+
+        # Day - window leaves the window & is the momentum base, day takes the row of day - window - 1
+        base    = self._ring[(day + 1) % (self.window + 1)]
+        leaving = base - self._origin
+        self._ring[day % (self.window + 1)] = price
+
+        entering    = price - self._origin
+        enters      = ~np.isnan(entering)
+        leaves      = ~np.isnan(leaving)
+        self._sum       += np.where(enters, entering, 0) - np.where(leaves, leaving, 0)
+        self._sum_sq    += np.where(enters, entering*entering, 0) - np.where(leaves, leaving*leaving, 0)
+        self._count     += enters.astype('int64') - leaves
+
+        if(self.resync_interval and day % self.resync_interval == 0):
+            self._resync()
+
+        self._ema = _ema_step(self._ema, price, 2/(self.window + 1))
+        self._gain, self._loss, self._changes = _rsi_step(self._gain, self._loss, self._changes, price - self._last, self.rsi_window)
+        self._last = price
+        self._peak = np.fmax(self._peak, price)
+
+        full = self._count == self.window
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean        = self._sum/self._count
+            variance    = np.maximum(self._sum_sq/self._count - mean*mean, 0)
+
+            values = self.values[:, day % self.chunk_days]
+            values[0] = np.where(full, np.sqrt(variance*self.window), np.nan)
+            values[1] = np.where(full, mean + self._origin, np.nan)
+            values[2] = self._ema
+            values[3] = price/base - 1
+            values[4] = _rsi(self._gain, self._loss, self._changes, self.rsi_window)
+            values[5] = price/self._peak - 1
+
+    def update_span(self, start, stop):
+        '''
+            Updates the days [start, stop), the prices don't change over them: the first day is a regular update,
+            the indicators of the others follow from the constant price in a few vectorized steps
+        '''
+        if(stop <= start):
+            return
+        self.update(start)
+        count = stop - start - 1
+        if(count == 0):
+            return
+
+        window  = self.window
+        price   = self.prices()
+        held    = ~np.isnan(price)
+
+        # Prices of the days start - window .. stop - 1
+        past    = self._ring[np.arange(start - window, start + 1) % (window + 1)]
+        prices  = np.vstack([past, np.broadcast_to(price, (count, price.__len__()))])
+
+        centered    = prices - np.nan_to_num(self._origin)
+        valid       = ~np.isnan(centered)
+        zero        = np.zeros((1, price.__len__()))
+        sums        = np.concatenate([zero, np.cumsum(np.where(valid, centered, 0), axis=0)])
+        squares     = np.concatenate([zero, np.cumsum(np.where(valid, centered*centered, 0), axis=0)])
+        counts      = np.concatenate([zero, np.cumsum(valid, axis=0)])
+        windows     = slice(window + 2, window + 2 + count), slice(2, 2 + count)
+        sums, squares, counts = (array[windows[0]] - array[windows[1]] for array in (sums, squares, counts))
+
+        # Wilder's averages only decay once the price stops changing, by the same factor for gains & losses
+        steps   = np.arange(1, count + 1)[:, np.newaxis]
+        changes = self._changes + steps*held
+        decay   = np.where(held, 1 - 1/np.minimum(np.maximum(changes, 1), self.rsi_window), 1)
+        decay   = np.cumprod(decay, axis=0)
+        gain, loss = self._gain*decay, self._loss*decay
+
+        alpha   = 2/(self.window + 1)
+        ema     = np.where(held, price + (self._ema - price)*(1 - alpha)**steps, self._ema)
+
+        full = counts == window
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean        = sums/counts
+            variance    = np.maximum(squares/counts - mean*mean, 0)
+
+            rows = np.arange(start + 1, stop) % self.chunk_days
+            self.values[0, rows] = np.where(full, np.sqrt(variance*window), np.nan)
+            self.values[1, rows] = np.where(full, mean + self._origin, np.nan)
+            self.values[2, rows] = ema
+            self.values[3, rows] = price/prices[1:1 + count] - 1
+            self.values[4, rows] = _rsi(gain, loss, changes, self.rsi_window)
+            self.values[5, rows] = price/self._peak - 1
+
+        last_days = np.arange(stop - window - 1, stop)
+        self._ring[last_days % (window + 1)] = prices[-(window + 1):]
+        self._ema       = ema[-1]
+        self._gain      = gain[-1]
+        self._loss      = loss[-1]
+        self._changes   = changes[-1]
+        self._day       = stop - 1
+        self._resync()
+
+    def recorded(self, start, stop):
+        ''' History store listener: updates the days [start, stop) the history just recorded '''
+        self.update_span(start, stop)
+
+    def flush(self, start, stop):
+        ''' History store listener: the chunk's values are written by FPG_OutputWriter, nothing to do '''
+        pass
+
+    def get(self, name, day, ticker):
+        ''' Value of an indicator (see indicator_names) for a ticker position on a day, of the current chunk if chunked '''
+        return self.values[indicator_names.index(name), day % self.chunk_days, ticker]
+
+    def row(self, name, day):
+        ''' Values of an indicator for all of the tickers on a day (a view), of the current chunk if chunked '''
+        return self.values[indicator_names.index(name), day % self.chunk_days]
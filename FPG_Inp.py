@@ -32,4 +32,64 @@ class FPG_Input:
     ''' Gini coefficient for the global income distribution '''
 
     meanIncome: float = 13700
-    ''' Average trader annual income '''
\ No newline at end of file
+    ''' Average trader annual income '''
+
+    index_groupings = ['sector', 'region']
+    ''' company attributes by which reference indices are grouped, e.g. 'sector', 'region', 'industry', 'country' '''
+
+    custom_groups = {}
+    ''' user defined baskets with a reference index of their own, {basket name: [tickers]} '''
+
+    use_reference_cache: bool = True
+    ''' reuse the reference indices & return distributions cached in the database when the ticker universe,
+        start date & database files are unchanged '''
+
+    indicator_window: int = 20
+    ''' window of the simulated technical indicators (volatility, SMA, momentum) & span of their EMA, see FPG_Indicators '''
+
+    rsi_window: int = 14
+    ''' smoothing window of the simulated RSI '''
+
+    social_graph: str = 'small-world'
+    ''' trader influence network through which trades spread by herd mentality, 'small-world' or 'scale-free'
+        (see FPG_Social), None disables it '''
+
+    social_degree: int = 10
+    ''' mean number of neighbours of a trader in the influence network '''
+
+    social_rewiring: float = 0.1
+    ''' probability of a small-world link to be rewired to a random trader '''
+
+    sparse_portfolios: bool = None
+    ''' stores the trader portfolios as CSR matrices instead of dense [trader, ticker] ones, None decides by the
+        traders x tickers size (see FPG_Portfolio) '''
+
+    offline: bool = False
+    ''' forbids network fetches, the simulation fails right away if a ticker isn't complete in the database '''
+
+    output_folder: str = None
+    ''' folder the simulation outputs are streamed to (see FPG_Output), everything stays in memory if None '''
+
+    output_chunk_days: int = 256
+    ''' days of company history held in memory when streaming the outputs, each chunk is written as it completes '''
+
+    trader_snapshot_interval: int = 0
+    ''' days between full trader snapshots in the streamed outputs, 0 disables them '''
+
+    checkpoint_folder: str = None
+    ''' folder of the periodic simulation checkpoint (see FPG_Checkpoint), no checkpoints are saved if None '''
+
+    checkpoint_interval: int = 0
+    ''' days between checkpoints, the checkpoint folder is overwritten each time '''
+
+    profile: bool = False
+    ''' times the simulation phases & counts its events (see FPG_Profiler), off by default at no cost '''
+
+    profile_report: str = None
+    ''' path of the profiler's JSON report, written at the end of the simulation '''
+
+    profile_trace: str = None
+    ''' path of the profiler's per-day JSONL trace, no trace if None '''
+
+    profile_memory: bool = False
+    ''' tracks the peak python memory of every phase with tracemalloc, slows the simulation down '''
@@ -0,0 +1,172 @@
+import numpy as np
+import json
+import os
+import queue
+import threading
+
+from FPG_History import float_fields, int_fields
+from FPG_Indicators import indicator_names
+
+output_version = 2
+
+trader_stats = ("wealth_total", "wealth_mean", "wealth_std", "wealth_min", "wealth_p10",
+                "wealth_median", "wealth_p90", "wealth_p99", "wealth_max")
+''' Daily aggregate statistics of the traders' balances, columns of the traders segments '''
+
+stat_quantiles = np.array([0, 0.1, 0.5, 0.9, 0.99, 1])
+
+snapshot_columns = ("balance", "income", "time_since_last_trade")
+''' TraderPool columns saved by the trader snapshots '''
+
+def trader_statistics(Traders) -> np.ndarray:
+    ''' trader_stats of the current state of the trader pool '''
+    balance = Traders.balance
+    if(balance.__len__() == 0):
+        return np.full(trader_stats.__len__(), np.nan)
+
+    low, p10, median, p90, p99, high = np.quantile(balance, stat_quantiles)
+    return np.array([balance.sum(), balance.mean(), balance.std(), low, p10, median, p90, p99, high])
+
+class FPG_OutputWriter:
+    def __init__(self, folder, Data, snapshot_interval: int = 0, queue_size: int = 2, resume_day: int = None) -> None:
+        '''
+            Streams the simulation outputs to disk, one set of npy segments per history chunk:
+            - history/<start>_float.npy & _int.npy:     [field, day, ticker] company history (FPG_History fields)
+            - index/<start>_price_index.npy & ...:      [day, group column] simulated indices
+            - indicators/<start>_indicators.npy:        [indicator, day, ticker] FPG_Indicators values
+            - traders/<start>_stats.npy:                [day, stat] trader_stats
+            - snapshots/<day>_<column>.npy:             full trader columns every snapshot_interval days
+            manifest.json lists the axes & every written segment, it is rewritten after each segment so
+            an interrupted run stays readable. Files are written by a background thread
+            folder:             output folder, created if missing
+            Data:               FPG_Data, its history store should be chunked (FPG_Input.output_chunk_days)
+            snapshot_interval:  days between trader snapshots, 0 disables them
+            queue_size:         chunks waiting to be written before the simulation blocks, bounds the memory
+            resume_day:         continues the output of the run a checkpoint was saved from (see FPG_Checkpoint),
+                                the segments of the days from the checkpoint's chunk onwards are dropped
+        '''
+        self.folder             = folder
+        self.Data               = Data
+        self.History            = Data.History
+        self.snapshot_interval  = snapshot_interval
+
+        self.stats  = np.full((self.History.chunk_days, trader_stats.__len__()), np.nan)
+        ''' Ring of the current chunk's trader_stats, [day - chunk_start, stat] '''
+
+        for sub_folder in ("history", "index", "indicators", "traders", "snapshots"):
+            os.makedirs(os.path.join(folder, sub_folder), exist_ok=True)
+        if(resume_day is not None):
+            with open(os.path.join(folder, "manifest.json")) as file:
+                self.manifest = json.load(file)
+            self.manifest["chunks"]     = [chunk for chunk in self.manifest["chunks"] if chunk["stop"] <= self.History.chunk_start]
+            self.manifest["snapshots"]  = [snapshot for snapshot in self.manifest["snapshots"] if snapshot["day"] < resume_day]
+            self.manifest["complete"]   = False
+        else:
+            np.save(os.path.join(folder, "dates.npy"), np.asarray(Data.RefData.dates))
+
+            self.manifest = {"version":          output_version,
+                             "start_date":       Data.Manager.start_date,
+                             "randomSeed":       Data.Manager.randomSeed,
+                             "numTotalDays":     Data.Manager.numTotalDays,
+                             "chunk_days":       self.History.chunk_days,
+                             "tickers":          self.History.tickers,
+                             "float_fields":     list(float_fields),
+                             "int_fields":       list(int_fields),
+                             "indices":          [[grouping.name, grouping.groups] for grouping in Data.IndexTracker.groupings],
+                             "indicators":       list(indicator_names),
+                             "trader_stats":     list(trader_stats),
+                             "snapshot_columns": list(snapshot_columns),
+                             "chunks":           [],
+                             "snapshots":        [],
+                             "complete":         False}
+        self._write_manifest()
+
+        self._queue     = queue.Queue(maxsize=queue_size)
+        self._error     = None
+        self._thread    = threading.Thread(target=self._run, name="FPG output writer", daemon=True)
+        self._thread.start()
+
+        self.History.listeners.append(self)
+
+    def _write_manifest(self):
+        tmp_path = os.path.join(self.folder, "manifest.tmp.json")
+        with open(tmp_path, 'w') as file:
+            json.dump(self.manifest, file)
+        os.replace(tmp_path, os.path.join(self.folder, "manifest.json"))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if(item is None):
+                return
+            kind, entry, arrays = item
+            try:
+                # After a failure the remaining items are only drained, see sync
+                if(self._error is None):
+                    for name, array in arrays.items():
+                        np.save(os.path.join(self.folder, entry["files"][name]), array)
+                    self.manifest[kind].append(entry)
+                    self._write_manifest()
+            except Exception as error:
+                self._error = error
+            finally:
+                self._queue.task_done()
+
+    def _put(self, item):
+        if(self._error is not None):
+            raise RuntimeError("FPG output writer failed") from self._error
+        self._queue.put(item)
+
+    def sync(self):
+        ''' Waits until the queued segments are written, e.g. before a checkpoint refers to them '''
+        self._queue.join()
+        if(self._error is not None):
+            raise RuntimeError("FPG output writer failed") from self._error
+
+    def recorded(self, start, stop):
+        ''' History store listener: the state didn't change over [start, stop) '''
+        rows = slice(start - self.History.chunk_start, stop - self.History.chunk_start)
+        self.stats[rows] = trader_statistics(self.Data.Traders)
+
+        if(self.snapshot_interval):
+            for day in range(-(-start//self.snapshot_interval)*self.snapshot_interval, stop, self.snapshot_interval):
+                self.snapshot(day)
+
+    def snapshot(self, day):
+        ''' Saves the full snapshot_columns of the trader pool as the state of day '''
+        files  = {column: "snapshots/%08d_%s.npy" % (day, column) for column in snapshot_columns}
+        arrays = {column: getattr(self.Data.Traders, column).copy() for column in snapshot_columns}
+        self._put(("snapshots", {"day": day, "files": files}, arrays))
+
+    def flush(self, start, stop):
+        ''' History store listener: copies the chunk's rows & queues them for writing '''
+        start, stop = int(start), int(stop)     # numpy scalars aren't JSON serializable
+        days = stop - start
+        name = "%08d" % start
+        arrays = {"float":          self.History.float_block[:, :days].copy(),
+                  "int":            self.History.int_block[:, :days].copy(),
+                  "price_index":    self.Data.IndexTracker.price_index[start:stop].copy(),
+                  "index_returns":  self.Data.IndexTracker.index_returns[start:stop].copy(),
+                  "indicators":     self.Data.Indicators.values[:, :days].copy(),
+                  "stats":          self.stats[:days].copy()}
+        files  = {"float":          "history/" + name + "_float.npy",
+                  "int":            "history/" + name + "_int.npy",
+                  "price_index":    "index/" + name + "_price_index.npy",
+                  "index_returns":  "index/" + name + "_index_returns.npy",
+                  "indicators":     "indicators/" + name + "_indicators.npy",
+                  "stats":          "traders/" + name + "_stats.npy"}
+        self.stats.fill(np.nan)
+        self._put(("chunks", {"start": start, "stop": stop, "files": files}, arrays))
+
+    def close(self):
+        ''' Flushes the last chunk, waits for the writer thread & marks the output as complete '''
+        self.History.flush()
+        self.History.listeners.remove(self)
+
+        self._queue.put(None)
+        self._thread.join()
+        if(self._error is not None):
+            raise RuntimeError("FPG output writer failed") from self._error
+
+        self.manifest["complete"] = True
+        self._write_manifest()
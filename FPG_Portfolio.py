@@ -0,0 +1,323 @@
+import numpy as np
+
+from collections.abc import Mapping, MutableMapping
+
+from FPG_Auction import BID, ASK
+
+order_fields = ('ask', 'bid', 'ask_qty', 'bid_qty')
+''' Order entries of a (trader, ticker) portfolio position: limit prices & quantities of both sides '''
+
+dense_cells_limit = 1 << 26
+''' traders x tickers above which the store defaults to the sparse mode (~2.1 GB of dense matrices, 32 B per cell) '''
+
+class FPG_PortfolioStore:
+    def __init__(self, numTraders: int, numTickers: int, active: np.ndarray, sparse: bool = None) -> None:
+        '''
+            Holdings & order entries of every trader in every ticker, replaces per-trader portfolio dicts
+            - dense mode:   int64 holdings & quantities, float32 ask/bid prices, [trader, ticker] matrices
+            - sparse mode:  CSR holdings (most traders hold a handful of tickers) & a sorted (trader, ticker)
+                            key table of the order entries written since the last collect
+            numTraders:     trader axis length
+            numTickers:     ticker axis length
+            active:         company activity vector (FPG_HistoryStore.active), shared by all of the traders
+            sparse:         storage mode, None picks sparse above dense_cells_limit cells
+        '''
+        self.numTraders = numTraders
+        self.numTickers = numTickers
+        self.active     = active
+        self.sparse     = numTraders*numTickers > dense_cells_limit if sparse is None else sparse
+
+        if(self.sparse):
+            self.indptr     = np.zeros(numTraders + 1, dtype='int64')
+            self.indices    = np.empty(0, dtype='int64')
+            self.data       = np.empty(0, dtype='int64')
+            ''' CSR holdings, ticker columns sorted within each trader row, no explicit zeros '''
+
+            self.entry_keys         = np.empty(0, dtype='int64')
+            ''' trader*numTickers + ticker of every order entry, sorted, emptied by collect '''
+
+            self.entry_prices       = np.empty((0, 2), dtype='float32')
+            ''' [entry, (ask, bid)] '''
+
+            self.entry_quantities   = np.empty((0, 2), dtype='int64')
+            ''' [entry, (ask_qty, bid_qty)] '''
+        else:
+            self.holdings   = np.zeros((numTraders, numTickers), dtype='int64')
+            self.ask        = np.zeros((numTraders, numTickers), dtype='float32')
+            self.bid        = np.zeros((numTraders, numTickers), dtype='float32')
+            self.ask_qty    = np.zeros((numTraders, numTickers), dtype='int64')
+            self.bid_qty    = np.zeros((numTraders, numTickers), dtype='int64')
+
+        self._touched = []
+        ''' Dense mode: trader*numTickers + ticker of the order entries written since the last collect, only those are scanned '''
+
+    # Holdings
+    def _holding_keys(self):
+        ''' trader*numTickers + ticker of every stored holding, sorted '''
+        rows = np.repeat(np.arange(self.numTraders, dtype='int64'), np.diff(self.indptr))
+        return rows*self.numTickers + self.indices
+
+    def _set_csr(self, keys, values):
+        ''' Rebuilds the CSR arrays from sorted unique keys, zero holdings are dropped '''
+        keep = values != 0
+        keys, values = keys[keep], values[keep]
+        self.indptr     = np.append(0, np.cumsum(np.bincount(keys//self.numTickers, minlength=self.numTraders)))
+        self.indices    = keys % self.numTickers
+        self.data       = values.astype('int64')
+
+    def holdings_of(self, traders, tickers) -> np.ndarray:
+        ''' Holdings of (trader, ticker) pairs, arrays or scalars '''
+        if(not self.sparse):
+            return self.holdings[traders, tickers]
+
+        keys    = np.asarray(traders, dtype='int64')*self.numTickers + np.asarray(tickers, dtype='int64')
+        stored  = self._holding_keys()
+        if(stored.__len__() == 0):
+            return np.zeros(keys.shape, dtype='int64')
+        pos = np.minimum(np.searchsorted(stored, keys), stored.__len__() - 1)
+        return np.where(stored[pos] == keys, self.data[pos], 0)
+
+    def row(self, trader) -> np.ndarray:
+        ''' Dense holdings of one trader, [ticker] '''
+        if(not self.sparse):
+            return self.holdings[trader]
+        row = np.zeros(self.numTickers, dtype='int64')
+        span = slice(self.indptr[trader], self.indptr[trader + 1])
+        row[self.indices[span]] = self.data[span]
+        return row
+
+    def held_ticker(self, traders, u) -> np.ndarray:
+        ''' One of the tickers each trader holds, the int(u*count)th of its positions by ticker, -1 without holdings '''
+        traders = np.asarray(traders, dtype='int64')
+        if(not self.sparse):
+            held    = self.holdings[traders] > 0
+            counts  = held.sum(axis=1)
+            rank    = np.minimum((u*counts).astype('int64'), np.maximum(counts - 1, 0))
+            ticker  = np.argmax(np.cumsum(held, axis=1, dtype='int32') > rank[:, np.newaxis], axis=1)
+        else:
+            counts  = self.indptr[traders + 1] - self.indptr[traders]
+            rank    = np.minimum((u*counts).astype('int64'), np.maximum(counts - 1, 0))
+            ticker  = self.indices[np.minimum(self.indptr[traders] + rank, max(self.indices.__len__() - 1, 0))] \
+                      if self.indices.__len__() > 0 else np.zeros(traders.__len__(), dtype='int64')
+        return np.where(counts > 0, ticker, -1)
+
+    def add_holdings(self, traders, tickers, deltas):
+        ''' Bulk holdings change, e.g. the fills of a call auction, repeated (trader, ticker) pairs add up '''
+        traders = np.atleast_1d(np.asarray(traders, dtype='int64'))
+        tickers = np.atleast_1d(np.asarray(tickers, dtype='int64'))
+        deltas  = np.broadcast_to(np.asarray(deltas, dtype='int64'), traders.shape)
+        if(not self.sparse):
+            np.add.at(self.holdings, (traders, tickers), deltas)
+            return
+
+        keys    = traders*self.numTickers + tickers
+        stored  = self._holding_keys()
+        if(stored.__len__() > 0):
+            pos = np.minimum(np.searchsorted(stored, keys), stored.__len__() - 1)
+            if((stored[pos] == keys).all()):
+                # Positions already held: in place, the structure only changes if some of them are closed
+                np.add.at(self.data, pos, deltas)
+                if((self.data[pos] == 0).any()):
+                    self._set_csr(stored, self.data)
+                return
+
+        unique, inverse = np.unique(np.concatenate([stored, keys]), return_inverse=True)
+        totals = np.zeros(unique.__len__(), dtype='int64')
+        np.add.at(totals, inverse, np.concatenate([self.data, deltas]))
+        self._set_csr(unique, totals)
+
+    def set_holdings(self, traders, tickers, values):
+        ''' Overwrites the holdings of (trader, ticker) pairs '''
+        self.add_holdings(traders, tickers, np.asarray(values, dtype='int64') - self.holdings_of(traders, tickers))
+
+    @property
+    def nnz(self) -> int:
+        ''' Number of non zero holdings '''
+        return int(self.data.__len__()) if self.sparse else int(np.count_nonzero(self.holdings))
+
+    def value(self, prices) -> np.ndarray:
+        ''' Market value of every trader's holdings (holdings @ prices), NaN prices count as 0, [trader] '''
+        prices = np.nan_to_num(np.asarray(prices, dtype='float64'))
+        if(not self.sparse):
+            return self.holdings @ prices
+        rows = np.repeat(np.arange(self.numTraders), np.diff(self.indptr))
+        return np.bincount(rows, weights=self.data*prices[self.indices], minlength=self.numTraders)
+
+    def ticker_holdings(self) -> np.ndarray:
+        ''' Shares held by all of the traders, [ticker] '''
+        if(not self.sparse):
+            return self.holdings.sum(axis=0)
+        return np.bincount(self.indices, weights=self.data, minlength=self.numTickers).astype('int64')
+
+    # Order entries
+    def _entry_rows(self, keys, create=False):
+        ''' Rows of the entry keys, -1 where missing unless create adds them '''
+        if(create):
+            missing = np.setdiff1d(keys, self.entry_keys)
+            if(missing.__len__() > 0):
+                merged  = np.union1d(self.entry_keys, missing)
+                old     = np.searchsorted(merged, self.entry_keys)
+                prices, quantities = np.zeros((merged.__len__(), 2), dtype='float32'), np.zeros((merged.__len__(), 2), dtype='int64')
+                prices[old], quantities[old] = self.entry_prices, self.entry_quantities
+                self.entry_keys, self.entry_prices, self.entry_quantities = merged, prices, quantities
+
+        if(self.entry_keys.__len__() == 0):
+            return np.full(np.shape(keys), -1)
+        pos = np.minimum(np.searchsorted(self.entry_keys, keys), self.entry_keys.__len__() - 1)
+        return np.where(self.entry_keys[pos] == keys, pos, -1)
+
+    def order(self, trader, ticker, field):
+        ''' One order entry field (see order_fields) of a (trader, ticker) position '''
+        if(not self.sparse):
+            return getattr(self, field)[trader, ticker]
+
+        row = int(self._entry_rows(np.int64(trader)*self.numTickers + ticker))
+        if(row < 0):
+            return 0
+        column = order_fields.index(field)
+        return self.entry_prices[row, column] if column < 2 else self.entry_quantities[row, column - 2]
+
+    def set_orders(self, traders, tickers, field, values):
+        ''' Writes an order entry field (see order_fields) of (trader, ticker) pairs, the orders are collected by the next auction '''
+        keys = np.asarray(traders, dtype='int64')*self.numTickers + np.asarray(tickers, dtype='int64')
+        if(not self.sparse):
+            self._touched.append(np.atleast_1d(keys))
+            getattr(self, field)[traders, tickers] = values
+            return
+
+        rows    = self._entry_rows(keys, create=True)
+        column  = order_fields.index(field)
+        if(column < 2):
+            self.entry_prices[rows, column] = values
+        else:
+            self.entry_quantities[rows, column - 2] = values
+
+    def place(self, traders, tickers, side, price, quantity):
+        ''' Sets the side's limit price & quantity of (trader, ticker) pairs in one call '''
+        prefix = 'bid' if side == BID else 'ask'
+        self.set_orders(traders, tickers, prefix, price)
+        self.set_orders(traders, tickers, prefix + '_qty', quantity)
+
+    def pending_keys(self) -> np.ndarray:
+        ''' Sorted trader*numTickers + ticker of the entries written since the last collect '''
+        if(self.sparse):
+            return self.entry_keys
+        if(self._touched):
+            keys = np.sort(np.concatenate(self._touched))
+            first = np.ones(keys.__len__(), dtype=bool)
+            first[1:] = keys[1:] != keys[:-1]
+            self._touched = [keys[first]]
+        return self._touched[0] if self._touched else np.empty(0, dtype='int64')
+
+    def _pending(self):
+        ''' (trader, ticker, ask, bid, ask_qty, bid_qty) of the entries written since the last collect '''
+        if(self.sparse):
+            rows = np.flatnonzero((self.entry_quantities > 0).any(axis=1))
+            keys = self.entry_keys[rows]
+            return (keys//self.numTickers, keys % self.numTickers, self.entry_prices[rows, 0], self.entry_prices[rows, 1],
+                    self.entry_quantities[rows, 0], self.entry_quantities[rows, 1])
+
+        keys = self.pending_keys()
+        traders, tickers = keys//self.numTickers, keys % self.numTickers
+        ask_qty, bid_qty = self.ask_qty[traders, tickers], self.bid_qty[traders, tickers]
+        rows = np.flatnonzero((ask_qty > 0) | (bid_qty > 0))
+        traders, tickers = traders[rows], tickers[rows]
+        return traders, tickers, self.ask[traders, tickers], self.bid[traders, tickers], ask_qty[rows], bid_qty[rows]
+
+    def order_totals(self):
+        '''
+            Quantities of the pending order entries by ticker, asks capped by the traders' holdings
+
+            :return: (bid quantity, ask quantity), [ticker] each.
+        '''
+        traders, tickers, ask, bid, ask_qty, bid_qty = self._pending()
+        asks = np.where(ask > 0, np.minimum(ask_qty, self.holdings_of(traders, tickers)), 0)
+        bids = np.where(bid > 0, bid_qty, 0)
+        return (np.bincount(tickers, weights=bids, minlength=self.numTickers).astype('int64'),
+                np.bincount(tickers, weights=np.maximum(asks, 0), minlength=self.numTickers).astype('int64'))
+
+    def collect(self, book):
+        '''
+            Moves the pending order entries into the order book, bid before ask, by trader then ticker. Orders are day orders:
+            the written entries are cleared once collected, so the sparse entry table only ever holds one day of orders.
+            Ask quantities are capped by the trader's holdings
+        '''
+        traders, tickers, ask, bid, ask_qty, bid_qty = self._pending()
+        ask_qty = np.minimum(ask_qty, self.holdings_of(traders, tickers))
+
+        bids = (bid > 0) & (bid_qty > 0)
+        asks = (ask > 0) & (ask_qty > 0)
+        position    = np.concatenate([np.flatnonzero(bids), np.flatnonzero(asks)])
+        order       = np.argsort(2*position + np.repeat([0, 1], [np.count_nonzero(bids), np.count_nonzero(asks)]), kind='stable')
+        position    = position[order]
+        side        = np.repeat(np.array([BID, ASK], dtype='int8'), [np.count_nonzero(bids), np.count_nonzero(asks)])[order]
+        book.add(traders[position], tickers[position], side, np.where(side == BID, bid[position], ask[position]),
+                 np.where(side == BID, bid_qty[position], ask_qty[position]))
+
+        if(self.sparse):
+            self.entry_keys         = np.empty(0, dtype='int64')
+            self.entry_prices       = np.empty((0, 2), dtype='float32')
+            self.entry_quantities   = np.empty((0, 2), dtype='int64')
+        else:
+            keys = self.pending_keys()
+            for field in order_fields:
+                getattr(self, field)[keys//self.numTickers, keys % self.numTickers] = 0
+        self._touched = []
+
+class _PositionView(MutableMapping):
+    __slots__ = ('_store', '_trader', '_ticker')
+
+    def __init__(self, store, trader, ticker) -> None:
+        ''' Dict-like (trader, ticker) portfolio entry: Holdings, order_fields & the company-level Active (read only) '''
+        self._store     = store
+        self._trader    = trader
+        self._ticker    = ticker
+
+    def __getitem__(self, key):
+        if(key == 'Holdings'):
+            return int(self._store.holdings_of(self._trader, self._ticker))
+        if(key == 'Active'):
+            return bool(self._store.active[self._ticker])
+        if(key in order_fields):
+            value = self._store.order(self._trader, self._ticker, key)
+            return int(value) if key.endswith('_qty') else float(value)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if(key == 'Holdings'):
+            self._store.set_holdings(self._trader, self._ticker, value)
+        elif(key in order_fields):
+            self._store.set_orders(self._trader, self._ticker, key, value)
+        elif(key == 'Active'):
+            raise KeyError("Active is the company's activity, it can't be set per trader")
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        raise TypeError("portfolio entries can't be deleted")
+
+    def __iter__(self):
+        return iter(('Holdings',) + order_fields + ('Active',))
+
+    def __len__(self):
+        return order_fields.__len__() + 2
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class FPG_PortfolioView(Mapping):
+    def __init__(self, store: FPG_PortfolioStore, trader: int, tickers) -> None:
+        ''' Ticker -> entry mapping of one trader's row of the portfolio store, same layout as the former per-trader dicts '''
+        self._store     = store
+        self._trader    = trader
+        self._tickers   = tickers
+        self._ticker_idx = {ticker: idx for idx, ticker in enumerate(tickers)}
+
+    def __getitem__(self, ticker):
+        return _PositionView(self._store, self._trader, self._ticker_idx[ticker])
+
+    def __iter__(self):
+        return iter(self._tickers)
+
+    def __len__(self):
+        return self._tickers.__len__()
@@ -0,0 +1,192 @@
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # not available on Windows, phases are reported without their RSS
+    resource = None
+
+def peak_rss() -> int:
+    ''' High-water mark of the process' resident memory in bytes, 0 where it can't be read '''
+    if(resource is None):
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak*1024
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class FPG_NullProfiler:
+    '''
+        Disabled profiler, every call is a no-op returning shared objects so instrumented code costs nothing
+        measurable. Code computing an expensive counter value should check enabled first
+    '''
+    enabled = False
+
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+    def count(self, name, value=1):
+        pass
+
+    def day(self, day):
+        return self._phase
+
+    def report(self):
+        return None
+
+    def close(self):
+        return None
+
+null_profiler = FPG_NullProfiler()
+
+class _Phase:
+    __slots__ = ('profiler', 'name', 'start', 'peak', 'rss')
+
+    def __init__(self, profiler, name) -> None:
+        self.profiler   = profiler
+        self.name       = name
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self)
+        return False
+
+class _Day(_Phase):
+    __slots__ = ('day',)
+
+    def __init__(self, profiler, day) -> None:
+        super().__init__(profiler, "day")
+        self.day = day
+
+    def __enter__(self):
+        self.profiler._day_phases   = {}
+        self.profiler._day_counters = {}
+        return super().__enter__()
+
+    def __exit__(self, *exc):
+        super().__exit__(*exc)
+        self.profiler._trace_day(self.day)
+        return False
+
+class FPG_Profiler:
+    enabled = True
+
+    def __init__(self, report_path: str = None, trace_path: str = None, memory: bool = False) -> None:
+        '''
+            Phase timer & event counter of a simulation run
+            - phase(name):          context manager timing a named phase, phases may nest
+            - count(name, value):   adds value to a named counter
+            - day(day):             "day" phase that also writes the day's phase times & counters to the trace
+            report_path:    JSON report written by close(), see report()
+            trace_path:     per-day JSONL trace, one line per simulated day
+            memory:         tracks the peak traced (tracemalloc) memory of every phase, slows python allocations down
+        '''
+        self.report_path    = report_path
+        self.memory         = memory
+        self.phases         = {}
+        ''' name -> [calls, total seconds, max seconds, peak traced bytes, peak RSS, RSS growth] '''
+
+        self.counters       = {}
+        self._stack         = []
+        self._day_phases    = {}
+        self._day_counters  = {}
+        self._start         = time.perf_counter()
+
+        self._trace = open(trace_path, 'w') if trace_path is not None else None
+
+        if(memory and not tracemalloc.is_tracing()):
+            tracemalloc.start()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def day(self, day):
+        return _Day(self, day)
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        self._day_counters[name] = self._day_counters.get(name, 0) + value
+
+    def _enter(self, phase):
+        if(self.memory):
+            # A phase's peak is tracked from its own reset, parents keep the max of their children's peaks
+            if(self._stack):
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            phase.peak = tracemalloc.get_traced_memory()[0]
+
+        self._stack.append(phase)
+        phase.rss   = peak_rss()
+        phase.start = time.perf_counter()
+
+    def _exit(self, phase):
+        elapsed = time.perf_counter() - phase.start
+        rss     = peak_rss()
+        self._stack.pop()
+
+        stats = self.phases.setdefault(phase.name, [0, 0.0, 0.0, 0, 0, 0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        stats[4] = max(stats[4], rss)
+        stats[5] += rss - phase.rss
+
+        if(self.memory):
+            peak = max(phase.peak, tracemalloc.get_traced_memory()[1])
+            stats[3] = max(stats[3], peak)
+            if(self._stack):
+                self._stack[-1].peak = max(self._stack[-1].peak, peak)
+
+        if(self._trace is not None):
+            self._day_phases[phase.name] = self._day_phases.get(phase.name, 0.0) + elapsed
+
+    def _trace_day(self, day):
+        if(self._trace is not None):
+            self._trace.write(json.dumps({"day": day, "phases": self._day_phases, "counters": self._day_counters}) + '\n')
+
+    def report(self) -> dict:
+        '''
+            Wall time, process peak RSS, counter totals & per phase: calls, total/mean/max seconds, the process' peak RSS
+            at the phase's end & how much the phase raised it (rss_growth_bytes), peak traced bytes with memory tracking
+        '''
+        phases = {}
+        for name, (calls, total, longest, peak, rss, growth) in self.phases.items():
+            phases[name] = {"calls": calls, "total_s": total, "mean_s": total/calls, "max_s": longest,
+                            "peak_rss_bytes": rss, "rss_growth_bytes": growth}
+            if(self.memory):
+                phases[name]["peak_bytes"] = peak
+
+        return {"wall_s": time.perf_counter() - self._start, "peak_rss_bytes": peak_rss(), "phases": phases, "counters": dict(self.counters)}
+
+    def close(self):
+        ''' Writes the JSON report & closes the trace, returns the report '''
+        report = self.report()
+        if(self.report_path is not None):
+            with open(self.report_path, 'w') as file:
+                json.dump(report, file, indent=4)
+
+        if(self._trace is not None):
+            self._trace.close()
+            self._trace = None
+        return report
+
+def create_profiler(Inp):
+    ''' FPG_Profiler configured by the input's profile settings, the null profiler when profiling is off '''
+    if(not Inp.profile):
+        return null_profiler
+    return FPG_Profiler(Inp.profile_report, Inp.profile_trace, Inp.profile_memory)
@@ -0,0 +1,87 @@
+import numpy as np
+import zlib
+
+trader_block_size = 1 << 16
+''' Traders per population block, each block draws from a stream of its own so a trader's draws never depend
+    on how the population is split into chunks or processes '''
+
+_golden = np.uint64(0x9E3779B97F4A7C15)
+
+def _splitmix64(x):
+    ''' SplitMix64 finalizer over a uint64 array '''
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+class FPG_RandomStreams:
+    def __init__(self, seed: int) -> None:
+        '''
+            Named, independent random streams derived from a single seed with SeedSequence spawn keys:
+            - generator/stream: a Generator per (name, key...), e.g. per ticker or per shard
+            - population:       per-trader draws over the whole population, generated block by block
+            - uniform/normal:   counter based draws keyed by (name, day, trader id), for sparse subsets of traders
+            seed:   FPG_Input.randomSeed
+        '''
+        self.seed       = seed
+        self._streams   = {}
+
+    @staticmethod
+    def _name_key(name) -> int:
+        return zlib.crc32(name.encode())
+
+    def seed_sequence(self, name, *key) -> np.random.SeedSequence:
+        return np.random.SeedSequence(self.seed, spawn_key=(self._name_key(name),) + tuple(int(k) for k in key))
+
+    def generator(self, name, *key) -> np.random.Generator:
+        ''' Fresh Generator of the (name, key...) stream, always starts from the same state '''
+        return np.random.Generator(np.random.PCG64(self.seed_sequence(name, *key)))
+
+    def stream(self, name) -> np.random.Generator:
+        ''' Persistent Generator of a named stream, successive calls continue the same sequence '''
+        if(name not in self._streams):
+            self._streams[name] = self.generator(name)
+        return self._streams[name]
+
+    def population(self, name, numTraders, draw, start=0, stop=None, out=None):
+        '''
+            Per-trader draws of traders [start, stop) out of a population of numTraders.
+            draw(generator, size) returns an array whose first axis has length size.
+            The result only depends on (seed, name, trader id), whatever the [start, stop) split.
+            When out is given the draws are written into it block by block instead of being concatenated
+        '''
+        stop = numTraders if stop is None else stop
+
+        chunks = []
+        written = 0
+        for block in range(start//trader_block_size, -(-stop//trader_block_size)):
+            block_start = block*trader_block_size
+            block_stop  = min(block_start + trader_block_size, numTraders)
+
+            values = draw(self.generator(name, block), block_stop - block_start)
+            values = values[max(start, block_start) - block_start:min(stop, block_stop) - block_start]
+            if(out is None):
+                chunks.append(values)
+            else:
+                out[written:written + values.__len__()] = values
+                written += values.__len__()
+
+        if(out is not None):
+            return out
+        return np.concatenate(chunks) if chunks else draw(self.generator(name, 0), 0)
+
+    def _counter_bits(self, name, day, ids, lane=0):
+        base = np.uint64(self.seed_sequence(name).generate_state(1, dtype=np.uint64)[0])
+        counter = np.asarray(ids, dtype='uint64')*np.uint64(2) + np.uint64(lane)
+        return _splitmix64(base ^ _splitmix64(np.array([day], dtype='uint64')*_golden + counter))
+
+    def uniform(self, name, day, ids):
+        ''' [0 1) uniform draw of every id on day, each value only depends on (seed, name, day, id) '''
+        return (self._counter_bits(name, day, ids) >> np.uint64(11))*(1.0/(1 << 53))
+
+    def normal(self, name, day, ids, loc=0.0, scale=1.0):
+        ''' Normal draw of every id on day (Box-Muller over two counter lanes) '''
+        u1 = (self._counter_bits(name, day, ids, 0) >> np.uint64(11))*(1.0/(1 << 53))
+        u2 = (self._counter_bits(name, day, ids, 1) >> np.uint64(11))*(1.0/(1 << 53))
+        return loc + scale*np.sqrt(-2.0*np.log1p(-u1))*np.cos(2.0*np.pi*u2)
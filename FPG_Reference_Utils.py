@@ -1,9 +1,17 @@
 import numpy as np
 import pandas as pd
+import hashlib
+import json
+import os
+
+from dataclasses import dataclass
 
 from FPG_Inp import FPG_Input
 from Company import Company
 
+import FPG_Database
+from FPG_Distributions import FPG_ReturnDistribution, quantile_table
+
 Geographical_Grouping = {'United States': 'North America', 
                          'United Kingdom': 'Europe',
                          'France': 'Europe',
@@ -13,135 +21,326 @@ Geographical_Grouping = {'United States': 'North America',
                          'Japan': 'Asia'
                          }
 
-def load_historical_data(Inp: FPG_Input):
+index_types = ["price index", "index returns"]
 
-    historical_data = pd.DataFrame()
-    for ticker in Inp.tickers:
-        temp = pd.read_csv('Database/' + ticker + '_price_history.csv')
+reference_cache_folder  = FPG_Database.database_folder + 'RefCache/'
+reference_cache_version = 3
+''' Bump whenever the reference calculations change, invalidates every cached result '''
 
-        temp['Date'] = pd.to_datetime(temp['Date'])
-        temp.set_index('Date',inplace=True)
+@dataclass
+class FPG_IndexSet:
+    names:          list
+    ''' Index names of a grouped index set, None for a single (world) index '''
 
-        temp.columns = pd.MultiIndex.from_product([[ticker], temp.columns])
+    price_index:    np.ndarray
+    ''' float32 [day, index] '''
 
-        historical_data = pd.concat([historical_data, temp], axis=1)
-    del temp
+    index_returns:  np.ndarray
+    ''' float32 [day, index], percent change from the index's first value '''
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame):
+        if(frame.columns.nlevels == 1):
+            return cls(names=None,
+                       price_index=frame["price index"].to_numpy(dtype='float32')[:, np.newaxis],
+                       index_returns=frame["index returns"].to_numpy(dtype='float32')[:, np.newaxis])
 
-    return historical_data
+        names = list(frame.columns.get_level_values(0).unique())
+        return cls(names=names,
+                   price_index=frame.xs("price index", axis=1, level=1)[names].to_numpy(dtype='float32'),
+                   index_returns=frame.xs("index returns", axis=1, level=1)[names].to_numpy(dtype='float32'))
 
-def calculate_market_caps(Cmpnys, historical_data):
+    def to_frame(self, dates) -> pd.DataFrame:
+        index = pd.DatetimeIndex(np.asarray(dates).view('datetime64[ns]'), name='Date')
+        if(self.names is None):
+            return pd.DataFrame({"price index": self.price_index[:, 0], "index returns": self.index_returns[:, 0]}, index=index)
+
+        columns = pd.MultiIndex.from_product([self.names, index_types], names=["Sector", "Type"])
+        data = np.stack([self.price_index, self.index_returns], axis=2).reshape(index.__len__(), -1)
+        return pd.DataFrame(data, index=index, columns=columns)
+
+def load_historical_data(Inp: FPG_Input):
     """
-    Calculates market cap history for each company
+    Loads the price history of every ticker into one date indexed frame with (ticker, Close/Adj Close) columns.
 
-    :param Cmpnys: Company objects for the stock.
-    :param historical_data: past prices for each company.
+    :param Inp: FPG simulation input.
 
-    :return: DataFrame of the calculated market caps.
+    :return: DataFrame of the historical prices.
     """
-    
-    MarketCaps = pd.DataFrame(columns=list(Cmpnys.keys()),index=historical_data.index)
+    return FPG_Database.load_price_histories(Inp.tickers).to_frame()
+
+def calculate_market_caps(Cmpnys, price_history):
+    """
+    Calculates market cap history for each company
 
-    for ticker in Cmpnys.keys():
-        adj_close_prices = historical_data[ticker]['Adj Close'].to_numpy()
-        adj_close_prices = adj_close_prices.reshape(-1)  # Flatten if necessary (e.g., in case it's a 2D array)
+    :param Cmpnys: Company objects for the stock.
+    :param price_history: FPG_PriceHistory of the companies.
 
-        MarketCaps[ticker] = adj_close_prices * Cmpnys[ticker].shares_outstanding
+    :return: [day, ticker] array of the calculated market caps, NaN where a company has no data.
+    """
+    shares_outstanding = np.array([Cmpnys[ticker].shares_outstanding for ticker in price_history.tickers], dtype='float64')
 
-    return MarketCaps
+    return price_history.adj_close * shares_outstanding
 
 def calculate_stock_weights(market_caps):
     """
     Optimized version to calculate the weight of each stock in the market on each date.
     
-    :param market_caps: pandas DataFrame of market caps, indexed by dates, with columns for each stock.
-    :return: pandas DataFrame with the weight of each stock on each date.
+    :param market_caps: [day, ticker] array of market caps.
+    :return: [day, ticker] array with the weight of each stock on each date.
     """
     # Calculate the total market cap for each date in a vectorized way
-    total_market_caps = market_caps.sum(axis=1)
+    total_market_caps = np.nansum(market_caps, axis=1)
 
-    # Avoid division by zero by filling any NaNs in total_market_caps with 1 (to keep results valid)
+    # Avoid division by zero by replacing zero totals with 1 (to keep results valid)
     # The result will still be NaN for dates with zero market cap
-    total_market_caps = total_market_caps.replace(0, 1)
+    total_market_caps[total_market_caps == 0] = 1
 
     # Calculate weights using broadcasting (no loop needed)
-    stock_weights = market_caps.div(total_market_caps, axis=0)
+    stock_weights = market_caps / total_market_caps[:, np.newaxis]
     
     return stock_weights
 
-def calculate_index(historical_data, Weights):
-    tickers_historical_data = historical_data.loc[:, (slice(None), ["Adj Close"])]
+def calculate_index(price_history, Weights, columns=None):
+    """
+    Calculates a cap weighted price index & the quantile table of its daily return distribution
 
-    temp = np.nan_to_num(Weights.to_numpy() * tickers_historical_data.to_numpy(),0).sum(axis=1)
-    idx = pd.DataFrame(index=tickers_historical_data.index, columns=["price index", "index returns"])
+    :param price_history: FPG_PriceHistory of the companies.
+    :param Weights: [day, ticker] stock weights of the index members.
+    :param columns: ticker axis positions of the index members, all of the tickers if None.
+    """
+    adj_close = price_history.adj_close if columns is None else price_history.adj_close[:, columns]
+
+    temp = np.nan_to_num(Weights * adj_close, nan=0).sum(axis=1)
+    idx = pd.DataFrame(index=price_history.index, columns=["price index", "index returns"])
 
     first_value_pos = np.where(temp > 0)[0][0]
    
-    distribution = {"sorted daily change": np.array([]), "CDF": np.array([])}
-
     daily_change = (np.append(0,np.diff(temp[first_value_pos:]))/temp[first_value_pos:])*100
-    daily_change_sorted = np.sort(daily_change)
-    n = daily_change_sorted.__len__()
-   
-    cumulative_probs = np.arange(1, n + 1) / n # Cumulative probabilities from 0 to 1
 
     idx["price index"] = temp.astype('float32')
     idx["index returns"] = (((temp/temp[first_value_pos]) - 1)*100).astype('float32')
 
-    distribution["sorted daily change"] = daily_change_sorted
-    distribution["CDF"] = cumulative_probs
+    distribution = FPG_ReturnDistribution.from_samples(None, daily_change)
 
     del temp
 
     return idx, distribution
 
-def calculate_sector_geographic_indices(historical_data, MarketCaps, Cmpnys):
-    sectors = []
-    # countries = []
-    regions = []
+legacy_index_names = {'sector': ('Sector_idx', 'Sector_idx'),
+                      'region': ('Geographic_idx', 'Geographical_idx')}
+''' RefData index name & returnDistributions key of the groupings that predate the grouping engine '''
+
+@dataclass
+class FPG_Grouping:
+    name:           str
+    ''' RefData index name of the grouping '''
+
+    distribution:   str
+    ''' returnDistributions key of the grouping '''
+
+    groups:         list
+    ''' Group names, None for a single index over all of the members (world index) '''
+
+    tickers:        np.ndarray
+    ''' Ticker axis position of every membership '''
 
-    SectorGroups = {}
-    GeoGroups = {}
+    members:        np.ndarray
+    ''' Group position of every membership '''
 
-    for ticker in Cmpnys.keys():
-        sector  = Cmpnys[ticker].sector
-        # country = Cmpnys[ticker].country
-        region = Cmpnys[ticker].region
+    @property
+    def numGroups(self) -> int:
+        return 1 if self.groups is None else self.groups.__len__()
 
-        sectors.append(sector)
-        # countries.append(country)
+    def matrix(self, numTickers) -> np.ndarray:
+        ''' [ticker, group] membership matrix '''
+        membership = np.zeros((numTickers, self.numGroups))
+        membership[self.tickers, self.members] = 1
+        return membership
 
-        # region = Geographical_Grouping[country]
-        regions.append(region)
+def grouping_from_labels(name, distribution, labels) -> FPG_Grouping:
+    ''' One group per distinct label (sorted), tickers labeled None belong to no group '''
+    positions = [pos for pos, label in enumerate(labels) if label is not None]
+    groups, members = np.unique([labels[pos] for pos in positions], return_inverse=True)
 
-        if(region not in GeoGroups):
-            GeoGroups[region] = []
-        GeoGroups[region].append(ticker)
+    return FPG_Grouping(name, distribution, groups.tolist(), np.array(positions, dtype='int64'), members.reshape(-1))
 
-        if(sector not in SectorGroups):
-            SectorGroups[sector] = []
-        SectorGroups[sector].append(ticker)
+def grouping_from_baskets(name, distribution, baskets, tickers) -> FPG_Grouping:
+    ''' User defined, possibly overlapping, baskets: {basket name: [tickers]} '''
+    ticker_idx  = {ticker: pos for pos, ticker in enumerate(tickers)}
+    groups      = list(baskets.keys())
+    pairs       = [(ticker_idx[ticker], group_idx) for group_idx, group in enumerate(groups) for ticker in baskets[group]]
 
-    sectors = np.unique(sectors)
-    regions = np.unique(regions)
+    positions, members = np.array(pairs, dtype='int64').reshape(-1, 2).T
+    return FPG_Grouping(name, distribution, groups, positions, members)
 
-    sector_multi_index = pd.MultiIndex.from_product([sectors, ["price index", "index returns"]], names=["Sector", "Type"])
-    geo_multi_index = pd.MultiIndex.from_product([regions, ["price index", "index returns"]], names=["Sector", "Type"])
+def world_grouping(numTickers) -> FPG_Grouping:
+    return FPG_Grouping('World_idx', 'World_idx', None, np.arange(numTickers), np.zeros(numTickers, dtype='int64'))
+
+def build_groupings(Cmpnys, tickers, index_groupings, custom_groups) -> list:
+    """
+    Groupings of the reference indices: the world index, one grouping per Company attribute & the custom baskets
+
+    :param Cmpnys: Company objects by ticker.
+    :param tickers: ticker axis.
+    :param index_groupings: Company attributes to group by ('sector', 'region', 'industry', 'country', ...).
+    :param custom_groups: user defined baskets, {basket name: [tickers]}.
+    """
+    groupings = [world_grouping(tickers.__len__())]
+    for attribute in index_groupings:
+        name, distribution = legacy_index_names.get(attribute, (attribute.capitalize() + '_idx',)*2)
+        groupings.append(grouping_from_labels(name, distribution, [getattr(Cmpnys[ticker], attribute) for ticker in tickers]))
+
+    if(custom_groups):
+        groupings.append(grouping_from_baskets('Custom_idx', 'Custom_idx', custom_groups, tickers))
+
+    return groupings
+
+def compute_group_indices(adj_close, MarketCaps, groupings):
+    """
+    Cap weighted price indices, returns & daily change quantile tables of every group of every grouping,
+    computed with two matrix products over the stacked membership matrices
 
-    Sector_idx = pd.DataFrame(index=historical_data.index, columns=sector_multi_index)
-    Geo_idx = pd.DataFrame(index=historical_data.index, columns=geo_multi_index)
+    :param adj_close: [day, ticker] adjusted close prices.
+    :param MarketCaps: [day, ticker] market caps, NaN where a company has no data.
+    :param groupings: FPG_Grouping list.
 
-    sectors_distributions = {}
-    for sector in sectors:
-        Tickers = SectorGroups[sector]
+    :return: (Indices, returnDistributions) by grouping name & distribution key.
+    """
+    numDays, numTickers = MarketCaps.shape
+    membership = np.hstack([grouping.matrix(numTickers) for grouping in groupings])
+
+    group_caps  = np.nan_to_num(MarketCaps) @ membership
+    temp        = np.nan_to_num(MarketCaps * adj_close) @ membership
+
+    # Zero totals are replaced by 1 to keep results valid, same as calculate_stock_weights
+    group_caps[group_caps == 0] = 1
+    temp /= group_caps
+    del group_caps
+
+    positive    = temp > 0
+    first_value_pos = np.where(positive.any(axis=0), positive.argmax(axis=0), numDays)
+    first_value = temp[np.minimum(first_value_pos, numDays - 1), np.arange(temp.shape[1])]
+    first_value[first_value_pos == numDays] = np.nan
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index_returns = ((temp/first_value) - 1)*100
+
+        daily_change = np.empty_like(temp)
+        daily_change[0] = 0
+        daily_change[1:] = (np.diff(temp, axis=0)/temp[1:])*100
+
+    # Days before a group's first value are pushed to the end of the sort as NaN
+    before_first = np.arange(numDays)[:, np.newaxis] < first_value_pos
+    daily_change[before_first] = np.nan
+    valid_first = first_value_pos < numDays
+    daily_change[first_value_pos[valid_first], np.flatnonzero(valid_first)] = 0
+    daily_change.sort(axis=0)
+    counts      = numDays - first_value_pos
+    quantiles   = quantile_table(daily_change, counts)
+
+    Indices = {}
+    returnDistributions = {}
+    column = 0
+    for grouping in groupings:
+        columns = slice(column, column + grouping.numGroups)
+        column += grouping.numGroups
+
+        Indices[grouping.name] = FPG_IndexSet(grouping.groups, temp[:, columns].astype('float32'), index_returns[:, columns].astype('float32'))
+
+        returnDistributions[grouping.distribution] = FPG_ReturnDistribution(grouping.groups, quantiles[columns], counts[columns])
+
+    return Indices, returnDistributions
+
+def calculate_reference_indices(price_history, MarketCaps, Cmpnys, Inp: FPG_Input):
+    """
+    Calculates every reference index of the simulation
+
+    :param price_history: FPG_PriceHistory of the companies.
+    :param MarketCaps: [day, ticker] market caps.
+    :param Cmpnys: Company objects by ticker.
+    :param Inp: FPG simulation input, defines the groupings.
+
+    :return: (Indices, returnDistributions) by index name & distribution key.
+    """
+    groupings = build_groupings(Cmpnys, price_history.tickers, Inp.index_groupings, Inp.custom_groups)
+    return compute_group_indices(price_history.adj_close, MarketCaps, groupings)
+
+def calculate_sector_geographic_indices(price_history, MarketCaps, Cmpnys):
+    groupings = build_groupings(Cmpnys, price_history.tickers, ['sector', 'region'], {})[1:]
+    Indices, distributions = compute_group_indices(price_history.adj_close, MarketCaps, groupings)
+
+    return Indices['Sector_idx'].to_frame(price_history.dates), distributions['Sector_idx'], \
+           Indices['Geographic_idx'].to_frame(price_history.dates), distributions['Geographical_idx']
+
+def reference_cache_key(tickers, start_date, index_groupings=(), custom_groups={}) -> str:
+    """
+    Content address of the reference data of a ticker universe
+
+    :param tickers: ticker symbols of the universe, their order doesn't matter.
+    :param start_date: simulation start date.
+    :param index_groupings: Company attributes the indices are grouped by.
+    :param custom_groups: user defined baskets.
+
+    :return: hex digest of the sorted tickers, the start date, the groupings & the fingerprints of the tickers' database files.
+    """
+    key = {"version": reference_cache_version, "start_date": start_date, "tickers": {},
+           "groupings": list(index_groupings), "custom_groups": {name: sorted(tickers) for name, tickers in custom_groups.items()}}
+    for ticker in sorted(tickers):
+        key["tickers"][ticker] = [FPG_Database.file_fingerprint(FPG_Database.metadata_csv(ticker)),
+                                  FPG_Database.file_fingerprint(FPG_Database.price_history_csv(ticker))]
+
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def save_reference_cache(key, dates, Indices, returnDistributions):
+    """
+    Saves the reference indices & their return distributions under their content address
+
+    :param key: reference_cache_key of the universe.
+    :param dates: date axis of the indices.
+    :param Indices: FPG_IndexSet of every reference index, by name.
+    :param returnDistributions: FPG_ReturnDistribution of every index, FPG_Market.returnDistributions layout.
+    """
+    arrays = {"dates": dates}
+    for name, index_set in Indices.items():
+        arrays[name + "/price index"]   = index_set.price_index
+        arrays[name + "/index returns"] = index_set.index_returns
+        if(index_set.names is not None):
+            arrays[name + "/names"]     = np.array(index_set.names, dtype=str)
+
+    for name, distribution in returnDistributions.items():
+        arrays[name + "/quantiles"] = distribution.quantiles
+        arrays[name + "/counts"]    = distribution.counts
+        if(distribution.names is not None):
+            arrays[name + "/distribution groups"] = np.array(distribution.names, dtype=str)
+
+    os.makedirs(reference_cache_folder, exist_ok=True)
+    FPG_Database.write_atomically(reference_cache_folder + key + '.npz', lambda file: np.savez(file, **arrays))
+
+def load_reference_cache(key):
+    """
+    Loads cached reference data, see save_reference_cache
+
+    :param key: reference_cache_key of the universe.
+
+    :return: (dates, Indices, returnDistributions) or None if nothing is cached under key.
+    """
+    path = reference_cache_folder + key + '.npz'
+    if(not os.path.isfile(path)):
+        return None
 
-        Sector_Weights = calculate_stock_weights(MarketCaps[Tickers])
-        Sector_idx[sector], sectors_distributions[sector] = calculate_index(historical_data[Tickers], Sector_Weights)
+    with np.load(path) as cache:
+        arrays = {name: cache[name] for name in cache.files}
 
-    Geo_distributions = {}
-    for region in regions:
-        Tickers = GeoGroups[region]
+    Indices = {}
+    returnDistributions = {}
+    for name in sorted({array_name.split('/')[0] for array_name in arrays if '/' in array_name}):
+        if(name + "/price index" in arrays):
+            names = arrays[name + "/names"].tolist() if name + "/names" in arrays else None
+            Indices[name] = FPG_IndexSet(names, arrays[name + "/price index"], arrays[name + "/index returns"])
 
-        region_Weights = calculate_stock_weights(MarketCaps[Tickers])
-        Geo_idx[region], Geo_distributions[region] = calculate_index(historical_data.loc[:, (Tickers ,slice(None))], region_Weights)
+        if(name + "/quantiles" in arrays):
+            names = arrays[name + "/distribution groups"].tolist() if name + "/distribution groups" in arrays else None
+            returnDistributions[name] = FPG_ReturnDistribution(names, arrays[name + "/quantiles"], arrays[name + "/counts"])
 
-    return Sector_idx, sectors_distributions, Geo_idx, Geo_distributions
\ No newline at end of file
+    return arrays["dates"], Indices, returnDistributions
\ No newline at end of file
@@ -0,0 +1,352 @@
+import numpy as np
+import json
+import os
+
+from dataclasses import dataclass
+
+from FPG_History import float_fields, int_fields
+from FPG_Indicators import indicator_names
+
+resample_freqs = ('W', 'M', 'Y')
+''' Weekly (weeks start on Monday), monthly & yearly periods of FPG_Results.resample '''
+
+aggregations = ('ohlc', 'first', 'last', 'max', 'min', 'sum', 'mean')
+
+def _to_ns(date) -> int:
+    ''' int64 nanoseconds since the epoch of a date string, datetime, np.datetime64 or pandas Timestamp '''
+    return int(np.datetime64(date, 'ns').astype('int64'))
+
+def period_keys(dates, freq: str) -> np.ndarray:
+    ''' Period number of every date (int64 nanoseconds since the epoch) for one of resample_freqs '''
+    days = np.asarray(dates, dtype='int64').view('datetime64[ns]').astype('datetime64[D]')
+    if(freq == 'W'):
+        return (days.astype('int64') + 3)//7        # 1970-01-01 is a Thursday
+    if(freq == 'M'):
+        return days.astype('datetime64[M]').astype('int64')
+    if(freq == 'Y'):
+        return days.astype('datetime64[Y]').astype('int64')
+    raise ValueError(f"unknown resampling frequency {freq!r}, expected one of {resample_freqs}")
+
+def period_starts(keys) -> np.ndarray:
+    ''' Row of the first day of every period of a sorted key array, the reduceat indices '''
+    return np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+
+def _valid_rows(values, starts):
+    ''' Rows of the first & last valid value of every period & column, -1 where a period has none '''
+    numRows = values.shape[0]
+    shape   = (-1,) + (1,)*(values.ndim - 1)
+    rows    = np.arange(numRows).reshape(shape)
+    valid   = ~np.isnan(values)
+    stops   = np.append(starts[1:], numRows)
+
+    last    = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)[stops - 1]
+    first   = np.minimum.accumulate(np.where(valid, rows, numRows)[::-1], axis=0)[::-1][starts]
+    return np.where(first < stops.reshape(shape), first, -1), np.where(last >= starts.reshape(shape), last, -1)
+
+def _take_rows(values, rows):
+    ''' values[rows[p, ...], ...] for every period & column, NaN where rows is -1 '''
+    taken = np.take_along_axis(values, np.maximum(rows, 0), axis=0)
+    return np.where(rows >= 0, taken, np.nan)
+
+def period_sums(values, starts):
+    '''
+        Sums & counts of the valid values of every period, from prefix sums over the day axis
+
+        :return: (sums, counts), [period, ...] each.
+    '''
+    valid   = ~np.isnan(values)
+    zero    = np.zeros((1,) + values.shape[1:])
+    sums    = np.concatenate([zero, np.cumsum(np.where(valid, values, 0), axis=0)])
+    counts  = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    stops   = np.append(starts[1:], values.shape[0])
+    return sums[stops] - sums[starts], (counts[stops] - counts[starts]).astype('int64')
+
+def aggregate(values, starts, how: str):
+    '''
+        One value per period of a [day, ...] array, NaN values are skipped
+        starts: reduceat indices of the periods, see period_starts
+        how:    one of aggregations, 'ohlc' returns (open, high, low, close)
+    '''
+    values = np.asarray(values, dtype='float64')
+    if(how in ('ohlc', 'first', 'last')):
+        first, last = _valid_rows(values, starts)
+        if(how == 'first'):
+            return _take_rows(values, first)
+        if(how == 'last'):
+            return _take_rows(values, last)
+        return _take_rows(values, first), np.fmax.reduceat(values, starts, axis=0), np.fmin.reduceat(values, starts, axis=0), _take_rows(values, last)
+    if(how == 'max'):
+        return np.fmax.reduceat(values, starts, axis=0)
+    if(how == 'min'):
+        return np.fmin.reduceat(values, starts, axis=0)
+    if(how in ('sum', 'mean')):
+        sums, counts = period_sums(values, starts)
+        if(how == 'sum'):
+            return sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums/counts, np.nan)
+    raise ValueError(f"unknown aggregation {how!r}, expected one of {aggregations}")
+
+@dataclass
+class FPG_OHLC:
+    dates:  np.ndarray
+    ''' datetime64[ns] of the first trading day of every period '''
+
+    open:   np.ndarray
+    ''' First price of every period, [period, ticker] '''
+
+    high:   np.ndarray
+    low:    np.ndarray
+    close:  np.ndarray
+    ''' Last price of every period, [period, ticker] '''
+
+    volume: np.ndarray
+    ''' Shares traded over every period, [period, ticker] '''
+
+class FPG_Results:
+    def __init__(self, dates, tickers, index_columns, segments, trader_stats=(), folder=None, Reference=None) -> None:
+        '''
+            Date indexed queries over the simulation results, in memory (from_data) or streamed outputs (open).
+            Every query reads only the segments, fields, tickers & index columns it selects, memory mapped segment
+            files make that a partial read, so multi-decade outputs are never loaded as a whole
+            dates:          trading date of every day, int64 nanoseconds since the epoch
+            tickers:        ticker axis
+            index_columns:  (index name, group name or None) of every simulated index column
+            segments:       {"start", "stop", "files" or "arrays"} of every day range of the results
+            trader_stats:   columns of the trader statistics segments (FPG_Output.trader_stats)
+            folder:         output folder the segment files are relative to
+            Reference:      FPG_IndexSet of every reference index by name, for index(..., reference=True)
+        '''
+        self.dates          = np.asarray(dates, dtype='int64')
+        self.tickers        = list(tickers)
+        self.ticker_idx     = {ticker: idx for idx, ticker in enumerate(self.tickers)}
+        self.index_columns  = [tuple(column) for column in index_columns]
+        self.segments       = sorted(segments, key=lambda segment: segment["start"])
+        self.trader_stats   = list(trader_stats)
+        self.folder         = folder
+        self.Reference      = Reference
+
+        self.manifest       = None
+        ''' Output manifest of streamed results '''
+
+        self._arrays    = {}
+        ''' Memory maps of the segment files, opened on first use '''
+
+        self._periods   = {}
+        ''' Period keys of the date axis by frequency '''
+
+    @classmethod
+    def from_data(cls, Data):
+        ''' Results of a simulation held in memory, its history store must not be chunked (see open otherwise) '''
+        History = Data.History
+        if(History.chunk_days < History.numTotalDays):
+            raise ValueError("the history is streamed to the output folder, use FPG_Results.open on it")
+
+        stop    = History.recorded_stop
+        tracker = Data.IndexTracker
+        arrays  = {"float":          History.float_block[:, :stop],
+                   "int":            History.int_block[:, :stop],
+                   "price_index":    tracker.price_index[:stop],
+                   "index_returns":  tracker.index_returns[:stop],
+                   "indicators":     Data.Indicators.values[:, :stop]}
+        return cls(Data.RefData.dates, History.tickers, cls._columns([[grouping.name, grouping.groups] for grouping in tracker.groupings]),
+                   [{"start": 0, "stop": stop, "arrays": arrays}], Reference=Data.RefData.Indices)
+
+    @classmethod
+    def open(cls, folder):
+        ''' Results streamed by FPG_OutputWriter, the segments written so far if the run is still going '''
+        with open(os.path.join(folder, "manifest.json")) as file:
+            manifest = json.load(file)
+
+        results = cls(np.load(os.path.join(folder, "dates.npy")), manifest["tickers"], cls._columns(manifest["indices"]),
+                      manifest["chunks"], manifest["trader_stats"], folder)
+        results.manifest = manifest
+        return results
+
+    @staticmethod
+    def _columns(indices):
+        ''' (index name, group) of every index column, in FPG_IndexTracker column order '''
+        return [(name, group) for name, groups in indices for group in (groups if groups is not None else [None])]
+
+    @property
+    def numDays(self) -> int:
+        ''' Days with results, [0, numDays) '''
+        return max((segment["stop"] for segment in self.segments), default=0)
+
+    # Day <-> date index
+    def date_of(self, days) -> np.ndarray:
+        ''' datetime64[ns] of simulation days '''
+        return self.dates[days].view('datetime64[ns]')
+
+    def day_of(self, date, side: str = 'left') -> int:
+        ''' Day of a date, the next trading day ('left') or the previous one ('right') when it isn't a trading day '''
+        position = int(np.searchsorted(self.dates, _to_ns(date), side=side))
+        return position if side == 'left' else position - 1
+
+    def day_range(self, start=None, end=None):
+        '''
+            Days of the dates [start, end], both optional & inclusive, clipped to the recorded days
+
+            :return: (first day, stop day).
+        '''
+        first   = 0 if start is None else self.day_of(start, 'left')
+        stop    = self.numDays if end is None else self.day_of(end, 'right') + 1
+        return first, max(first, min(stop, self.numDays))
+
+    def ticker_positions(self, tickers=None) -> np.ndarray:
+        if(tickers is None):
+            return np.arange(self.tickers.__len__())
+        if(isinstance(tickers, str)):
+            tickers = [tickers]
+        return np.array([self.ticker_idx[ticker] for ticker in tickers], dtype='int64')
+
+    def index_positions(self, name=None, groups=None) -> np.ndarray:
+        ''' Index columns of an index (all of them if None), restricted to some of its groups '''
+        if(isinstance(groups, str)):
+            groups = [groups]
+        return np.array([pos for pos, (index, group) in enumerate(self.index_columns)
+                         if (name is None or index == name) and (groups is None or group in groups)], dtype='int64')
+
+    # Segment streaming
+    def _segment_array(self, segment, kind):
+        if("arrays" in segment):
+            return segment["arrays"][kind]
+        if(kind not in segment["files"]):
+            raise KeyError(f"the output has no {kind} segments, it was written by an older version")
+        path = os.path.join(self.folder, segment["files"][kind])
+        if(path not in self._arrays):
+            self._arrays[path] = np.load(path, mmap_mode='r')
+        return self._arrays[path]
+
+    def _gather(self, kind, first, stop, columns, rows=None):
+        '''
+            float64 [row, day, column] (rows given, history blocks) or [day, column] values of the days [first, stop),
+            read segment by segment. Days no segment covers are NaN
+        '''
+        shape = (stop - first, columns.__len__()) if rows is None else (rows.__len__(), stop - first, columns.__len__())
+        result = np.full(shape, np.nan)
+        for segment in self.segments:
+            lo, hi = max(first, segment["start"]), min(stop, segment["stop"])
+            if(lo >= hi):
+                continue
+            array   = self._segment_array(segment, kind)
+            days    = slice(lo - segment["start"], hi - segment["start"])
+            if(rows is None):
+                result[lo - first:hi - first] = array[days][:, columns]
+            else:
+                result[:, lo - first:hi - first] = array[rows, days][..., columns]
+        return result
+
+    # Queries
+    def history(self, fields, tickers=None, start=None, end=None):
+        '''
+            Company history over the dates [start, end]
+            fields:     one of FPG_History.history_fields, or a list of them
+            tickers:    ticker or tickers, all of them if None
+
+            :return: float64 [day, ticker] for a single field, [field, day, ticker] for a list.
+        '''
+        single  = isinstance(fields, str)
+        fields  = [fields] if single else list(fields)
+        first, stop = self.day_range(start, end)
+        columns = self.ticker_positions(tickers)
+
+        result = np.empty((fields.__len__(), stop - first, columns.__len__()))
+        for kind, names in (("float", float_fields), ("int", int_fields)):
+            selected = [pos for pos, field in enumerate(fields) if field in names]
+            if(selected):
+                rows = np.array([names.index(fields[pos]) for pos in selected])
+                result[selected] = self._gather(kind, first, stop, columns, rows)
+
+        unknown = [field for field in fields if field not in float_fields and field not in int_fields]
+        if(unknown):
+            raise KeyError(f"unknown history fields {unknown}")
+        return result[0] if single else result
+
+    def index(self, name=None, groups=None, start=None, end=None, kind: str = 'price_index', reference: bool = False):
+        '''
+            Simulated (or reference) index values over the dates [start, end]
+            name:       index name, e.g. 'Sector_idx', every index if None
+            groups:     group name or names of the index, all of them if None
+            kind:       'price_index' or 'index_returns'
+
+            :return: float64 [day, index column], see index_positions.
+        '''
+        first, stop = self.day_range(start, end)
+        if(not reference):
+            return self._gather(kind, first, stop, self.index_positions(name, groups))
+
+        if(self.Reference is None):
+            raise ValueError("the reference indices are only available in memory, see FPG_Results.from_data")
+        values = np.hstack([getattr(self.Reference[index], kind) for index in dict.fromkeys(index for index, _ in self.index_columns)])
+        return values[first:stop][:, self.index_positions(name, groups)].astype('float64')
+
+    def indicators(self, name, tickers=None, start=None, end=None):
+        ''' Technical indicator (see FPG_Indicators.indicator_names) over the dates [start, end], [day, ticker] '''
+        first, stop = self.day_range(start, end)
+        rows = np.array([indicator_names.index(name)])
+        return self._gather("indicators", first, stop, self.ticker_positions(tickers), rows)[0]
+
+    def trader_statistics(self, stats=None, start=None, end=None):
+        ''' Daily trader statistics (FPG_Output.trader_stats) over the dates [start, end], [day, stat] '''
+        if(not self.trader_stats):
+            raise ValueError("trader statistics are only recorded in streamed outputs, see FPG_Results.open")
+        if(isinstance(stats, str)):
+            stats = [stats]
+        columns = np.arange(self.trader_stats.__len__()) if stats is None else np.array([self.trader_stats.index(stat) for stat in stats])
+        first, stop = self.day_range(start, end)
+        return self._gather("stats", first, stop, columns)
+
+    # Resampling
+    def periods(self, freq: str, first: int, stop: int):
+        '''
+            Periods of the days [first, stop)
+
+            :return: (reduceat indices relative to first, datetime64[ns] of every period's first day).
+        '''
+        if(freq not in self._periods):
+            self._periods[freq] = period_keys(self.dates, freq)
+        starts = period_starts(self._periods[freq][first:stop])
+        return starts, self.date_of(first + starts)
+
+    def resample(self, field, freq: str = 'M', how: str = 'last', tickers=None, start=None, end=None):
+        '''
+            History field aggregated by period over the dates [start, end]
+            freq:   one of resample_freqs
+            how:    one of aggregations
+
+            :return: (datetime64[ns] of every period's first day, [period, ticker] values or (open, high, low, close) for 'ohlc').
+        '''
+        values  = self.history(field, tickers, start, end)
+        first, _ = self.day_range(start, end)
+        starts, dates = self.periods(freq, first, first + values.shape[0])
+        if(values.shape[0] == 0):
+            empty = np.empty((0, values.shape[1]))
+            return dates, (empty,)*4 if how == 'ohlc' else empty
+        return dates, aggregate(values, starts, how)
+
+    def ohlc(self, freq: str = 'M', tickers=None, start=None, end=None) -> FPG_OHLC:
+        ''' Open/high/low/close prices & traded volume of every period over the dates [start, end] '''
+        first, stop = self.day_range(start, end)
+        prices, volume = self.history(["price", "trading_volume"], tickers, start, end)
+        starts, dates = self.periods(freq, first, stop)
+        if(stop == first):
+            empty = np.empty((0, prices.shape[1]))
+            return FPG_OHLC(dates, empty, empty, empty, empty, empty.astype('int64'))
+
+        open_, high, low, close = aggregate(prices, starts, 'ohlc')
+        return FPG_OHLC(dates, open_, high, low, close, aggregate(volume, starts, 'sum').astype('int64'))
+
+    def frame(self, field, tickers=None, start=None, end=None):
+        ''' Date indexed pandas DataFrame of a history field, one column per ticker '''
+        import pandas as pd
+
+        first, stop = self.day_range(start, end)
+        columns = self.ticker_positions(tickers)
+        return pd.DataFrame(self.history(field, tickers, start, end), columns=[self.tickers[pos] for pos in columns],
+                            index=pd.DatetimeIndex(self.date_of(np.arange(first, stop)), name='Date'))
+
+def open_runs(folders):
+    ''' FPG_Results of the output folders of several runs (e.g. an ensemble's seeds), by random seed '''
+    runs = [FPG_Results.open(folder) for folder in folders]
+    return {results.manifest["randomSeed"]: results for results in runs}
@@ -0,0 +1,83 @@
+import numpy as np
+
+class FPG_TradeScheduler:
+    def __init__(self, Traders, numTotalDays: int, RNG, start_day: int = 0) -> None:
+        '''
+            Calendar queue of the traders' next trade days, so that only the traders due on a day cost anything.
+            Each trader's next trade day is drawn once per trade, from the same stochastic threshold
+            Trader._canTrade polls every day (trade_frequency + N(0, sqrt(trade_frequency)))
+            Traders:        TraderPool
+            numTotalDays:   number of simulated days, nothing is scheduled past it
+            RNG:            FPG_RandomStreams, intervals are keyed by (day, trader) so they don't depend on batching
+            start_day:      day from which the first trade days are drawn
+        '''
+        self.Traders        = Traders
+        self.numTotalDays   = numTotalDays
+        self.RNG            = RNG
+
+        maxInterval = int(Traders.possible_trade_frequencies.max())
+        maxInterval += int(6*np.sqrt(maxInterval)) + 1
+        self.width  = 1 << int(np.ceil(np.log2(maxInterval + 1)))
+        ''' Ring size of the calendar, every interval is shorter so each bucket only ever holds a single day '''
+
+        self._buckets   = [[] for _ in range(self.width)]
+        self._counts    = np.zeros(self.width, dtype='int64')
+
+        self._group_income()
+        self.reschedule(np.arange(Traders.size), start_day)
+
+    def _group_income(self):
+        ''' Income is paid every income_freq days, traders are grouped by their frequency '''
+        frequencies, inverse = np.unique(self.Traders.income_freq, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        self._income_groups = dict(zip(frequencies.tolist(), np.split(order, np.cumsum(np.bincount(inverse))[:-1])))
+
+    def _draw_intervals(self, traders, day):
+        frequency = self.Traders.trade_frequency[traders].astype('float64')
+        threshold = frequency + self.RNG.normal('trading', day, traders, 0, np.sqrt(frequency))
+
+        # First whole day past the threshold, as in the daily poll
+        return np.clip(np.floor(threshold) + 1, 1, self.width - 1).astype('int64')
+
+    def reschedule(self, traders, day):
+        ''' Draws the next trade day of traders that traded on day '''
+        traders = np.asarray(traders, dtype='int64')
+        days    = day + self._draw_intervals(traders, day)
+
+        keep    = days < self.numTotalDays
+        traders, days = traders[keep], days[keep]
+
+        order   = np.argsort(days, kind='stable')
+        traders, days = traders[order], days[order]
+
+        bounds  = np.flatnonzero(np.diff(days)) + 1
+        for group_days, group in zip(np.split(days, bounds), np.split(traders, bounds)):
+            if(group.__len__() == 0):
+                continue
+            slot = group_days[0] % self.width
+            self._buckets[slot].append(group)
+            self._counts[slot] += group.__len__()
+
+    def due(self, day):
+        ''' Traders scheduled to trade on day, removed from the queue '''
+        slot = day % self.width
+        traders = np.concatenate(self._buckets[slot]) if self._buckets[slot] else np.empty(0, dtype='int64')
+
+        self._buckets[slot] = []
+        self._counts[slot] = 0
+        return traders
+
+    def income_due(self, day):
+        ''' Traders whose income is paid on day '''
+        groups = [traders for frequency, traders in self._income_groups.items() if day % frequency == 0]
+        return np.concatenate(groups) if groups else np.empty(0, dtype='int64')
+
+    def next_event_day(self, day):
+        ''' First day >= day on which a trade or an income payment is scheduled (numTotalDays if none) '''
+        slots = (day + np.arange(self.width)) % self.width
+        pending = np.flatnonzero(self._counts[slots])
+        next_trade = day + pending[0] if pending.__len__() > 0 else self.numTotalDays
+
+        next_income = min(-(-day // frequency)*frequency for frequency in self._income_groups) if self._income_groups else self.numTotalDays
+
+        return min(next_trade, next_income, self.numTotalDays)
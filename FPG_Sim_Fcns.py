@@ -1,6 +1,7 @@
 import numpy as np
 
 from FPG_DataStrc import FPG_Data
+import FPG_Auction
 
 def Initialize_Market(Data: FPG_Data):
     '''
@@ -10,6 +11,62 @@ def Initialize_Market(Data: FPG_Data):
 
     # Have every trader go through a trading session, just for the initialization - all trader bids 
     # (no asks take place here) will be accepted
-    for Trader in Data.Traders:
-        Trader.trading_day(Data,'Init')
-    pass
\ No newline at end of file
+    with Data.Profiler.phase("init.market"):
+        Data.Traders.trading_day(Data, np.arange(Data.Traders.size), 'Init')
+        Data.History.record_day(0)
+
+def Simulate_Day(Data: FPG_Data, day):
+    '''
+        One simulated trading day, only the traders due for income or trading take part
+    '''
+    Profiler = Data.Profiler
+    Data.Manager.day = Data.Market.day = day
+
+    with Profiler.day(day):
+        with Profiler.phase("day.income"):
+            paid = Data.Scheduler.income_due(day)
+            Data.Traders.pay_income(paid, day)
+
+        with Profiler.phase("day.schedule"):
+            traders = Data.Scheduler.due(day)
+
+        if(Data.Social is not None):
+            with Profiler.phase("day.social"):
+                Data.Social.update(traders)
+
+        with Profiler.phase("day.trading"):
+            Data.Traders.trading_day(Data, traders)
+
+        with Profiler.phase("day.schedule"):
+            Data.Scheduler.reschedule(traders, day)
+
+        with Profiler.phase("day.clearing"):
+            result, changed = FPG_Auction.clear_market(Data)
+
+        with Profiler.phase("day.indices"):
+            Data.IndexTracker.update(day, changed)
+
+        with Profiler.phase("day.history"):
+            Data.History.record_day(day)        # the indicators are updated as its listener
+
+        if(Profiler.enabled):
+            Profiler.count("days simulated")
+            Profiler.count("income payments", paid.__len__())
+            Profiler.count("traders active", traders.__len__())
+            Profiler.count("orders", int(result.fills.__len__()))
+            Profiler.count("fills", int(np.count_nonzero(result.fills)))
+            Profiler.count("volume", int(result.volume.sum()))
+            Profiler.count("tickers traded", changed.__len__())
+
+def Skip_Days(Data: FPG_Data, start, stop):
+    '''
+        Fast-forwards over [start, stop), days on which nothing is scheduled: the state doesn't change
+        so it is recorded once for the whole span
+    '''
+    with Data.Profiler.phase("skip"):
+        Data.IndexTracker.record_span(start, stop)
+        if(Data.Social is not None):
+            Data.Social.clear_signals()
+        Data.History.state('trading_volume')[:] = 0     # no auction, nothing is executed
+        Data.History.record_span(start, stop)
+    Data.Profiler.count("days skipped", stop - start)
@@ -1,20 +1,43 @@
-import random as rnd
-
 import FPG_Sim_Fcns
+import FPG_Checkpoint
 from FPG_Inp import FPG_Input
-from FPG_DataStrc import FPG_Data
-
-def FPG_Sim(Inp: FPG_Input):
-    rnd.seed(Inp.randomSeed)
+from FPG_DataStrc import FPG_Data, FPG_Reference
 
-    Data = FPG_Data(Inp)
+def FPG_Sim(Inp: FPG_Input, Reference: FPG_Reference = None):
+    Data = FPG_Data(Inp, Reference)
     FPG_Sim_Fcns.Initialize_Market(Data)
 
-    for day in range(1, Data.Manager.numTotalDays):
-        Data.Manager.day = day
+    return FPG_Run(Data, 1, Inp.checkpoint_folder, Inp.checkpoint_interval)
+
+def FPG_Run(Data: FPG_Data, day: int, checkpoint_folder: str = None, checkpoint_interval: int = 0):
+    '''
+        Runs the day loop from day to the end of the simulation, e.g. to resume a checkpoint (see FPG_Checkpoint).
+        The profiler's report is written once the loop ends
+        checkpoint_folder:      folder of the periodic checkpoint, overwritten every checkpoint_interval days
+        checkpoint_interval:    days between checkpoints, 0 disables them
+    '''
+    last_checkpoint = day
+    while day < Data.Manager.numTotalDays:
+        next_day = Data.Scheduler.next_event_day(day)
+        if(next_day > day):
+            FPG_Sim_Fcns.Skip_Days(Data, day, next_day)
+            day = next_day
+        else:
+            FPG_Sim_Fcns.Simulate_Day(Data, day)
+            day += 1
+
+        if(checkpoint_folder is not None and checkpoint_interval and day//checkpoint_interval > last_checkpoint//checkpoint_interval):
+            with Data.Profiler.phase("checkpoint"):
+                FPG_Checkpoint.save_checkpoint(Data, checkpoint_folder, day)
+            last_checkpoint = day
+
+    if(Data.Output is not None):
+        with Data.Profiler.phase("output.close"):
+            Data.Output.close()
+
+    Data.Profiler.close()
 
-        for ticker in Data.Market.tickers:
-            Data.Companies[ticker].record_to_history(day)
+    return Data
 
 if __name__ == "__main__":
     Inp = FPG_Input()
@@ -0,0 +1,185 @@
+import numpy as np
+
+graph_kinds = ('small-world', 'scale-free')
+''' Generators of the trader influence network, see FPG_Input.social_graph '''
+
+def small_world_edges(numTraders: int, degree: int, rewiring: float, rng):
+    '''
+        Watts-Strogatz edges: a ring lattice where every trader links to its degree/2 next traders,
+        each link being rewired to a uniformly drawn other trader with probability rewiring
+
+        :return: (sources, targets), int64.
+    '''
+    half    = max(degree//2, 1)
+    sources = np.repeat(np.arange(numTraders, dtype='int64'), half)
+    targets = (sources + np.tile(np.arange(1, half + 1, dtype='int64'), numTraders)) % numTraders
+
+    rewired = np.flatnonzero(rng.random(sources.__len__()) < rewiring)
+    targets[rewired] = rng.integers(numTraders - 1, size=rewired.__len__())
+    targets[rewired] += targets[rewired] >= sources[rewired]     # never back to the source itself
+    return sources, targets
+
+def scale_free_edges(numTraders: int, degree: int, rng):
+    '''
+        Barabasi-Albert edges: every newcomer links to degree/2 earlier traders picked with a probability proportional
+        to their degree. Picking a uniform endpoint of the earlier edges does that (Batagelj & Brandes), the picks
+        that land on an unresolved endpoint are resolved together by pointer jumping instead of one trader at a time
+
+        :return: (sources, targets), int64.
+    '''
+    links = max(degree//2, 1)
+    seed  = min(links, numTraders)
+
+    # The first traders form a ring, every later trader adds links edges
+    sources = np.concatenate([np.arange(seed, dtype='int64'), np.repeat(np.arange(seed, numTraders, dtype='int64'), links)])
+    targets = np.empty(sources.__len__(), dtype='int64')
+    targets[:seed] = (np.arange(seed) + 1) % seed
+
+    # Endpoint u of the edges created before the newcomer: the source of edge u//2 if u is even, its target otherwise
+    before  = seed + (sources[seed:] - seed)*links
+    picks   = (rng.random(sources.__len__() - seed)*2*before).astype('int64')
+    picked  = picks//2
+    is_target = (picks % 2 == 1) & (picked >= seed)
+
+    pointer = np.full(sources.__len__(), -1, dtype='int64')
+    ''' Edge whose target is also this edge's target, -1 once resolved '''
+    targets[seed:]  = np.where(picks % 2 == 1, targets[np.minimum(picked, seed - 1)], sources[picked])
+    pointer[seed:]  = np.where(is_target, picked, -1)
+
+    pending = np.flatnonzero(pointer >= 0)
+    while(pending.__len__() > 0):
+        ahead       = pointer[pending]
+        next_ahead  = pointer[ahead]
+        resolved    = next_ahead < 0
+        targets[pending[resolved]] = targets[ahead[resolved]]
+        pointer[pending] = np.where(resolved, -1, next_ahead)
+        pending = pending[~resolved]
+    return sources, targets
+
+def build_adjacency(sources, targets, numTraders: int):
+    '''
+        Undirected CSR adjacency of an edge list, self loops & duplicate edges are dropped
+
+        :return: (indptr, indices), indices are int32 when the traders fit.
+    '''
+    keep        = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    keys        = np.sort(np.concatenate([sources*numTraders + targets, targets*numTraders + sources]))
+    keys        = keys[np.append(True, keys[1:] != keys[:-1])]
+    indptr      = np.append(0, np.cumsum(np.bincount(keys//numTraders, minlength=numTraders)))
+    indices     = (keys % numTraders).astype('int32' if numTraders < np.iinfo('int32').max else 'int64')
+    return indptr, indices
+
+class FPG_SocialNetwork:
+    def __init__(self, Traders, popularity, RNG, kind: str = 'small-world', degree: int = 10, rewiring: float = 0.1) -> None:
+        '''
+            Trader influence network. Every day the trades of the previous auction spread to the traders' neighbours:
+            each trader sees the average trade direction of its neighbours in every ticker, weighted by its herd mentality
+            & by the ticker's popularity as much as its popularity dependence says. Only the edges of the traders that
+            traded are visited, so a day costs O(trades x degree) whatever the population
+            Traders:    TraderPool, provides herd_mentality & popularity_dependence
+            popularity: Company.popularity of every ticker position, 0 for inactive companies
+            RNG:        FPG_RandomStreams, the graph has a stream of its own
+            kind:       graph generator, see graph_kinds
+            degree:     mean number of neighbours of a trader
+            rewiring:   small-world rewiring probability
+        '''
+        if(kind not in graph_kinds):
+            raise ValueError(f"unknown social graph {kind!r}, expected one of {graph_kinds}")
+
+        self.Traders    = Traders
+        self.numTraders = Traders.size
+        self.numTickers = Traders.tickers.__len__()
+
+        rng = RNG.generator('social graph')
+        if(kind == 'small-world'):
+            sources, targets = small_world_edges(self.numTraders, degree, rewiring, rng)
+        else:
+            sources, targets = scale_free_edges(self.numTraders, degree, rng)
+
+        self.indptr, self.indices = build_adjacency(sources, targets, self.numTraders)
+        ''' CSR adjacency, the neighbours of trader j are indices[indptr[j]:indptr[j + 1]] '''
+        del sources, targets
+
+        self.weights = (1/np.maximum(np.diff(self.indptr), 1)).astype('float32')[self.indices]
+        ''' Weight of every edge in the average its target takes over its neighbours, 1/degree of the target '''
+
+        popularity = np.asarray(popularity, dtype='float64')
+        listed     = popularity > 0
+        self.relative_popularity = popularity/popularity[listed].mean() if listed.any() else np.zeros(self.numTickers)
+        ''' Popularity of every ticker relative to the average listed company '''
+
+        self.signal_traders = np.empty(0, dtype='int64')
+        self.signal_tickers = np.empty(0, dtype='int64')
+        self.signal_values  = np.empty(0, dtype='float32')
+        ''' Net trade direction (+1 bought, -1 sold) of every (trader, ticker) of the last auction, sorted by trader '''
+
+        self.receivers          = np.empty(0, dtype='int64')
+        self.influence_tickers  = np.empty(0, dtype='int64')
+        self.influence          = np.empty(0)
+        ''' Herd influence on the traders of the day's trading session, see update '''
+
+    def clear_signals(self):
+        ''' Days without an auction leave nothing to copy '''
+        self.signal_traders = self.signal_tickers = np.empty(0, dtype='int64')
+        self.signal_values  = np.empty(0, dtype='float32')
+
+    @property
+    def numEdges(self) -> int:
+        return int(self.indices.__len__())
+
+    def record_trades(self, trader, ticker, side, fills):
+        ''' Keeps the net direction of the filled orders of an auction as the next propagation's signals '''
+        filled  = np.flatnonzero(fills)
+        keys    = trader[filled].astype('int64')*self.numTickers + ticker[filled]
+        keys, inverse = np.unique(keys, return_inverse=True)
+        net     = np.bincount(inverse, weights=side[filled]*fills[filled], minlength=keys.__len__())
+
+        moved = net != 0
+        self.signal_traders = keys[moved]//self.numTickers
+        self.signal_tickers = keys[moved] % self.numTickers
+        self.signal_values  = np.sign(net[moved]).astype('float32')
+
+    def propagate(self, traders=None):
+        '''
+            Herd influence of the recorded signals: sum over the neighbours j of a trader i of the weight of (j, i)
+            times j's signal, scaled by i's herd mentality & the ticker's popularity
+            traders:    receiving traders, every trader if None
+
+            :return: (traders, tickers, influence) of the non zero (trader, ticker) influences, sorted by trader then ticker.
+        '''
+        # Every signal travels along its trader's edges
+        starts  = self.indptr[self.signal_traders]
+        counts  = self.indptr[self.signal_traders + 1] - starts
+        rows    = np.repeat(np.arange(counts.__len__()), counts)
+        edges   = starts[rows] + np.arange(rows.__len__()) - np.repeat(np.cumsum(counts) - counts, counts)
+        receivers = self.indices[edges].astype('int64')
+
+        if(traders is not None):
+            wanted = np.zeros(self.numTraders, dtype=bool)
+            wanted[traders] = True
+            keep = wanted[receivers]
+            rows, edges, receivers = rows[keep], edges[keep], receivers[keep]
+
+        keys, inverse = np.unique(receivers*self.numTickers + self.signal_tickers[rows], return_inverse=True)
+        totals = np.bincount(inverse, weights=self.weights[edges]*self.signal_values[rows], minlength=keys.__len__())
+
+        receivers, tickers = keys//self.numTickers, keys % self.numTickers
+        dependence  = self.Traders.popularity_dependence[receivers]
+        influence   = totals*self.Traders.herd_mentality[receivers]*(1 - dependence + dependence*self.relative_popularity[tickers])
+
+        moved = influence != 0
+        return receivers[moved], tickers[moved], influence[moved]
+
+    def update(self, traders):
+        ''' Propagates the last auction's signals to the traders due today, the trading session reads the result '''
+        self.receivers, self.influence_tickers, self.influence = self.propagate(traders)
+
+    def influence_matrix(self, traders):
+        ''' Herd influence of the given traders as a dense [trader position, ticker] array '''
+        traders = np.asarray(traders, dtype='int64')
+        receivers, tickers, influence = self.propagate(traders)
+        order = np.argsort(traders)
+        matrix = np.zeros((traders.__len__(), self.numTickers))
+        matrix[order[np.searchsorted(traders, receivers, sorter=order)], tickers] = influence
+        return matrix
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import os
+
+import FPG_Database
+from FPG_Fetcher import derive_metadata
+
+synthetic_sectors = ['Technology', 'Healthcare', 'Energy', 'Financial Services', 'Consumer Cyclical',
+                     'Industrials', 'Utilities', 'Real Estate', 'Basic Materials', 'Communication Services']
+
+synthetic_countries = {'North America': ['United States', 'Canada'],
+                       'Europe':        ['United Kingdom', 'France', 'Germany'],
+                       'Asia':          ['Japan', 'Taiwan', 'South Korea', 'China'],
+                       'South America': ['Brazil'],
+                       'Oceania':       ['Australia']}
+''' Region -> countries the synthetic companies are spread over '''
+
+def generate_database(numTickers: int, numDays: int, numSectors: int = 5, numRegions: int = 3, start_date: str = '1995-01-01',
+                      seed: int = 0, late_listing_ratio: float = 0.2, folder: str = None):
+    '''
+        Writes a synthetic universe in the database format of FPG_Fetcher: a price history, a profile & a metadata .csv
+        per ticker, no network access needed.
+        Prices follow a market + sector + idiosyncratic factor model so the indices are correlated like real ones
+        numTickers:         number of companies, named SYN0000, SYN0001, ...
+        numDays:            trading days (business days) from start_date
+        numSectors:         sectors used, out of synthetic_sectors
+        numRegions:         regions used, out of synthetic_countries
+        start_date:         simulation start date the metadata is derived for (FPG_Input.start_date)
+        seed:               same seed, same universe
+        late_listing_ratio: share of the companies listed after start_date
+        folder:             database folder, FPG_Database.database_folder by default
+
+        :return: list of the generated tickers.
+    '''
+    folder  = FPG_Database.database_folder if folder is None else folder
+    rng     = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    sectors = synthetic_sectors[:numSectors]
+    regions = list(synthetic_countries.keys())[:numRegions]
+    dates   = pd.bdate_range(start_date, periods=numDays, name='Date')
+    tickers = ["SYN%04d" % idx for idx in range(numTickers)]
+
+    market_factor   = rng.normal(0.0003, 0.010, numDays)
+    sector_factors  = rng.normal(0.0, 0.008, (numDays, sectors.__len__()))
+    dividend_drift  = np.exp(-0.02*(numDays - 1 - np.arange(numDays))/252)
+    ''' Adj Close/Close ratio, past prices are adjusted down for ~2% yearly dividends '''
+
+    for idx, ticker in enumerate(tickers):
+        sector  = idx % sectors.__len__()
+        region  = regions[(idx//sectors.__len__()) % regions.__len__()]
+        country = synthetic_countries[region][idx % synthetic_countries[region].__len__()]
+
+        listing = int(rng.integers(1, max(numDays//2, 2))) if rng.random() < late_listing_ratio else 0
+
+        returns = rng.uniform(0.6, 1.4)*market_factor + sector_factors[:, sector] + rng.normal(0.0, rng.uniform(0.01, 0.025), numDays)
+        close   = rng.lognormal(3.5, 1.0)*np.exp(np.cumsum(returns[listing:]))
+
+        shares_outstanding  = int(rng.lognormal(20.0, 1.2))
+        turnover            = rng.uniform(0.001, 0.02)
+        volume              = (shares_outstanding*turnover*rng.lognormal(0.0, 0.3, close.__len__())).astype('int64')
+
+        prices = pd.DataFrame({'Close': close.astype('float32'), 'Adj Close': (close*dividend_drift[listing:]).astype('float32'),
+                               'Volume': volume}, index=dates[listing:])
+        prices.to_csv(os.path.join(folder, ticker + '_price_history.csv'))
+
+        # Fundamentals as of the last day, the metadata is derived from them like for fetched companies
+        revenue = shares_outstanding*float(prices['Close'].iloc[-1])*rng.uniform(0.2, 1.5)
+        profile = {"name":                  "Synthetic Company %d" % idx,
+                   "country":               country,
+                   "region":                region,
+                   "industry":              "%s %d" % (sectors[sector], idx % 3),
+                   "sector":                sectors[sector],
+                   "currency":              'USD',
+                   "fx_rate":               1.0,
+                   "shares_outstanding":    shares_outstanding,
+                   "revenue":               revenue,
+                   "expenses":              revenue*rng.uniform(0.7, 0.95),
+                   "reference_date":        str(dates[-1].date()),
+                   "reference_close":       prices['Close'].iloc[-1]}
+        pd.DataFrame([profile]).to_csv(os.path.join(folder, ticker + '_profile.csv'), index=False)
+
+        pd.DataFrame([derive_metadata(profile, prices, start_date, dates[0])]).to_csv(os.path.join(folder, ticker + '.csv'), index=False)
+
+    return tickers
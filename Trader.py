@@ -1,13 +1,13 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import random as rnd
 
 import datetime as dt
 
 from dataclasses import dataclass
 
 import FPG_Utils
+from FPG_Auction import BID, ASK
+from FPG_Portfolio import FPG_PortfolioStore, FPG_PortfolioView
 
 @dataclass
 class C_trader_traits:
@@ -64,31 +64,56 @@ class C_trader_traits:
         ''' Access to exclusive or early information. this should very rarely be true '''
     
     def __init__(self, Data):
-        self.securityBiases = {ticker: np.random.rand() for ticker in Data.Market.tickers}
+        rng = Data.RNG.stream('legacy traders')
+
+        self.securityBiases = {ticker: rng.random() for ticker in Data.Market.tickers}
         ''' Personal bias about each security '''
 
         # Personality traits
         possible_trade_frequencies = [7, 14, 21, 30, 60, 90, 120, 180, 365]
-        self.personality_based.trade_frequency = possible_trade_frequencies[np.random.randint(possible_trade_frequencies.__len__())]
+        self.personality_based.trade_frequency = possible_trade_frequencies[rng.integers(possible_trade_frequencies.__len__())]
 
-        self.personality_based.decision_making_speed    = np.random.rand()
-        self.personality_based.risk_appetite            = np.random.rand()
+        self.personality_based.decision_making_speed    = rng.random()
+        self.personality_based.risk_appetite            = rng.random()
 
         # Behavioral traits
-        self.behavioral_based.herd_mentality            = np.random.rand()
-        self.behavioral_based.rationality               = np.random.rand()
+        self.behavioral_based.herd_mentality            = rng.random()
+        self.behavioral_based.rationality               = rng.random()
 
         # Strategic traits
-        self.strategy_oriented.short_term_vs_long_term              = np.random.rand()
-        self.strategy_oriented.technical_vs_fundamental_analysis    = np.random.rand()
-        self.strategy_oriented.Diversification                      = np.random.rand()
+        self.strategy_oriented.short_term_vs_long_term              = rng.random()
+        self.strategy_oriented.technical_vs_fundamental_analysis    = rng.random()
+        self.strategy_oriented.Diversification                      = rng.random()
 
         # Market environment-related traits
         insider_ratio = 0.02 # Percent of the population that has access to insider information
 
-        self.environmental_influences.market_sentiment              = np.random.rand()
-        self.environmental_influences.popularity_dependence         = np.random.rand()
-        self.environmental_influences.information_advantage         = np.random.rand() <= insider_ratio
+        self.environmental_influences.market_sentiment              = rng.random()
+        self.environmental_influences.popularity_dependence         = rng.random()
+        self.environmental_influences.information_advantage         = rng.random() <= insider_ratio
+
+def draw_annual_income(Data, rng, size=None):
+    ''' 
+        Draws annual income(s) from the market's income distribution,
+        Pareto for Gini < 0.5, log-normal otherwise 
+        rng: np.random.Generator to draw from
+    '''
+    if(Data.Market.giniCoeff < 0.5):
+        # Pareto distribution for Gini < 0.5
+        if Data.Market.alphaCoeff <= 1:
+            raise ValueError("Invalid alpha derived from Gini coefficient. Check inputs.")
+        
+        # Calculate minimum income (x_min) to match the mean income
+        x_min = Data.Market.meanIncome * (Data.Market.alphaCoeff - 1) / Data.Market.alphaCoeff
+        
+        # Generate Pareto incomes
+        return (rng.pareto(Data.Market.alphaCoeff, size) + 1) * x_min
+    
+    sigma = 2 * Data.Market.giniCoeff  # Example scaling factor; fine-tune for accuracy
+    mu = np.log(Data.Market.meanIncome) - (sigma**2 / 2)
+    
+    # Generate log-normal income
+    return rng.lognormal(mu, sigma, size)
 
 class Trader:
     def __init__(self, Inp, Data) -> None:
@@ -98,7 +123,9 @@ class Trader:
             Data: General data structure that is carried throughout the simulation 
         '''
 
-        class_idx = np.where(rnd.random() < Data.Market.wealthDistribution)[0][0]
+        self._rng = Data.RNG.stream('legacy traders')
+
+        class_idx = np.where(self._rng.random() < Data.Market.wealthDistribution)[0][0]
         Data.Market.wealthNPopulation[class_idx] += 1
 
         if(class_idx < Data.Market.wealthThresholds.__len__()):
@@ -111,7 +138,7 @@ class Trader:
             minWealth = Data.Market.wealthThresholds[-1]
             maxWealth = Data.Market.totalMarketCap/Data.Market.traderPoolSize
 
-        self.balance        = rnd.uniform(minWealth,maxWealth)
+        self.balance        = self._rng.uniform(minWealth,maxWealth)
         ''' Avaialable cash a trader has to make trades '''
 
         self.income         = self.calculate_income(Data)
@@ -128,7 +155,7 @@ class Trader:
         self.traits = C_trader_traits(Data)
 
         # self.Portfolio = C_trader_portfolio(self, Data)
-        self.Portfolio = {ticker: {'Holdings': 0, 'ask': 0, 'bid': 0, 'Active': Data.Companies[ticker].Active} for ticker in Data.Market.tickers}
+        self.Portfolio = {ticker: {'Holdings': 0, 'ask': 0, 'bid': 0, 'ask_qty': 0, 'bid_qty': 0, 'Active': Data.Companies[ticker].Active} for ticker in Data.Market.tickers}
         ''' Trader's portfolio, shows each stock in the market, how many holdings the trader has forr each stock,\n
             asking price (if wants to buy) and selling price (if has any holdings and wants to sell) '''
 
@@ -144,7 +171,7 @@ class Trader:
         """
         # Stochastic threshold based on trade frequency
         trade_threshold = self.traits.personality_based.trade_frequency + \
-                        rnd.gauss(0, np.sqrt(self.traits.personality_based.trade_frequency))
+                        self._rng.normal(0, np.sqrt(self.traits.personality_based.trade_frequency))
 
         # Update time since last trade
         self.time_since_last_trade += dt
@@ -158,22 +185,7 @@ class Trader:
     def calculate_income(self, Data, mode = 'Init') -> float:
         ''' Computes monthly income '''
         if(mode == 'Init'):
-            if(Data.Market.giniCoeff < 0.5):
-                # Pareto distribution for Gini < 0.5
-                if Data.Market.alphaCoeff <= 1:
-                    raise ValueError("Invalid alpha derived from Gini coefficient. Check inputs.")
-                
-                # Calculate minimum income (x_min) to match the mean income
-                x_min = Data.Market.meanIncome * (Data.Market.alphaCoeff - 1) / Data.Market.alphaCoeff
-                
-                # Generate Pareto incomes
-                income = (np.random.pareto(Data.Market.alphaCoeff) + 1) * x_min
-            else:
-                sigma = 2 * Data.Market.giniCoeff  # Example scaling factor; fine-tune for accuracy
-                mu = np.log(Data.Market.meanIncome) - (sigma**2 / 2)
-                
-                # Generate log-normal income
-                income = np.random.lognormal(mu, sigma)
+            income = draw_annual_income(Data, self._rng)
         else: # Mode 'Update'
             pass
         
@@ -184,7 +196,7 @@ class Trader:
 
     def adjust_balance(self, Data):
         if(np.mod(Data.Market.day,self.income_freq) == 0):
-            self.balance += np.max([np.random.normal(self.income, self.income_sigma) ,0.0])
+            self.balance += np.max([self._rng.normal(self.income, self.income_sigma) ,0.0])
 
     def trading_day(self, Data, mode='Reg'):
 
@@ -195,6 +207,280 @@ class Trader:
 
         pass
 
+trait_groups = {'personality_based':          ('trade_frequency', 'decision_making_speed', 'risk_appetite'),
+                'behavioral_based':           ('herd_mentality', 'rationality'),
+                'strategy_oriented':          ('short_term_vs_long_term', 'technical_vs_fundamental_analysis', 'Diversification'),
+                'environmental_influences':   ('market_sentiment', 'popularity_dependence', 'information_advantage')
+                }
+''' Trait columns of the TraderPool, grouped the same way as C_trader_traits '''
+
+class TraderPool:
+    possible_trade_frequencies  = np.array([7, 14, 21, 30, 60, 90, 120, 180, 365], dtype='int16')
+    ''' Same choice set used by C_trader_traits '''
+
+    insider_ratio               = 0.02
+    ''' Percent of the population that has access to insider information '''
+
+    initial_investment          = 0.5
+    ''' Largest share of its balance a trader invests in the initial allocation, scaled by its risk appetite '''
+
+    order_budget                = 0.2
+    ''' Largest share of its balance a trader spends on one order, scaled by its risk appetite '''
+
+    review_odds                 = 0.5
+    ''' Odds that a trader without a herd signal trades one of its holdings rather than a popular ticker '''
+
+    valuation_sensitivity       = 4.0
+    ''' Sentiment of a fully fundamental trader per unit of log discount to the fair price, holds prices near it '''
+
+    order_spread                = 0.02
+    ''' Largest distance of a limit price from the current price, as a fraction of it '''
+
+    def __init__(self, Inp, Data) -> None:
+        ''' 
+            Structure-of-arrays trader population, every trader attribute & trait is a column indexed by trader id.
+            Reproduces the distributions of the per-object Trader construction with a few batched draws
+            Inp: Input data of the FPG simulation
+            Data: General data structure that is carried throughout the simulation 
+        '''
+        self.tickers    = list(Data.Market.tickers)
+        self.size       = Data.Market.traderPoolSize
+        n               = self.size
+
+        # Every column comes from a named population stream, see FPG_RandomStreams.population
+        def population(name, draw, out=None):
+            return Data.RNG.population(name, n, draw, out=out)
+
+        # Wealth class & starting balance
+        wealthDistribution = np.asarray(Data.Market.wealthDistribution)
+        self.wealth_class = np.searchsorted(wealthDistribution, population('wealth class', lambda rng, size: rng.random(size)), side='right').astype('int8')
+        np.minimum(self.wealth_class, wealthDistribution.__len__() - 1, out=self.wealth_class)
+
+        numClasses = max(wealthDistribution.__len__(), Data.Market.wealthNPopulation.__len__())
+        Data.Market.wealthNPopulation = np.bincount(self.wealth_class, minlength=numClasses).tolist()
+
+        minWealth = np.append(0, Data.Market.wealthThresholds)
+        maxWealth = np.append(Data.Market.wealthThresholds, Data.Market.totalMarketCap/Data.Market.traderPoolSize)
+        classIdx = np.minimum(self.wealth_class, minWealth.__len__() - 1)
+
+        self.balance        = minWealth[classIdx] + (maxWealth[classIdx] - minWealth[classIdx])*population('balance', lambda rng, size: rng.random(size))
+        ''' Avaialable cash each trader has to make trades '''
+
+        self.income         = population('income', lambda rng, size: draw_annual_income(Data, rng, size))/12.0
+        ''' Monthly income level of each trader '''
+
+        self.income_sigma   = np.full(n, FPG_Utils.monthly_income_STD(Data.Market.meanIncome, Data.Market.giniCoeff))
+
+        self.income_freq    = np.full(n, 30, dtype='int16')
+        ''' Days interval after which each trader gets its income (for now keep it constant at 30 days) '''
+
+        self.time_since_last_trade = np.zeros(n, dtype='int32')
+        ''' Days past since each trader's last trade '''
+
+        # Traits, one batched draw for all of the uniform [0 1] traits
+        self.trade_frequency = self.possible_trade_frequencies[population('trade frequency', lambda rng, size: rng.integers(self.possible_trade_frequencies.__len__(), size=size))]
+
+        uniformTraits = [name for group in trait_groups.values() for name in group if name not in ('trade_frequency', 'information_advantage')]
+        draws = population('traits', lambda rng, size: rng.random((size, uniformTraits.__len__() + 1), dtype='float32'))
+        for column, name in enumerate(uniformTraits):
+            setattr(self, name, np.ascontiguousarray(draws[:, column]))
+        self.information_advantage = draws[:, -1] <= self.insider_ratio
+        del draws
+
+        self.securityBiases = np.empty((n, self.tickers.__len__()), dtype='float32')
+        ''' Personal bias of each trader about each security, [trader, ticker] '''
+        population('security biases', lambda rng, size: rng.random((size, self.tickers.__len__()), dtype='float32'), out=self.securityBiases)
+
+        self.Portfolios = FPG_PortfolioStore(n, self.tickers.__len__(), Data.History.active, Inp.sparse_portfolios)
+        ''' Holdings & order entries of every trader in every ticker, dense or CSR matrices '''
+
+        self.popularity = np.array([Data.Companies[ticker].popularity for ticker in self.tickers], dtype='float64')
+        ''' Company.popularity of every ticker position, the odds of a ticker being picked without a herd signal '''
+
+        self.fair_price = np.full(self.tickers.__len__(), np.nan)
+        ''' Value the fundamental traders give every ticker, its price at the initial allocation '''
+        self._Data = Data
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, idx):
+        if(idx < 0):
+            idx += self.size
+        if(idx < 0 or idx >= self.size):
+            raise IndexError("trader index out of range")
+        return TraderView(self, idx)
+
+    def __iter__(self):
+        for idx in range(self.size):
+            yield TraderView(self, idx)
+
+    def pay_income(self, traders, day):
+        ''' Batched adjust_balance of the traders whose income is due on day '''
+        income = self._Data.RNG.normal('income', day, traders, self.income[traders], self.income_sigma[traders])
+        self.balance[traders] += np.maximum(income, 0.0)
+
+    def _pick_tickers(self, Data, traders, day, tradable):
+        ''' Popularity weighted draw of one tradable ticker per trader, keyed by (day, trader) '''
+        weights = np.where(tradable, self.popularity, 0.0)
+        if(weights.sum() <= 0):
+            weights = tradable.astype('float64')
+        cdf = np.cumsum(weights)
+        u   = Data.RNG.uniform('order ticker', day, traders)
+        return np.minimum(np.searchsorted(cdf, u*cdf[-1], side='right'), tradable.__len__() - 1)
+
+    def _herd_signal(self, Data, traders):
+        ''' (ticker, influence) of the strongest herd influence on each trader, ticker -1 where there is none '''
+        tickers, influence = np.full(traders.__len__(), -1, dtype='int64'), np.zeros(traders.__len__())
+        Social = Data.Social
+        if(Social is None or Social.receivers.__len__() == 0):
+            return tickers, influence
+
+        # Receivers are sorted by trader, the strongest influence of each comes first
+        order = np.lexsort((-np.abs(Social.influence), Social.receivers))
+        receivers = Social.receivers[order]
+        strongest = order[np.append(True, receivers[1:] != receivers[:-1])]
+
+        sorter   = np.argsort(traders, kind='stable')
+        position = np.minimum(np.searchsorted(traders, Social.receivers[strongest], sorter=sorter), traders.__len__() - 1)
+        found    = traders[sorter[position]] == Social.receivers[strongest]
+        tickers[sorter[position[found]]]    = Social.influence_tickers[strongest[found]]
+        influence[sorter[position[found]]]  = Social.influence[strongest[found]]
+        return tickers, influence
+
+    def _allocate_initial_holdings(self, Data, traders, prices, tradable):
+        '''
+            Initial allocation: every trader buys one popularity weighted ticker at its current price with part of
+            its balance. All of the bids are accepted, a ticker's demand is scaled down to its outstanding shares
+        '''
+        self.fair_price = np.where(tradable, prices, np.nan)
+
+        tickers     = self._pick_tickers(Data, traders, 0, tradable)
+        price       = prices[tickers]
+        quantity    = np.floor(self.initial_investment*self.risk_appetite[traders]*self.balance[traders]/price)
+
+        demand      = np.bincount(tickers, weights=quantity, minlength=tradable.__len__())
+        outstanding = Data.History.state('shares_outstanding').astype('float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scale   = np.where(demand > outstanding, outstanding/demand, 1.0)
+        quantity    = np.floor(quantity*scale[tickers]).astype('int64')
+
+        bought = np.flatnonzero(quantity > 0)
+        self.balance[traders[bought]] -= quantity[bought]*price[bought]
+        self.Portfolios.add_holdings(traders[bought], tickers[bought], quantity[bought])
+
+    def trading_day(self, Data, traders, mode='Reg'):
+        '''
+            Batched trading session of the given traders (the ones due today, or everyone in 'Init' mode).
+            Every trader places at most one day order: on the ticker of its strongest herd influence if the social
+            network gives it one, else on one of its holdings (review_odds) or on a popularity weighted ticker.
+            It buys when its bias about the ticker, the herd influence, the ticker's discount to its fair price (as
+            much as the trader leans to fundamental analysis) & an irrationality noise add up positive, sells part
+            of its holdings when they don't.
+            Limit prices sit within order_spread of the current price, the orders are cleared by the daily auction
+        '''
+        traders = np.asarray(traders, dtype='int64')
+        self.time_since_last_trade[traders] = 0
+
+        prices      = Data.History.state('price')
+        tradable    = Data.History.active & (np.nan_to_num(prices) > 0)
+        if(traders.__len__() == 0 or not tradable.any()):
+            return
+
+        if(mode == 'Init'):
+            self._allocate_initial_holdings(Data, traders, prices, tradable)
+            return
+
+        day = Data.Market.day
+        tickers, herd = self._herd_signal(Data, traders)
+        unsignalled = (tickers < 0) | ~tradable[np.maximum(tickers, 0)]
+        own     = self.Portfolios.held_ticker(traders, Data.RNG.uniform('order holding', day, traders))
+        review  = (own >= 0) & tradable[np.maximum(own, 0)] & (Data.RNG.uniform('order review', day, traders) < self.review_odds)
+        tickers = np.where(unsignalled, np.where(review, own, self._pick_tickers(Data, traders, day, tradable)), tickers)
+        herd[unsignalled] = 0
+
+        price       = prices[tickers].astype('float64')
+        fair_price  = np.where(np.isnan(self.fair_price[tickers]), price, self.fair_price[tickers])
+        sentiment   = (self.securityBiases[traders, tickers] - 0.5 + herd
+                       + self.valuation_sensitivity*self.technical_vs_fundamental_analysis[traders]*np.log(fair_price/price)
+                       + Data.RNG.normal('order sentiment', day, traders, 0.0, self.rationality[traders]))
+        held        = self.Portfolios.holdings_of(traders, tickers)
+        spread      = self.order_spread*(2*Data.RNG.uniform('order price', day, traders) - 1)
+        limit       = np.round(price*(1 + spread), 2)
+
+        buying      = sentiment >= 0
+        quantity    = np.where(buying, np.floor(self.order_budget*self.risk_appetite[traders]*self.balance[traders]/limit),
+                               np.ceil(self.risk_appetite[traders]*held)).astype('int64')
+
+        for side, orders in ((BID, buying & (quantity > 0)), (ASK, ~buying & (quantity > 0))):
+            orders = np.flatnonzero(orders)
+            self.Portfolios.place(traders[orders], tickers[orders], side, limit[orders], quantity[orders])
+
+    def portfolio(self, idx):
+        ''' Per-ticker portfolio mapping of trader idx, a view over its row of the portfolio store '''
+        return FPG_PortfolioView(self.Portfolios, idx, self.tickers)
+
+def _pool_column(name):
+    ''' Trader attribute that reads & writes the matching TraderPool column '''
+    def getter(self):
+        return getattr(self._pool, name)[self._idx]
+    
+    def setter(self, value):
+        getattr(self._pool, name)[self._idx] = value
+    
+    return property(getter, setter)
+
+class _TraitGroupView:
+    def __init__(self, pool, idx, names) -> None:
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_idx', idx)
+        object.__setattr__(self, '_names', names)
+
+    def __getattr__(self, name):
+        if(name not in self._names):
+            raise AttributeError(name)
+        return getattr(self._pool, name)[self._idx]
+
+    def __setattr__(self, name, value):
+        if(name not in self._names):
+            raise AttributeError(name)
+        getattr(self._pool, name)[self._idx] = value
+
+class C_trader_traits_view:
+    def __init__(self, pool, idx) -> None:
+        ''' Same layout as C_trader_traits, backed by a TraderPool row '''
+        for group, names in trait_groups.items():
+            setattr(self, group, _TraitGroupView(pool, idx, names))
+
+        self._pool  = pool
+        self._idx   = idx
+
+    @property
+    def securityBiases(self):
+        return dict(zip(self._pool.tickers, self._pool.securityBiases[self._idx].tolist()))
+
+class TraderView(Trader):
+    balance                 = _pool_column('balance')
+    income                  = _pool_column('income')
+    income_sigma            = _pool_column('income_sigma')
+    income_freq             = _pool_column('income_freq')
+    time_since_last_trade   = _pool_column('time_since_last_trade')
+
+    def __init__(self, pool, idx) -> None:
+        ''' 
+            Per-trader view over a TraderPool row, for code that still expects a Trader object.
+            Attribute writes go straight to the pool's arrays
+        '''
+        self._pool  = pool
+        self._idx   = idx
+        self._rng   = pool._Data.RNG.stream('trader views')
+
+        self.traits = C_trader_traits_view(pool, idx)
+
+    @property
+    def Portfolio(self):
+        return self._pool.portfolio(self._idx)
+
 # class C_trader_portfolio:
 #     def __init__(self, trader: Trader, Data):
         
@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FPG_Synthetic
+from FPG_Inp import FPG_Input
+
+numTickers  = 20
+numDays     = 300
+
+@pytest.fixture(scope='session')
+def synthetic_folder(tmp_path_factory):
+    ''' Folder holding a synthetic Database/ (FPG_Synthetic defaults), generated once per test session '''
+    folder = tmp_path_factory.mktemp('synthetic')
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        FPG_Synthetic.generate_database(numTickers, numDays)
+    finally:
+        os.chdir(cwd)
+    return folder
+
+@pytest.fixture
+def synthetic_db(synthetic_folder, monkeypatch):
+    ''' Runs the test from the synthetic database's folder, returns its tickers '''
+    monkeypatch.chdir(synthetic_folder)
+    return ['SYN%04d' % idx for idx in range(numTickers)]
+
+@pytest.fixture
+def small_input(synthetic_db):
+    ''' Offline simulation input over the synthetic universe '''
+    Inp = FPG_Input()
+    Inp.tickers         = list(synthetic_db)
+    Inp.traderPoolSize  = 500
+    Inp.offline         = True
+    return Inp
@@ -0,0 +1,87 @@
+import numpy as np
+
+import FPG_Sim_Main
+from FPG_DataStrc import FPG_Data
+from FPG_Auction import call_auction, clear_market, BID, ASK
+
+def _reference_auction(side, price, quantity):
+    ''' Brute force clearing of one ticker: every order price is tried as the clearing price '''
+    best = (0, 0, [])
+    for level in np.unique(price):
+        demand  = quantity[(side == BID) & (price >= level)].sum()
+        supply  = quantity[(side == ASK) & (price <= level)].sum()
+        volume, imbalance = min(demand, supply), abs(demand - supply)
+        if(volume > best[0] or (volume == best[0] and volume > 0 and imbalance < best[1])):
+            best = (volume, imbalance, [level])
+        elif(volume == best[0] and volume > 0 and imbalance == best[1]):
+            best[2].append(level)
+    volume, _, levels = best
+    return (np.nan, 0) if volume == 0 else ((min(levels) + max(levels))/2, volume)
+
+def test_call_auction_matches_brute_force():
+    rng = np.random.default_rng(11)
+    numTickers, numOrders = 30, 600
+
+    ticker      = rng.integers(numTickers, size=numOrders)
+    side        = rng.choice(np.array([BID, ASK], dtype='int8'), size=numOrders)
+    price       = np.round(rng.uniform(9.5, 10.5, numOrders), 1)
+    quantity    = rng.integers(1, 50, size=numOrders)
+    result      = call_auction(ticker, side, price, quantity, numTickers)
+
+    for idx in range(numTickers):
+        orders = ticker == idx
+        clearing_price, volume = _reference_auction(side[orders], price[orders], quantity[orders])
+        np.testing.assert_equal(result.clearing_price[idx], clearing_price)
+        assert result.volume[idx] == volume
+
+        # Both sides execute the volume, only at prices that accept the clearing price
+        for sign in (BID, ASK):
+            filled = orders & (side == sign)
+            assert result.fills[filled].sum() == volume
+            if(volume > 0):
+                assert (sign*(price[filled & (result.fills > 0)] - clearing_price) >= 0).all()
+
+def test_tickers_without_trades_record_no_volume(small_input):
+    Data = FPG_Data(small_input)
+    traded, idle = np.flatnonzero(Data.History.active)[:2]
+    assert Data.History.state('trading_volume')[idle] > 0        # the database volume before any auction
+
+    Data.Traders.Portfolios.set_holdings([1], [traded], [100])
+    Data.Traders.Portfolios.place([1], [traded], ASK, [10.0], [50])
+    Data.Traders.Portfolios.place([2], [traded], BID, [10.5], [30])
+    clear_market(Data)
+    Data.History.record_day(1)
+
+    volume = Data.History.field('trading_volume')[1]
+    assert volume[traded] == 30
+    assert (np.delete(volume, traded)[np.delete(Data.History.active, traded)] == 0).all()
+
+def test_simulation_places_and_fills_orders(small_input):
+    small_input.profile = True
+    Data = FPG_Sim_Main.FPG_Sim(small_input)
+
+    assert Data.Profiler.counters["orders"] > 0
+    assert Data.Profiler.counters["fills"] > 0
+    assert (Data.Traders.balance >= 0).all()
+    assert (Data.Traders.Portfolios.ticker_holdings() >= 0).all()
+
+    prices = Data.History.field('price')[:, Data.History.active]
+    assert (np.nanmax(prices, axis=0) > np.nanmin(prices, axis=0)).any()
+
+def test_traders_follow_their_strongest_herd_influence(small_input):
+    Data = FPG_Data(small_input)
+    tradable = np.flatnonzero(Data.History.active)
+    rng = np.random.default_rng(6)
+    trader = rng.integers(Data.Traders.size, size=200)
+    Data.Social.record_trades(trader, rng.choice(tradable, size=200), rng.choice([BID, ASK], size=200), rng.integers(1, 10, size=200))
+
+    traders = rng.permutation(Data.Traders.size)[:150]
+    Data.Social.update(traders)
+    tickers, influence = Data.Traders._herd_signal(Data, traders)
+
+    matrix = Data.Social.influence_matrix(traders)
+    strongest = np.argmax(np.abs(matrix), axis=1)
+    influenced = (matrix != 0).any(axis=1)
+    assert influenced.any() and not influenced.all()
+    np.testing.assert_array_equal(tickers, np.where(influenced, strongest, -1))
+    np.testing.assert_allclose(influence, matrix[np.arange(traders.__len__()), strongest])
@@ -0,0 +1,173 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import FPG_Database
+from FPG_Fetcher import FPG_Fetcher, FPG_LocalSource, load_failures
+
+start_date = '1995-01-03'
+
+def _history(first, numDays, seed):
+    rng = np.random.default_rng(seed)
+    close = 20*np.exp(np.cumsum(rng.normal(0, 0.01, numDays)))
+    return pd.DataFrame({'Close': close, 'Adj Close': 0.98*close, 'Volume': rng.integers(1000, 5000, numDays)},
+                        index=pd.bdate_range(first, periods=numDays, name='Date'))
+
+def _source(numDays=120, latency=0.0):
+    ''' Six companies over 3 currencies, BAD has a history but no info, like a delisted symbol '''
+    currencies = ['USD', 'EUR', 'JPY', 'EUR', 'JPY', 'USD']
+    infos, histories, financials = {}, {}, {}
+    for idx, currency in enumerate(currencies):
+        symbol = 'T%d' % idx
+        infos[symbol] = {"shortName": "Company %d" % idx, "industry": "Industry", "sector": "Sector", "country": "Country",
+                         "region": "Region", "currency": currency, "sharesOutstanding": 1e6*(idx + 1), "totalRevenue": 5e6}
+        histories[symbol]  = _history('1994-11-01' if idx < 4 else '1995-02-01', numDays, idx)
+        financials[symbol] = pd.DataFrame({"2024": [4e6]}, index=["Total Expenses"])
+    histories['BAD'] = _history('1994-11-01', numDays, 99)
+    return FPG_LocalSource(infos, histories, financials, fx_rates={'EUR': 1.1, 'JPY': 0.007}, latency=latency)
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / FPG_Database.database_folder
+
+def _fetcher(source, start=start_date):
+    return FPG_Fetcher(source, start, max_workers=4, rate=None, retries=0, backoff=0)
+
+def test_failures_are_recorded_and_the_others_complete(database):
+    source  = _source(latency=0.01)
+    tickers = ['T%d' % idx for idx in range(6)]
+    report  = _fetcher(source).fetch(tickers[:3] + ['BAD'] + tickers[3:])
+
+    assert sorted(report.fetched) == tickers
+    assert list(report.failed) == ['BAD'] and report.failed['BAD'].startswith("KeyError")
+    assert FPG_Database.incomplete_tickers(tickers + ['BAD'], start_date) == ['BAD']
+    with open(database / 'fetch_failures.json') as file:
+        failures = json.load(file)
+    assert list(failures) == ['BAD'] and failures['BAD']["start date"] == start_date
+
+    # Stored in USD
+    prices = pd.read_csv(FPG_Database.price_history_csv('T1'), index_col='Date', parse_dates=['Date'])
+    np.testing.assert_allclose(prices['Close'], 1.1*source.histories['T1']['Close'], rtol=1e-6)
+
+def test_each_currency_is_fetched_once(database):
+    source = _source(latency=0.01)
+    _fetcher(source).fetch(['T%d' % idx for idx in range(6)])
+
+    assert source.calls["fx_rate"] == 2                                 # EUR & JPY, never USD
+    assert source.calls["info"] == source.calls["history"] == source.calls["financials"] == 6
+
+def test_rerun_skips_complete_tickers(database):
+    tickers = ['T0', 'T1', 'BAD', 'T2']
+    _fetcher(_source()).fetch(tickers)
+
+    source = _source()
+    report = _fetcher(source).fetch(tickers)
+    assert report.skipped == ['T0', 'T1', 'T2'] and report.fetched == [] and report.derived == []
+    assert source.calls == {"info": 1}                                  # only BAD is tried again
+    assert list(load_failures()) == ['BAD']
+
+    source.infos['BAD'], source.statements['BAD'] = dict(source.infos['T0']), source.statements['T0']
+    report = _fetcher(source).fetch(tickers)
+    assert report.fetched == ['BAD'] and load_failures() == {}
+
+def _extend(source, numDays):
+    for symbol, history in source.histories.items():
+        source.histories[symbol] = _history(history.index[0], history.__len__() + numDays, int(symbol[1:]) if symbol != 'BAD' else 99)
+
+class _RecordingSource(FPG_LocalSource):
+    def history(self, symbol, start: pd.Timestamp = None) -> pd.DataFrame:
+        self.starts[symbol] = start
+        return super().history(symbol, start)
+
+def test_refresh_appends_only_the_new_days(database):
+    tickers = ['T0', 'T1', 'T4']
+    _fetcher(_source()).fetch(tickers)
+    before = {ticker: pd.read_csv(FPG_Database.price_history_csv(ticker)) for ticker in tickers}
+
+    full   = _source()
+    _extend(full, 5)
+    source = _RecordingSource(full.infos, full.histories, full.statements, full.fx_rates)
+    source.starts = {}
+    report = _fetcher(source).fetch(tickers, refresh=True)
+
+    assert sorted(report.fetched) == tickers
+    assert source.calls == {"history": 3}                              # no info, financials or FX rate
+    for ticker in tickers:
+        last = pd.Timestamp(before[ticker]['Date'].iloc[-1])
+        assert source.starts[ticker] == last + pd.Timedelta(days=1)
+
+        after = pd.read_csv(FPG_Database.price_history_csv(ticker))
+        assert after.__len__() == before[ticker].__len__() + 5 and after['Date'].is_unique
+        pd.testing.assert_frame_equal(after.iloc[:before[ticker].__len__()], before[ticker])
+        expected = full.histories[ticker]['Close'].to_numpy()*{'T0': 1.0, 'T1': 1.1, 'T4': 0.007}[ticker]
+        np.testing.assert_allclose(after['Close'], expected, rtol=1e-6)
+
+    # Nothing new, nothing appended
+    report = _fetcher(source).fetch(tickers, refresh=True)
+    assert pd.read_csv(FPG_Database.price_history_csv('T0')).__len__() == before['T0'].__len__() + 5
+
+def test_interrupted_refresh_leaves_the_history_intact(database, monkeypatch):
+    _fetcher(_source()).fetch(['T0'])
+    path = FPG_Database.price_history_csv('T0')
+    with open(path, 'rb') as file:
+        stored = file.read()
+
+    source = _source()
+    _extend(source, 5)
+    to_csv = pd.DataFrame.to_csv
+    def interrupted(frame, path, mode='w', **kwargs):
+        if(mode == 'a'):
+            with open(path, 'a') as file:
+                file.write("1995-04-")
+            raise OSError("disk full")
+        return to_csv(frame, path, mode=mode, **kwargs)
+    monkeypatch.setattr(pd.DataFrame, "to_csv", interrupted)
+
+    report = _fetcher(source).fetch(['T0'], refresh=True)
+    assert list(report.failed) == ['T0']
+    with open(path, 'rb') as file:
+        assert file.read() == stored
+
+def test_new_start_date_is_derived_without_source_calls(database):
+    tickers = ['T0', 'T1', 'T4']
+    _fetcher(_source()).fetch(tickers)
+
+    source = _source()
+    report = _fetcher(source, '1995-02-15').fetch(tickers)
+    assert source.calls == {}
+    assert report.derived == tickers and report.fetched == []
+    assert FPG_Database.incomplete_tickers(tickers, '1995-02-15') == []
+
+    metadata = pd.read_csv(FPG_Database.metadata_csv('T0')).iloc[0]
+    prices   = pd.read_csv(FPG_Database.price_history_csv('T0'), index_col='Date', parse_dates=['Date'])
+    assert metadata["price"] == pytest.approx(prices.loc['1995-02-15', 'Close'])
+
+def test_first_session_skips_exchange_holidays(database):
+    ''' 1995-01-02 was a NYSE holiday, a company listed on the 3rd trades from the first session '''
+    source = _source()
+    source.histories['T5'] = _history('1995-01-03', 100, 5)
+    for symbol, history in source.histories.items():
+        source.histories[symbol] = history.drop(pd.Timestamp('1995-01-02'), errors='ignore')
+
+    def starting_days():
+        return {ticker: pd.read_csv(FPG_Database.metadata_csv(ticker)).iloc[0]["days since start date"] for ticker in tickers}
+
+    tickers = ['T0', 'T4', 'T5']
+    report  = _fetcher(source, '1995-01-02').fetch(tickers)
+    assert sorted(report.fetched) == tickers
+    assert starting_days() == {'T0': 0, 'T4': 29, 'T5': 0}
+
+    # Derived from the stored histories for a new start date, the same
+    _fetcher(source, '1995-01-03').fetch(tickers)
+    source.calls.clear()
+    report = _fetcher(source, '1995-01-02').fetch(tickers)
+    assert report.derived == tickers and source.calls == {}
+    assert starting_days() == {'T0': 0, 'T4': 29, 'T5': 0}
+
+    # Without the older companies, the universe's calendar starts with the late listing
+    report = _fetcher(source, '1994-12-01').fetch(['T4', 'T5'])
+    assert report.derived == ['T4', 'T5']
+    assert pd.read_csv(FPG_Database.metadata_csv('T5')).iloc[0]["days since start date"] == 0
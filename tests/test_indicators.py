@@ -0,0 +1,82 @@
+import numpy as np
+
+from FPG_History import FPG_HistoryStore
+from FPG_Indicators import FPG_Indicators, compute_indicators, indicator_names
+
+numDays, numTickers = 120, 6
+
+def _store(chunk_days=None):
+    History = FPG_HistoryStore(numDays, ['T%d' % idx for idx in range(numTickers)], chunk_days)
+    History.active[:] = True
+    History.active[-1] = False
+    return History
+
+def _prices():
+    rng = np.random.default_rng(3)
+    prices = 100*np.exp(np.cumsum(rng.normal(0, 0.02, (numDays, numTickers)), axis=0))
+    prices[:30, 2] = np.nan                 # listed late
+    return prices
+
+def _run(History, Indicators, prices, spans):
+    ''' Records the prices day by day, holding them constant over the (start, stop) spans '''
+    day = 0
+    for start, stop in spans + [(numDays, numDays)]:
+        while day < start:
+            History.state('price')[:] = prices[day]
+            History.record_day(day)
+            day += 1
+        if(stop > start):
+            History.state('price')[:] = prices[start]
+            History.record_span(start, stop)
+            day = stop
+    return Indicators
+
+def test_online_indicators_match_batch():
+    History = _store()
+    Indicators = _run(History, FPG_Indicators(History, numDays), _prices(), [])
+
+    expected = compute_indicators(np.where(History.active, _prices(), np.nan))
+    np.testing.assert_allclose(Indicators.values, expected, rtol=1e-5, atol=1e-4, equal_nan=True)
+
+def test_skipped_spans_match_day_by_day_updates():
+    spans   = [(40, 75), (80, 81), (90, 119)]
+    prices  = _prices()
+    for start, stop in spans:
+        prices[start:stop] = prices[start]
+
+    History = _store()
+    daily   = _run(History, FPG_Indicators(History, numDays), prices, [])
+    History = _store()
+    skipped = _run(History, FPG_Indicators(History, numDays), prices, spans)
+
+    np.testing.assert_allclose(skipped.values, daily.values, rtol=1e-5, atol=1e-4, equal_nan=True)
+    for name in ('_sum', '_sum_sq', '_ema', '_gain', '_loss'):
+        np.testing.assert_allclose(getattr(skipped, name), getattr(daily, name), rtol=1e-9, atol=1e-9)
+    np.testing.assert_array_equal(skipped._changes, daily._changes)
+
+class _Collector:
+    ''' History listener keeping the indicator chunks as FPG_OutputWriter does '''
+    def __init__(self, Indicators):
+        self.Indicators = Indicators
+        self.chunks = []
+
+    def recorded(self, start, stop):
+        pass
+
+    def flush(self, start, stop):
+        self.chunks.append(self.Indicators.values[:, :stop - start].copy())
+
+def test_chunked_indicators_hold_one_chunk():
+    spans = [(50, 64)]
+    History = _store()
+    full = _run(History, FPG_Indicators(History, numDays), _prices(), spans)
+
+    History = _store(chunk_days=16)
+    chunked = FPG_Indicators(History, numDays)
+    collector = _Collector(chunked)
+    History.listeners.append(collector)
+    _run(History, chunked, _prices(), spans)
+    History.flush()
+
+    assert chunked.values.shape == (indicator_names.__len__(), 16, numTickers)
+    np.testing.assert_array_equal(np.concatenate(collector.chunks, axis=1), full.values)
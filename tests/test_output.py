@@ -0,0 +1,49 @@
+import numpy as np
+
+from copy import copy
+
+import FPG_Sim_Main
+import FPG_Checkpoint
+from FPG_History import history_fields
+from FPG_Indicators import indicator_names
+from FPG_Results import FPG_Results
+
+def _streamed(Inp, folder, **settings):
+    Inp = copy(Inp)
+    Inp.output_folder, Inp.output_chunk_days, Inp.trader_snapshot_interval = str(folder), 37, 50
+    for name, value in settings.items():
+        setattr(Inp, name, value)
+    return Inp
+
+def _assert_same_results(results, expected):
+    np.testing.assert_array_equal(results.history(list(history_fields)), expected.history(list(history_fields)))
+    np.testing.assert_array_equal(results.index(), expected.index())
+    for name in indicator_names:
+        np.testing.assert_array_equal(results.indicators(name), expected.indicators(name))
+
+def test_streamed_output_matches_the_in_memory_run(small_input, tmp_path):
+    memory = FPG_Results.from_data(FPG_Sim_Main.FPG_Sim(small_input))
+    FPG_Sim_Main.FPG_Sim(_streamed(small_input, tmp_path / 'out'))
+    streamed = FPG_Results.open(tmp_path / 'out')
+
+    assert streamed.manifest["complete"]
+    assert streamed.segments.__len__() > 1
+    _assert_same_results(streamed, memory)
+    assert not np.isnan(streamed.trader_statistics('wealth_total')).any()
+
+def test_resumed_run_continues_the_streamed_output(small_input, tmp_path):
+    FPG_Sim_Main.FPG_Sim(_streamed(small_input, tmp_path / 'full'))
+    full = FPG_Results.open(tmp_path / 'full')
+
+    # The checkpointed run goes on past its last checkpoint, as if it had crashed there
+    FPG_Sim_Main.FPG_Sim(_streamed(small_input, tmp_path / 'resumed', checkpoint_folder=str(tmp_path / 'checkpoint'),
+                                   checkpoint_interval=130))
+    Data, day = FPG_Checkpoint.load_checkpoint(tmp_path / 'checkpoint')
+    assert 0 < day < Data.Manager.numTotalDays
+    FPG_Sim_Main.FPG_Run(Data, day)
+    resumed = FPG_Results.open(tmp_path / 'resumed')
+
+    assert resumed.manifest["complete"]
+    _assert_same_results(resumed, full)
+    np.testing.assert_array_equal(resumed.trader_statistics(), full.trader_statistics())
+    assert resumed.manifest["snapshots"] == full.manifest["snapshots"]
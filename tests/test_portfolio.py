@@ -0,0 +1,75 @@
+import numpy as np
+
+from FPG_Auction import FPG_OrderBook, BID, ASK
+from FPG_Portfolio import FPG_PortfolioStore
+
+numTraders, numTickers = 300, 25
+
+def _stores():
+    active = np.ones(numTickers, dtype=bool)
+    return FPG_PortfolioStore(numTraders, numTickers, active, False), FPG_PortfolioStore(numTraders, numTickers, active, True)
+
+def test_dense_and_sparse_stores_match():
+    dense, sparse = _stores()
+    rng = np.random.default_rng(7)
+
+    for day in range(40):
+        traders, tickers = rng.integers(numTraders, size=200), rng.integers(numTickers, size=200)
+        deltas = rng.integers(-5, 10, size=200)
+        for store in (dense, sparse):
+            store.add_holdings(traders, tickers, deltas)
+
+        for side in (BID, ASK):
+            traders, tickers = rng.integers(numTraders, size=60), rng.integers(numTickers, size=60)
+            price, quantity = rng.random(60)*10, rng.integers(0, 20, size=60)
+            for store in (dense, sparse):
+                store.place(traders, tickers, side, price, quantity)
+
+        for expected, result in zip(dense.order_totals(), sparse.order_totals()):
+            np.testing.assert_array_equal(result, expected)
+
+        dense_book, sparse_book = FPG_OrderBook(), FPG_OrderBook()
+        dense.collect(dense_book)
+        sparse.collect(sparse_book)
+        for expected, result in zip(dense_book.orders(), sparse_book.orders()):
+            np.testing.assert_array_equal(result, expected)
+
+        assert sparse.entry_keys.__len__() == 0
+        assert dense.nnz == sparse.nnz
+        np.testing.assert_array_equal(sparse.ticker_holdings(), dense.ticker_holdings())
+        np.testing.assert_allclose(sparse.value(np.arange(numTickers)), dense.value(np.arange(numTickers)))
+
+    np.testing.assert_array_equal(np.stack([sparse.row(trader) for trader in range(numTraders)]), dense.holdings)
+
+def test_collect_clears_the_day_orders():
+    for store in _stores():
+        store.set_holdings([3], [4], [10])
+        store.place([3, 3], [4, 4], ASK, [5.0, 6.0], [4, 20])
+        store.place([8], [1], BID, [2.5], [7])
+
+        book = FPG_OrderBook()
+        store.collect(book)
+        trader, ticker, side, price, quantity = book.orders()
+        np.testing.assert_array_equal(trader, [3, 8])
+        np.testing.assert_array_equal(side, [ASK, BID])
+        np.testing.assert_array_equal(quantity, [10, 7])     # asks are capped by the holdings
+
+        assert store.order(3, 4, 'ask') == 0 and store.order(8, 1, 'bid_qty') == 0
+        empty = FPG_OrderBook()
+        store.collect(empty)
+        assert empty.orders()[0].__len__() == 0
+
+def test_held_ticker_is_one_of_the_holdings():
+    dense, sparse = _stores()
+    rng = np.random.default_rng(5)
+    traders, tickers = rng.integers(numTraders, size=400), rng.integers(numTickers, size=400)
+    for store in (dense, sparse):
+        store.add_holdings(traders, tickers, 1)
+
+    everyone, u = np.arange(numTraders), rng.random(numTraders)
+    picked = dense.held_ticker(everyone, u)
+    np.testing.assert_array_equal(sparse.held_ticker(everyone, u), picked)
+
+    holders = picked >= 0
+    np.testing.assert_array_equal(holders, dense.holdings.any(axis=1))
+    assert (dense.holdings[everyone[holders], picked[holders]] > 0).all()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from FPG_DataStrc import FPG_Data
+from FPG_Random import FPG_RandomStreams, trader_block_size
+
+def _draw(rng, size):
+    return rng.random((size, 3))
+
+def test_population_draws_do_not_depend_on_the_chunking():
+    RNG = FPG_RandomStreams(42)
+    numTraders = 2*trader_block_size + 123
+    whole = RNG.population('traits', numTraders, _draw)
+
+    bounds = [0, 17, trader_block_size - 1, trader_block_size + 5, 2*trader_block_size, numTraders]
+    chunks = [RNG.population('traits', numTraders, _draw, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+    np.testing.assert_array_equal(np.concatenate(chunks), whole)
+
+    out = np.empty((numTraders - 100, 3))
+    RNG.population('traits', numTraders, _draw, 100, out=out)
+    np.testing.assert_array_equal(out, whole[100:])
+
+def test_counter_draws_only_depend_on_the_day_and_id():
+    RNG = FPG_RandomStreams(7)
+    ids = np.arange(1000)
+    subset = np.array([999, 3, 500])
+
+    np.testing.assert_array_equal(RNG.uniform('order price', 12, subset), RNG.uniform('order price', 12, ids)[subset])
+    np.testing.assert_array_equal(RNG.normal('income', 30, subset, 5.0, 2.0), RNG.normal('income', 30, ids, 5.0, 2.0)[subset])
+
+    assert not np.array_equal(RNG.uniform('order price', 13, ids), RNG.uniform('order price', 12, ids))
+    assert not np.array_equal(RNG.uniform('order ticker', 12, ids), RNG.uniform('order price', 12, ids))
+    assert not np.array_equal(FPG_RandomStreams(8).uniform('order price', 12, ids), RNG.uniform('order price', 12, ids))
+
+def test_seeded_traders_are_reproducible(small_input):
+    first, second = FPG_Data(small_input), FPG_Data(small_input)
+    np.testing.assert_array_equal(first.Traders.balance, second.Traders.balance)
+    np.testing.assert_array_equal(first.Traders.securityBiases, second.Traders.securityBiases)
+
+    small_input.randomSeed += 1
+    assert not np.array_equal(FPG_Data(small_input).Traders.balance, first.Traders.balance)
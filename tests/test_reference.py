@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from types import SimpleNamespace
+
+import FPG_Reference_Utils as RefUtils
+
+numDays, numTickers = 250, 8
+
+def _market():
+    rng = np.random.default_rng(17)
+    adj_close = 50*np.exp(np.cumsum(rng.normal(0, 0.02, (numDays, numTickers)), axis=0))
+    adj_close[:40, 3] = np.nan              # listed late
+    adj_close[:90, 6] = np.nan
+    shares = rng.integers(10**6, 10**8, size=numTickers)
+    return adj_close, adj_close*shares
+
+def test_group_indices_match_per_group_baseline():
+    adj_close, caps = _market()
+    groupings = [RefUtils.world_grouping(numTickers),
+                 RefUtils.grouping_from_labels('Sector_idx', 'Sector_idx', ['a', 'b', 'a', 'c', 'b', 'a', 'c', None]),
+                 RefUtils.grouping_from_baskets('Custom_idx', 'Custom_idx', {'x': ['T0', 'T3'], 'y': ['T3', 'T6', 'T7']},
+                                                ['T%d' % idx for idx in range(numTickers)])]
+    Indices, distributions = RefUtils.compute_group_indices(adj_close, caps, groupings)
+
+    # Baseline: one weights & index computation per group over its member columns
+    price_history = SimpleNamespace(adj_close=adj_close, index=pd.RangeIndex(numDays))
+    for grouping in groupings:
+        for group in range(grouping.numGroups):
+            columns = grouping.tickers[grouping.members == group]
+            weights = RefUtils.calculate_stock_weights(caps[:, columns])
+            idx, distribution = RefUtils.calculate_index(price_history, weights, columns)
+
+            index_set = Indices[grouping.name]
+            np.testing.assert_allclose(index_set.price_index[:, group], idx["price index"].to_numpy(dtype='float64'), rtol=1e-5)
+            np.testing.assert_allclose(index_set.index_returns[:, group], idx["index returns"].to_numpy(dtype='float64'),
+                                       rtol=1e-4, atol=1e-4)
+
+            table = distributions[grouping.distribution]
+            assert table.counts[group] == distribution.counts[0]
+            np.testing.assert_allclose(table.quantiles[group], distribution.quantiles[0], rtol=1e-9, atol=1e-9)
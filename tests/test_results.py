@@ -0,0 +1,64 @@
+import numpy as np
+
+import FPG_Sim_Main
+from FPG_Results import FPG_Results
+
+def test_resampling_matches_pandas(small_input, tmp_path):
+    small_input.output_folder, small_input.output_chunk_days = str(tmp_path), 37
+    FPG_Sim_Main.FPG_Sim(small_input)
+    results = FPG_Results.open(tmp_path)
+
+    prices = results.frame('price')
+    volume = results.frame('trading_volume')
+    for freq, pandas_freq in (('W', 'W-SUN'), ('M', 'MS')):
+        periods = prices.resample(pandas_freq)
+        traded  = periods.first().dropna(how='all').index
+
+        ohlc = results.ohlc(freq)
+        first_days = prices.index.to_series().resample(pandas_freq).first().loc[traded]
+        np.testing.assert_array_equal(ohlc.dates, first_days.to_numpy())
+        for values, expected in ((ohlc.open, periods.first()), (ohlc.high, periods.max()),
+                                 (ohlc.low, periods.min()), (ohlc.close, periods.last())):
+            np.testing.assert_allclose(values, expected.loc[traded].to_numpy(), rtol=1e-6)
+        np.testing.assert_array_equal(ohlc.volume, volume.resample(pandas_freq).sum().loc[traded].to_numpy())
+
+        _, mean = results.resample('price', freq, 'mean')
+        np.testing.assert_allclose(mean, periods.mean().loc[traded].to_numpy(), rtol=1e-6)
+
+def _weekday(date):
+    ''' Monday 0 ... Sunday 6, the epoch was a Thursday '''
+    return int(date.astype('datetime64[D]').view('int64') + 3) % 7
+
+def test_date_queries_slice_the_simulation(small_input):
+    Data    = FPG_Sim_Main.FPG_Sim(small_input)
+    results = FPG_Results.from_data(Data)
+    dates   = results.date_of(np.arange(results.numDays))
+
+    # A weekend resolves to the next trading day on the left & the previous one on the right
+    saturday = dates[10] + np.timedelta64((5 - _weekday(dates[10])) % 7, 'D')
+    sunday   = saturday + np.timedelta64(15, 'D')
+    monday   = int(np.searchsorted(dates, saturday))
+    assert _weekday(saturday) == 5 and _weekday(dates[monday]) == 0
+    assert results.day_of(saturday) == monday and results.day_of(saturday, 'right') == monday - 1
+    assert results.day_of(str(saturday.astype('datetime64[D]'))) == monday
+
+    first, stop = results.day_range(saturday, sunday)
+    assert (first, stop) == (monday, int(np.searchsorted(dates, sunday)))
+    assert results.day_range(saturday, saturday + np.timedelta64(1, 'D')) == (monday, monday)
+    assert results.day_range(dates[0] - np.timedelta64(30, 'D'), dates[-1] + np.timedelta64(30, 'D')) == (0, results.numDays)
+
+    History = Data.History
+    np.testing.assert_array_equal(results.history('price', start=saturday, end=sunday), History.field('price')[first:stop])
+    tickers = [History.tickers[3], History.tickers[0]]
+    both    = results.history(['price', 'trading_volume'], tickers, saturday, sunday)
+    np.testing.assert_array_equal(both[0], History.field('price')[first:stop][:, [3, 0]])
+    np.testing.assert_array_equal(both[1], History.field('trading_volume')[first:stop][:, [3, 0]])
+
+    Indices = Data.IndexTracker.Indices
+    sectors = Indices['Sector_idx'].names
+    groups  = [sectors[2], sectors[0]]                                  # columns come in the index's group order
+    np.testing.assert_array_equal(results.index('Sector_idx', groups, saturday, sunday),
+                                  Indices['Sector_idx'].price_index[first:stop][:, [0, 2]])
+    np.testing.assert_array_equal(results.index('Sector_idx', sectors[1], kind='index_returns'),
+                                  Indices['Sector_idx'].index_returns[:, [1]])
+    np.testing.assert_array_equal(results.index('World_idx'), Indices['World_idx'].price_index)
@@ -0,0 +1,115 @@
+import numpy as np
+
+from types import SimpleNamespace
+
+from FPG_Random import FPG_RandomStreams
+from FPG_Social import FPG_SocialNetwork, build_adjacency, small_world_edges, scale_free_edges
+
+def _edge_set(indptr, indices):
+    rows = np.repeat(np.arange(indptr.__len__() - 1), np.diff(indptr))
+    return set(zip(rows.tolist(), indices.tolist()))
+
+def test_adjacency_is_symmetric_without_self_loops_or_duplicates():
+    rng = np.random.default_rng(1)
+    numTraders = 50
+    sources, targets = rng.integers(numTraders, size=400), rng.integers(numTraders, size=400)
+    indptr, indices = build_adjacency(sources, targets, numTraders)
+
+    edges = _edge_set(indptr, indices)
+    assert edges.__len__() == indices.__len__()                          # no duplicates
+    assert all(i != j for i, j in edges)
+    assert edges == {(j, i) for i, j in edges}
+    assert edges == {(int(i), int(j)) for i, j in zip(sources, targets) if i != j} | \
+                    {(int(j), int(i)) for i, j in zip(sources, targets) if i != j}
+    for trader in range(numTraders):
+        row = indices[indptr[trader]:indptr[trader + 1]]
+        assert (np.diff(row) > 0).all()
+
+def test_small_world_edges():
+    numTraders, degree = 200, 10
+    sources, targets = small_world_edges(numTraders, degree, 0.3, np.random.default_rng(2))
+
+    assert sources.__len__() == targets.__len__() == numTraders*degree//2
+    assert (sources != targets).all()
+    assert ((targets >= 0) & (targets < numTraders)).all()
+    lattice = (targets - sources) % numTraders <= degree//2
+    assert 0.5 < lattice.mean() < 0.9                                    # about 30% rewired
+
+def _reference_scale_free(numTraders, degree, rng):
+    ''' Batagelj & Brandes one edge at a time, from the same draws as scale_free_edges '''
+    links = max(degree//2, 1)
+    seed  = min(links, numTraders)
+    sources = [idx for idx in range(seed)] + [idx for idx in range(seed, numTraders) for _ in range(links)]
+    targets = [(idx + 1) % seed for idx in range(seed)]
+
+    before = seed + (np.array(sources[seed:], dtype='int64') - seed)*links
+    picks  = (rng.random(sources.__len__() - seed)*2*before).astype('int64')
+    for pick in picks:
+        edge = pick//2
+        targets.append(sources[edge] if pick % 2 == 0 else targets[edge])
+    return np.array(sources), np.array(targets)
+
+def test_scale_free_edges_match_sequential_attachment():
+    numTraders, degree = 500, 6
+    sources, targets = scale_free_edges(numTraders, degree, np.random.default_rng(3))
+    expected_sources, expected_targets = _reference_scale_free(numTraders, degree, np.random.default_rng(3))
+
+    assert sources.__len__() == 3 + (numTraders - 3)*3
+    np.testing.assert_array_equal(sources, expected_sources)
+    np.testing.assert_array_equal(targets, expected_targets)
+    assert (sources != targets).all()
+    assert (targets[3:] < sources[3:]).all()                             # newcomers link to earlier traders
+
+    # Preferential attachment: the early traders become hubs
+    degrees = np.diff(build_adjacency(sources, targets, numTraders)[0])
+    assert degrees[:10].mean() > 3*degrees.mean()
+
+def _network(numTraders=40, numTickers=5):
+    rng = np.random.default_rng(4)
+    Traders = SimpleNamespace(size=numTraders, tickers=['T%d' % idx for idx in range(numTickers)],
+                              herd_mentality=rng.random(numTraders).astype('float32'),
+                              popularity_dependence=rng.random(numTraders).astype('float32'))
+    popularity = np.array([0.1, 0.4, 0.0, 0.3, 0.2])
+    Social = FPG_SocialNetwork(Traders, popularity, FPG_RandomStreams(5), 'small-world', degree=6, rewiring=0.2)
+
+    # Trades of the last auction, trader 3 buys & sells the same ticker (no net direction)
+    trader  = np.array([1, 3, 3, 7, 7, 12, 20, 33])
+    ticker  = np.array([0, 1, 1, 2, 4, 0, 3, 0])
+    side    = np.array([1, 1, -1, -1, 1, 1, -1, -1])
+    fills   = np.array([5, 2, 2, 1, 3, 0, 4, 6])
+    Social.record_trades(trader, ticker, side, fills)
+    return Social, Traders, popularity
+
+def _dense_influence(Social, Traders, popularity):
+    ''' Sum of the neighbours' signals / receiver degree x herd mentality x popularity blend, [trader, ticker] '''
+    numTraders, numTickers = Traders.size, Traders.tickers.__len__()
+    adjacency = np.zeros((numTraders, numTraders))
+    for i, j in _edge_set(Social.indptr, Social.indices):
+        adjacency[i, j] = 1
+    signals = np.zeros((numTraders, numTickers))
+    signals[Social.signal_traders, Social.signal_tickers] = Social.signal_values
+
+    degree = np.maximum(adjacency.sum(axis=1), 1)
+    relative_popularity = popularity/popularity[popularity > 0].mean()
+    dependence = Traders.popularity_dependence[:, np.newaxis]
+    return (adjacency @ signals)/degree[:, np.newaxis]*Traders.herd_mentality[:, np.newaxis] \
+           *(1 - dependence + dependence*relative_popularity)
+
+def test_propagation_matches_dense_reference():
+    Social, Traders, popularity = _network()
+    expected = _dense_influence(Social, Traders, popularity)
+
+    np.testing.assert_array_equal(np.sort(Social.signal_traders), [1, 7, 7, 20, 33])
+    receivers, tickers, influence = Social.propagate()
+    result = np.zeros_like(expected)
+    result[receivers, tickers] = influence
+    np.testing.assert_allclose(result, expected, rtol=1e-6, atol=1e-9)
+    assert (np.diff(receivers*Traders.tickers.__len__() + tickers) > 0).all()
+
+    traders = np.array([30, 2, 8, 34, 0, 21])
+    np.testing.assert_allclose(Social.influence_matrix(traders), expected[traders], rtol=1e-6, atol=1e-9)
+
+    Social.update(traders)
+    assert np.isin(Social.receivers, traders).all()
+    np.testing.assert_allclose(Social.influence, expected[Social.receivers, Social.influence_tickers], rtol=1e-6)
+    assert Social.receivers.__len__() == np.count_nonzero(expected[traders])
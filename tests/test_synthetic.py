@@ -0,0 +1,17 @@
+import numpy as np
+
+import FPG_Sim_Main
+from FPG_DataStrc import FPG_Data
+
+def test_default_synthetic_database_has_active_companies(small_input):
+    Data = FPG_Data(small_input)
+
+    # The default start date is a Sunday, companies trading from the first session must still start active
+    assert small_input.start_date == '1995-01-01'
+    assert Data.History.active.sum() >= 0.5*Data.History.active.__len__()
+
+def test_synthetic_simulation_records_prices(small_input):
+    Data = FPG_Sim_Main.FPG_Sim(small_input)
+
+    prices = Data.History.field('price')
+    assert not np.isnan(prices[:, Data.History.active]).all()